@@ -0,0 +1,127 @@
+import argparse
+import json
+import socket
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from slanfm import framing
+
+
+class CountingSocket:
+    def __init__(self, sock):
+        self.sock = sock
+        self.calls = 0
+
+    def recv(self, bufsize):
+        self.calls += 1
+        return self.sock.recv(bufsize)
+
+    def recv_into(self, buffer, nbytes=0):
+        self.calls += 1
+        return self.sock.recv_into(buffer, nbytes)
+
+    def send(self, data):
+        self.calls += 1
+        return self.sock.send(data)
+
+    def sendall(self, data):
+        view = memoryview(data).cast('B')
+        while view:
+            view = view[self.send(view):]
+
+    def sendmsg(self, buffers):
+        self.calls += 1
+        return self.sock.sendmsg(buffers)
+
+
+def legacy_receive_all(sock, length):
+    data = b''
+    while len(data) < length:
+        chunk = sock.recv(min(4096, length - len(data)))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def legacy_receiver(sock, chunks, chunk_size):
+    for _ in range(chunks):
+        length = struct.unpack('>I', legacy_receive_all(sock, 4))[0]
+        legacy_receive_all(sock, length)
+
+
+def framing_receiver(sock, chunks, chunk_size):
+    with framing.borrow(framing.HEADER_SIZE + chunk_size) as buffer:
+        view = memoryview(buffer)
+        payload = view[framing.HEADER_SIZE:]
+        for _ in range(chunks):
+            length = framing.recv_frame_header(sock, view)
+            framing.recv_into_exact(sock, payload[:length])
+
+
+def legacy_sender(sock, chunks, chunk_size):
+    chunk = bytes(chunk_size)
+    for _ in range(chunks):
+        sock.sendall(struct.pack('>I', len(chunk)))
+        sock.sendall(chunk)
+
+
+def framing_sender(sock, chunks, chunk_size):
+    with framing.borrow(framing.HEADER_SIZE + chunk_size) as buffer:
+        view = memoryview(buffer)
+        for _ in range(chunks):
+            framing.send_chunk(sock, view, chunk_size)
+
+
+def run_case(sender, receiver, chunks, chunk_size):
+    left, right = socket.socketpair()
+    left.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+    right.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    send_sock = CountingSocket(left)
+    recv_sock = CountingSocket(right)
+
+    thread = threading.Thread(target=sender, args=(send_sock, chunks, chunk_size))
+    tracemalloc.start()
+    start = time.perf_counter()
+    thread.start()
+    receiver(recv_sock, chunks, chunk_size)
+    elapsed = time.perf_counter() - start
+    thread.join()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    left.close()
+    right.close()
+
+    total = chunks * (chunk_size + framing.HEADER_SIZE)
+    return {
+        'recv_calls_per_chunk': round(recv_sock.calls / chunks, 2),
+        'send_calls_per_chunk': round(send_sock.calls / chunks, 2),
+        'peak_alloc_bytes': peak,
+        'throughput_mb_s': round(total / elapsed / (1024 * 1024), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микробенчмарк слоя кадрирования SLANFM')
+    parser.add_argument('--chunk-size', type=int, default=1024 * 1024)
+    parser.add_argument('--chunks', type=int, default=64)
+    args = parser.parse_args()
+
+    results = {
+        'chunk_size': args.chunk_size,
+        'chunks': args.chunks,
+        'legacy': run_case(legacy_sender, legacy_receiver, args.chunks, args.chunk_size),
+        'framing': run_case(framing_sender, framing_receiver, args.chunks, args.chunk_size)
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
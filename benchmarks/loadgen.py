@@ -0,0 +1,390 @@
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.loopback import FileClient, generate_certificate, generate_file, start_server
+
+COMMANDS = ('connect', 'list', 'upload', 'download', 'delete', 'info')
+DEFAULT_MIX = 'list=40,download=25,upload=20,info=10,delete=5'
+DEFAULT_SIZES = '64K=6,1M=3,16M=1'
+UNITS = {'K': 1024, 'M': 1024 * 1024, 'G': 1024 * 1024 * 1024}
+PERCENTILES = (50, 95, 99)
+MAX_ERROR_KINDS = 20
+
+
+def parse_size(value):
+    value = value.strip().upper()
+    if value[-1:] in UNITS:
+        return int(float(value[:-1]) * UNITS[value[-1]])
+    return int(value)
+
+
+def parse_weights(value, parse_key=str):
+    weights = {}
+    for item in value.split(','):
+        if not item:
+            continue
+        key, _, weight = item.partition('=')
+        weights[parse_key(key.strip())] = float(weight or 1)
+    if not weights or any(weight < 0 for weight in weights.values()) or not sum(weights.values()):
+        raise argparse.ArgumentTypeError(f"Некорректные веса: {value}")
+    return weights
+
+
+def parse_mix(value):
+    mix = parse_weights(value)
+    unknown = set(mix) - set(COMMANDS[1:])
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Неизвестные команды: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {command: [] for command in COMMANDS}
+        self.errors = {command: {} for command in COMMANDS}
+        self.bytes = 0
+        self.sessions = 0
+
+    def record(self, command, seconds, error=None, nbytes=0):
+        with self.lock:
+            if error is None:
+                self.latencies[command].append(seconds)
+                self.bytes += nbytes
+            else:
+                errors = self.errors[command]
+                if error in errors or len(errors) < MAX_ERROR_KINDS:
+                    errors[error] = errors.get(error, 0) + 1
+
+    def session_started(self):
+        with self.lock:
+            self.sessions += 1
+
+    def session_finished(self):
+        with self.lock:
+            self.sessions -= 1
+
+    def report(self, seconds):
+        with self.lock:
+            commands = {}
+            operations = 0
+            for command in COMMANDS:
+                latencies = self.latencies[command]
+                errors = sum(self.errors[command].values())
+                if not latencies and not errors:
+                    continue
+                operations += len(latencies)
+                commands[command] = {
+                    'count': len(latencies),
+                    'errors': errors,
+                    'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+                    **{f'p{p}_ms': round(percentile(latencies, p) * 1000, 2) if latencies else None for p in PERCENTILES}
+                }
+            return {
+                'commands': commands,
+                'operations_per_s': round(operations / seconds, 2),
+                'mb_per_s': round(self.bytes / seconds / UNITS['M'], 2),
+                'errors': {command: dict(errors) for command, errors in self.errors.items() if errors}
+            }
+
+
+class Session:
+    def __init__(self, index, args, workdir, sources, stats, deadline):
+        self.index = index
+        self.args = args
+        self.stats = stats
+        self.deadline = deadline
+        self.rng = random.Random(args.seed * 100003 + index)
+        self.workdir = workdir / f'session_{index}'
+        self.workdir.mkdir(exist_ok=True)
+        self.files = {}
+        for size, source in sources.items():
+            path = self.workdir / f'load_{index}_{size}.bin'
+            if not path.exists():
+                try:
+                    os.link(source, path)
+                except OSError:
+                    shutil.copyfile(source, path)
+            self.files[path.name] = (path, size)
+        self.uploaded = set()
+        self.client = None
+        self.broken = False
+
+    def timed(self, command, action, nbytes=0):
+        started = time.perf_counter()
+        try:
+            error = action()
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+            self.broken = isinstance(e, OSError)
+        seconds = time.perf_counter() - started
+        if error is None and self.client is not None and self.client.retry_after:
+            error = 'busy'
+        self.stats.record(command, seconds, error, nbytes)
+        return error is None
+
+    def connect(self):
+        client = FileClient(self.args.host, self.args.port)
+        client.config_file = str(self.workdir / 'config.json')
+        client.download_dir = self.workdir
+        client.auth_token = self.args.token
+        client.multiplex = not self.args.no_multiplex
+        client.config['transfer_config'] = {
+            'streams': 1,
+            'multiplex': client.multiplex,
+            'compression': None,
+            'dedup': False,
+            'delta': False,
+            'busy_retries': 0
+        }
+
+        def action():
+            result = client.connect(tls=self.args.tls)
+            if result is not True:
+                client.disconnect()
+                return result or 'не удалось подключиться'
+
+        self.client = client
+        if not self.timed('connect', action):
+            self.client = None
+            return False
+        return True
+
+    def choose(self):
+        mix = self.args.mix
+        command = self.rng.choices(list(mix), weights=list(mix.values()))[0]
+        if command in ('download', 'delete') and not self.uploaded:
+            return 'upload'
+        return command
+
+    def pick_upload(self):
+        sizes = self.args.sizes
+        size = self.rng.choices(list(sizes), weights=list(sizes.values()))[0]
+        return f'load_{self.index}_{size}.bin'
+
+    def step(self):
+        command = self.choose()
+        client = self.client
+        if command == 'list':
+            def action():
+                response = client.list_files()
+                if not response or response.get('status') != 'success':
+                    return response.get('message', 'ошибка') if response else 'нет ответа'
+            self.timed('list', action)
+        elif command == 'info':
+            def action():
+                response = client.get_server_info()
+                if not response or response.get('status') != 'success':
+                    return response.get('message', 'ошибка') if response else 'нет ответа'
+            self.timed('info', action)
+        elif command == 'upload':
+            name = self.pick_upload()
+            path, size = self.files[name]
+            if self.timed('upload', lambda: None if client.upload_file(path) else 'загрузка не удалась', size):
+                self.uploaded.add(name)
+        elif command == 'download':
+            name = self.rng.choice(sorted(self.uploaded))
+            path, size = self.files[name]
+            target = self.workdir / f'{name}.download'
+            self.timed('download', lambda: None if client.download_file(name, target) else 'скачивание не удалось', size)
+            if target.exists():
+                target.unlink()
+        elif command == 'delete':
+            name = self.rng.choice(sorted(self.uploaded))
+            self.uploaded.discard(name)
+
+            def action():
+                result = client.delete_file(name)
+                if result is not True:
+                    return result
+            self.timed('delete', action)
+
+        if self.broken or (not client.mux and not client.socket):
+            client.disconnect()
+            self.client = None
+            self.broken = False
+
+    def think(self):
+        if self.args.think <= 0:
+            return
+        delay = self.rng.expovariate(1 / self.args.think) if self.args.think_dist == 'exp' else self.args.think
+        time.sleep(max(0.0, min(delay, self.deadline - time.monotonic())))
+
+    def run(self):
+        self.stats.session_started()
+        try:
+            while time.monotonic() < self.deadline:
+                if self.client is None and not self.connect():
+                    self.think()
+                    continue
+                self.step()
+                self.think()
+        finally:
+            self.stats.session_finished()
+            if self.client is not None:
+                for name in self.uploaded:
+                    try:
+                        self.client.delete_file(name)
+                    except Exception:
+                        pass
+                self.client.disconnect()
+
+
+def sample_server(args, workdir):
+    client = FileClient(args.host, args.port)
+    client.config_file = str(workdir / 'monitor.json')
+    client.auth_token = args.token
+    client.multiplex = False
+    client.config['transfer_config'] = {'busy_retries': 0}
+    if client.connect(tls=args.tls) is not True:
+        return client, None
+
+    def sample():
+        response = client.get_stats()
+        if response and response.get('status') == 'success':
+            stats = response['stats']
+        else:
+            response = client.get_server_info()
+            if not response or response.get('status') != 'success':
+                return None
+            stats = response['info'].get('admission', {})
+        return {key: stats.get(key) for key in ('connections', 'transfers', 'waiting', 'rejected')}
+
+    return client, sample
+
+
+def run_level(args, workdir, sources, sessions):
+    stats = Stats()
+    started = time.monotonic()
+    deadline = started + args.ramp + args.duration
+    monitor, sample = sample_server(args, workdir)
+    timeline = []
+
+    workers = []
+    for index in range(sessions):
+        session = Session(index, args, workdir, sources, stats, deadline)
+        thread = threading.Thread(target=session.run, daemon=True)
+        workers.append(thread)
+
+    def launch():
+        for index, thread in enumerate(workers):
+            delay = started + args.ramp * index / max(1, sessions) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            thread.start()
+
+    launcher = threading.Thread(target=launch, daemon=True)
+    launcher.start()
+    while time.monotonic() < deadline:
+        time.sleep(min(args.interval, max(0.0, deadline - time.monotonic())))
+        point = {'t': round(time.monotonic() - started, 1), 'sessions': stats.sessions}
+        if sample:
+            try:
+                point.update(sample() or {})
+            except Exception:
+                sample = None
+        timeline.append(point)
+        print(f"{sessions} сессий, {point['t']} с: {point}", file=sys.stderr)
+
+    launcher.join()
+    for thread in workers:
+        thread.join()
+    monitor.disconnect()
+
+    return {
+        'sessions': sessions,
+        'duration': args.duration,
+        'ramp': args.ramp,
+        **stats.report(time.monotonic() - started),
+        'timeline': timeline
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор нагрузки для сервера SLANFM')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6666)
+    parser.add_argument('--token', default='', help='токен аутентификации')
+    parser.add_argument('--tls', action='store_true', help='подключаться по TLS')
+    parser.add_argument('--local', action='store_true', help='запустить сервер на loopback вместо подключения к --host')
+    parser.add_argument('--engine', choices=('threaded', 'asyncio'), default='threaded', help='движок локального сервера')
+    parser.add_argument('--sessions', default='10', help='число одновременных сессий; список через запятую задаёт ступени нагрузки')
+    parser.add_argument('--duration', type=float, default=60, help='длительность каждой ступени в секундах')
+    parser.add_argument('--ramp', type=float, default=5, help='за сколько секунд подключаются все сессии ступени')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='веса команд')
+    parser.add_argument('--sizes', type=lambda value: parse_weights(value, parse_size), default=DEFAULT_SIZES,
+                        help='распределение размеров загружаемых файлов')
+    parser.add_argument('--think', type=float, default=1.0, help='средняя пауза между командами в секундах')
+    parser.add_argument('--think-dist', dest='think_dist', choices=('exp', 'const'), default='exp')
+    parser.add_argument('--no-multiplex', dest='no_multiplex', action='store_true')
+    parser.add_argument('--interval', type=float, default=1.0, help='период опроса счётчиков сервера')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='файл для результатов в JSON (по умолчанию вывод в stdout)')
+    args = parser.parse_args()
+    levels = [int(item) for item in args.sessions.split(',') if item]
+
+    logging.getLogger().setLevel(logging.WARNING)
+    workdir = Path(tempfile.mkdtemp(prefix='slanfm-load-'))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        if args.local:
+            certificate = None
+            if args.tls:
+                certificate = generate_certificate(workdir)
+                if not certificate:
+                    parser.error("для --local --tls нужен openssl")
+            server = start_server(workdir / 'server', args.engine, certificate=certificate)
+            args.host, args.port = '127.0.0.1', server.port
+
+        sources = {}
+        for index, size in enumerate(sorted(args.sizes)):
+            path = workdir / f'source_{size}.bin'
+            generate_file(path, size, args.seed + index)
+            sources[size] = path
+
+        results = [run_level(args, workdir, sources, sessions) for sessions in levels]
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'server': f'{args.host}:{args.port}',
+            'tls': args.tls,
+            'multiplex': not args.no_multiplex,
+            'mix': args.mix,
+            'sizes': args.sizes,
+            'think': args.think,
+            'think_dist': args.think_dist,
+            'seed': args.seed
+        },
+        'levels': results
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / 'server'))
+sys.path.append(str(ROOT / 'client'))
+
+from server import FileServer
+from client import FileClient
+
+MB = 1024 * 1024
+DEFAULT_THRESHOLD = 0.1
+FULL_MATRIX = {
+    'chunk_sizes': [64 * 1024, MB],
+    'file_sizes': [MB, 64 * MB],
+    'concurrency': [1, 4],
+    'list_sizes': [100, 1000, 10000],
+    'repeat': 3
+}
+QUICK_MATRIX = {
+    'chunk_sizes': [64 * 1024],
+    'file_sizes': [MB, 16 * MB],
+    'concurrency': [1, 2],
+    'list_sizes': [100, 1000],
+    'repeat': 1
+}
+CONNECT_ROUNDS = 20
+LIST_ROUNDS = 20
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_listening(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Сервер на порту {port} не запустился")
+
+
+def generate_certificate(workdir):
+    cert_file = workdir / 'certificate.crt'
+    key_file = workdir / 'private_key.key'
+    try:
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                        '-subj', '/CN=localhost', '-keyout', str(key_file), '-out', str(cert_file)],
+                       check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return cert_file, key_file
+
+
+def generate_file(path, size, seed):
+    rng = random.Random(seed)
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining:
+            block = min(remaining, MB)
+            f.write(rng.randbytes(block))
+            remaining -= block
+
+
+def start_server(upload_dir, engine, chunk_size=None, certificate=None):
+    server = FileServer(host='127.0.0.1', port=free_port(), upload_dir=upload_dir, config_path=None)
+    server.engine = engine
+    if chunk_size:
+        server.chunk_size = server.chunk_size_min = server.chunk_size_max = chunk_size
+    if certificate:
+        server.tls_enabled = True
+        server.cert_file, server.key_file = (str(path) for path in certificate)
+        server.setup_tls()
+    threading.Thread(target=server.start, daemon=True).start()
+    wait_listening(server.port)
+    return server
+
+
+def open_client(server, workdir, tls):
+    client = FileClient('127.0.0.1', server.port)
+    client.config_file = str(workdir / 'config.json')
+    client.download_dir = workdir
+    client.config['transfer_config'] = {
+        'streams': 1,
+        'multiplex': True,
+        'compression': None,
+        'dedup': False,
+        'delta': False,
+        'busy_retries': 0
+    }
+    result = client.connect(tls=tls)
+    if result is not True:
+        raise RuntimeError(f"Не удалось подключиться к серверу: {result}")
+    return client
+
+
+def run_parallel(clients, action):
+    barrier = threading.Barrier(len(clients) + 1)
+    errors = []
+
+    def run(index, client):
+        barrier.wait()
+        try:
+            if not action(index, client):
+                errors.append(f"клиент {index}: передача не удалась")
+        except Exception as e:
+            errors.append(f"клиент {index}: {e}")
+
+    threads = [threading.Thread(target=run, args=(index, client)) for index, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise RuntimeError('; '.join(errors))
+    return elapsed
+
+
+def result(name, params, unit, better, samples):
+    return {
+        'name': name,
+        'params': params,
+        'unit': unit,
+        'better': better,
+        'value': round(statistics.median(samples), 3),
+        'samples': [round(sample, 3) for sample in samples]
+    }
+
+
+def bench_transfers(server, workdir, sources, tls, file_size, concurrency, repeat):
+    clients = [open_client(server, workdir, tls) for _ in range(concurrency)]
+    paths = sources[:concurrency]
+    downloads = workdir / 'downloads'
+    downloads.mkdir(exist_ok=True)
+    total = file_size * concurrency / MB
+    upload_samples = []
+    download_samples = []
+    try:
+        for _ in range(repeat):
+            elapsed = run_parallel(clients, lambda index, client: client.upload_file(paths[index]))
+            upload_samples.append(total / elapsed)
+            elapsed = run_parallel(clients, lambda index, client: client.download_file(
+                paths[index].name, downloads / paths[index].name))
+            download_samples.append(total / elapsed)
+            for path in downloads.iterdir():
+                path.unlink()
+    finally:
+        for client in clients:
+            client.disconnect()
+    return upload_samples, download_samples
+
+
+def bench_connect(server, workdir, tls):
+    samples = []
+    for _ in range(CONNECT_ROUNDS):
+        started = time.perf_counter()
+        client = open_client(server, workdir, tls)
+        samples.append((time.perf_counter() - started) * 1000)
+        client.disconnect()
+    return samples
+
+
+def bench_list(server, workdir):
+    client = open_client(server, workdir, False)
+    samples = []
+    try:
+        for _ in range(LIST_ROUNDS):
+            started = time.perf_counter()
+            response = client.list_files()
+            samples.append((time.perf_counter() - started) * 1000)
+            if not response or response.get('status') != 'success':
+                raise RuntimeError("Сервер не вернул список файлов")
+    finally:
+        client.disconnect()
+    return samples
+
+
+def run(args):
+    matrix = dict(QUICK_MATRIX if args.quick else FULL_MATRIX)
+    for key in ('chunk_sizes', 'file_sizes', 'concurrency', 'list_sizes'):
+        value = getattr(args, key)
+        if value:
+            matrix[key] = value
+    if args.repeat:
+        matrix['repeat'] = args.repeat
+
+    logging.getLogger().setLevel(logging.WARNING)
+    workdir = Path(tempfile.mkdtemp(prefix='slanfm-bench-'))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    results = []
+    try:
+        certificate = None
+        tls_modes = [False]
+        if args.tls != 'off':
+            certificate = (Path(args.cert), Path(args.key)) if args.cert and args.key else generate_certificate(workdir)
+            if certificate:
+                tls_modes = [True] if args.tls == 'on' else [False, True]
+            else:
+                print("openssl не найден, замеры с TLS пропущены", file=sys.stderr)
+
+        sources_dir = workdir / 'sources'
+        sources_dir.mkdir()
+        sources = {}
+        for file_size in matrix['file_sizes']:
+            sources[file_size] = []
+            for index in range(max(matrix['concurrency'])):
+                path = sources_dir / f'bench_{file_size}_{index}.bin'
+                generate_file(path, file_size, args.seed + index)
+                sources[file_size].append(path)
+
+        for tls in tls_modes:
+            for chunk_size in matrix['chunk_sizes']:
+                server = start_server(workdir / f'server_{int(tls)}_{chunk_size}', args.engine, chunk_size,
+                                      certificate if tls else None)
+                for file_size in matrix['file_sizes']:
+                    for concurrency in matrix['concurrency']:
+                        params = {'tls': tls, 'chunk_size': chunk_size, 'file_size': file_size, 'concurrency': concurrency}
+                        print(f"Передача: {params}", file=sys.stderr)
+                        uploads, downloads = bench_transfers(server, workdir, sources[file_size], tls,
+                                                             file_size, concurrency, matrix['repeat'])
+                        results.append(result('upload', params, 'MB/s', 'higher', uploads))
+                        results.append(result('download', params, 'MB/s', 'higher', downloads))
+
+            server = start_server(workdir / f'server_connect_{int(tls)}', args.engine, certificate=certificate if tls else None)
+            print(f"Подключение: tls={tls}", file=sys.stderr)
+            results.append(result('connect', {'tls': tls}, 'ms', 'lower', bench_connect(server, workdir, tls)))
+
+        for files in matrix['list_sizes']:
+            upload_dir = workdir / f'server_list_{files}'
+            upload_dir.mkdir()
+            for index in range(files):
+                (upload_dir / f'file_{index:06d}.txt').write_bytes(b'x')
+            server = start_server(upload_dir, args.engine)
+            print(f"Список: {files} файлов", file=sys.stderr)
+            results.append(result('list', {'files': files}, 'ms', 'lower', bench_list(server, workdir)))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'engine': args.engine,
+            'seed': args.seed,
+            'matrix': matrix
+        },
+        'results': results
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+
+    if args.baseline:
+        comparison = compare_reports(load_report(args.baseline), report, args.threshold)
+        print(json.dumps(comparison, indent=2, ensure_ascii=False))
+        return 1 if comparison['regressions'] else 0
+    return 0
+
+
+def result_key(item):
+    return item['name'] + json.dumps(item['params'], sort_keys=True)
+
+
+def load_report(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_reports(baseline, current, threshold):
+    previous = {result_key(item): item for item in baseline['results']}
+    comparison = {'threshold': threshold, 'regressions': [], 'improvements': [], 'unchanged': [], 'missing': []}
+    for item in current['results']:
+        base = previous.pop(result_key(item), None)
+        if base is None or not base['value']:
+            continue
+        change = (item['value'] - base['value']) / base['value']
+        entry = {
+            'name': item['name'],
+            'params': item['params'],
+            'unit': item['unit'],
+            'baseline': base['value'],
+            'current': item['value'],
+            'change': round(change, 3)
+        }
+        if item['better'] == 'lower':
+            change = -change
+        if change < -threshold:
+            comparison['regressions'].append(entry)
+        elif change > threshold:
+            comparison['improvements'].append(entry)
+        else:
+            comparison['unchanged'].append(entry)
+    comparison['missing'] = [{'name': item['name'], 'params': item['params']} for item in previous.values()]
+    return comparison
+
+
+def compare(args):
+    comparison = compare_reports(load_report(args.baseline), load_report(args.current), args.threshold)
+    print(json.dumps(comparison, indent=2, ensure_ascii=False))
+    return 1 if comparison['regressions'] else 0
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк протокола передачи SLANFM через loopback')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='выполнить замеры')
+    run_parser.add_argument('--output', help='файл для результатов в JSON (по умолчанию вывод в stdout)')
+    run_parser.add_argument('--quick', action='store_true', help='уменьшенная матрица для быстрой проверки')
+    run_parser.add_argument('--chunk-sizes', dest='chunk_sizes', type=int_list)
+    run_parser.add_argument('--file-sizes', dest='file_sizes', type=int_list)
+    run_parser.add_argument('--concurrency', type=int_list)
+    run_parser.add_argument('--list-sizes', dest='list_sizes', type=int_list)
+    run_parser.add_argument('--repeat', type=int)
+    run_parser.add_argument('--tls', choices=('off', 'on', 'both'), default='both')
+    run_parser.add_argument('--cert', help='сертификат для TLS (по умолчанию создаётся через openssl)')
+    run_parser.add_argument('--key', help='закрытый ключ для TLS')
+    run_parser.add_argument('--engine', choices=('threaded', 'asyncio'), default='threaded')
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--baseline', help='сравнить с сохранёнными результатами')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    compare_parser = commands.add_parser('compare', help='сравнить два файла результатов')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args()
+    sys.exit(run(args) if args.command == 'run' else compare(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,89 @@
 import socket
 import json
+import copy
+import functools
 import os
+import random
 import hashlib
-from pathlib import Path
-import struct
+import io
+from pathlib import Path, PurePosixPath
 import sys
 import ssl
+import threading
+import time
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from slanfm import chunking, compression, delta, framing, multiplex, tracing, tree, tuning
+from pool import ConnectionPool
+
+
+MAX_BACKOFF = 60
+MAX_RESPONSE = 64 * 1024 * 1024
+
+
+def multiplexed(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.retry_after = None
+            if self.mux is None and self.pool is None:
+                result = method(self, *args, **kwargs)
+            elif self.mux is None:
+                result = self.pool.call(method, *args, **kwargs)
+            else:
+                channel = self.open_channel()
+                try:
+                    result = method(channel, *args, **kwargs)
+                    self.last_transfer = channel.last_transfer
+                    self.retry_after = channel.retry_after
+                finally:
+                    channel.socket.close()
+
+            if not self.retry_after or attempt >= self.busy_retries():
+                return result
+            self.back_off(attempt)
+            attempt += 1
+    return wrapper
+
+
+def traced(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.trace = tracing.NULL_TRACE
+        try:
+            result = method(self, *args, **kwargs)
+        except Exception as e:
+            self.trace.finish('error', error=str(e))
+            raise
+        if result:
+            self.trace.finish('ok', tuning=self.tuning_stats.report() if self.tuning_stats else None,
+                              compression=self.compression_stats.report() if self.compression_stats else None)
+        elif result is None:
+            self.trace.finish('fallback')
+        else:
+            self.trace.finish('busy' if self.retry_after else 'error')
+        return result
+    return wrapper
+
+
+class HashingWriter:
+    def __init__(self, f, hash_object):
+        self.f = f
+        self.hash_object = hash_object
+
+    def write(self, data):
+        self.hash_object.update(data)
+        return self.f.write(data)
 
 
 class FileClient:
+    state_lock = threading.Lock()
+    tls_lock = threading.Lock()
+    tls_context = None
+    tls_sessions = {}
+
     def __init__(self, server_host=None, server_port=None):
         self.server_host = server_host
         self.server_port = server_port
@@ -16,49 +91,72 @@ class FileClient:
         self.download_dir = Path('downloads')
         self.download_dir.mkdir(exist_ok=True)
         self.chunk_size = 65536
+        self.min_chunk_size = self.chunk_size
+        self.max_chunk_size = self.chunk_size
+        self.rtt = None
+        self.retry_after = None
         self.max_file_size = 2 * 1024 * 1024 * 1024
         self.timeout = 120
+        self.tls_enabled = False
+        self.download_modes = ['chunked']
+        self.files = {}
+        self.dirs = {}
+        self.list_epoch = None
+        self.list_version = None
+        self.last_transfer = None
+        self.compression_stats = None
+        self.tuning_stats = None
+        self.compression_algorithms = []
+        self.dedup_supported = False
+        self.delta_supported = False
+        self.batch_supported = False
+        self.tree_supported = False
+        self.protocol_versions = [1]
+        self.mux = None
+        self.pool = None
+        self.trace = tracing.NULL_TRACE
+        self.list_lock = threading.Lock()
         self.config_file = "config.json"
+        self.state_file = "transfers.json"
         self.config = self.load_config()
         self.auth_token = self.config.get('authentication_config', {}).get('token', '')
+        self.multiplex = self.config.get('transfer_config', {}).get('multiplex', True)
+
+    def connect(self, tls=None):
+        attempt = 0
+        while True:
+            self.retry_after = None
+            result = self.connect_once(tls)
+            if result is True or not self.retry_after or attempt >= self.busy_retries():
+                return result
+            self.back_off(attempt)
+            attempt += 1
 
-    def connect(self):
+    def connect_once(self, tls=None):
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-            sock.settimeout(2.5)
-            sock.connect((self.server_host, self.server_port))
-
-            original_socket = self.socket
-            self.socket = sock
-            init_response = self.receive_response()
-            self.socket = original_socket
-
-            if init_response and init_response.get('type') == 'init':
-                self.socket = sock
-                self.tls_enabled = False
-            else:
-                sock.close()
+            if tls is None:
+                tls = self.server_mode() != 'plain'
 
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-                sock.settimeout(5)
-                sock.connect((self.server_host, self.server_port))
+            init_response = self.open_socket(tls)
+            if not init_response or init_response.get('type') == 'tls_required':
+                tls = not tls
+                init_response = self.open_socket(tls)
 
-                context = ssl.create_default_context()
-                context.check_hostname = False
-                context.verify_mode = ssl.CERT_NONE
-                tls_sock = context.wrap_socket(sock, server_hostname=self.server_host)
+            if init_response and init_response.get('type') == 'busy':
+                self.socket.close()
+                self.socket = None
+                return f"Сервер перегружен, повторите через {self.retry_after} с"
 
-                self.socket = tls_sock
-                init_response = self.receive_response()
-                if init_response and init_response.get('type') == 'init':
-                    self.socket = tls_sock
-                    self.tls_enabled = True
-                else:
-                    tls_sock.close()
+            if not init_response or init_response.get('type') != 'init':
+                if self.socket:
+                    self.socket.close()
                     self.socket = None
-                    return "Не удалось установить соединение с сервером"
+                return "Не удалось установить соединение с сервером"
+
+            self.tls_enabled = tls
+            if tls:
+                self.save_tls_session(self.socket.session)
+            self.save_server_mode('tls' if tls else 'plain')
 
             cfg = getattr(self, 'config', {}).get('values_config', {})
             chunk_min, chunk_max = cfg.get('chunk_size_range', [1024, 10485760])
@@ -78,8 +176,17 @@ class FileClient:
                 return "Таймаут сервера не входит в допустимый диапазон клиента"
 
             self.chunk_size = chunk_size
+            self.min_chunk_size = max(init_response.get('min_chunk_size', chunk_size), chunk_min)
+            self.max_chunk_size = min(init_response.get('max_chunk_size', chunk_size), chunk_max)
             self.max_file_size = max_file_size
             self.timeout = timeout
+            self.download_modes = init_response.get('download_modes', ['chunked'])
+            self.protocol_versions = init_response.get('protocol_versions', [1])
+            self.compression_algorithms = init_response.get('compression', [])
+            self.dedup_supported = init_response.get('dedup', False)
+            self.delta_supported = init_response.get('delta', False)
+            self.batch_supported = init_response.get('batch', False)
+            self.tree_supported = init_response.get('tree', False)
             self.socket.settimeout(self.timeout)
 
             if auth_required:
@@ -92,11 +199,96 @@ class FileClient:
                 else:
                     return "need_auth"
 
+            self.upgrade()
             return True
 
         except Exception as e:
             return f"Ошибка подключения: {e}"
         
+    def open_socket(self, tls):
+        self.socket = None
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(5 if tls else 2.5)
+        connect_started = time.perf_counter()
+        sock.connect((self.server_host, self.server_port))
+        self.rtt = time.perf_counter() - connect_started
+
+        if tls:
+            try:
+                sock = self.client_tls_context().wrap_socket(
+                    sock, server_hostname=self.server_host, session=self.tls_session()
+                )
+            except OSError:
+                sock.close()
+                return None
+
+        self.socket = sock
+        init_response = self.receive_response()
+        if not init_response or init_response.get('type') not in ('init', 'busy'):
+            sock.close()
+            self.socket = None
+        return init_response
+
+    def server_key(self):
+        return f"{self.server_host}:{self.server_port}"
+
+    def server_mode(self):
+        return self.config.get('server_modes', {}).get(self.server_key())
+
+    def save_server_mode(self, mode):
+        if self.server_mode() == mode:
+            return
+        self.config.setdefault('server_modes', {})[self.server_key()] = mode
+        with FileClient.state_lock:
+            try:
+                with open(self.config_path(), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                data = {}
+            data.setdefault('server_modes', {})[self.server_key()] = mode
+            try:
+                with open(self.config_path(), 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+            except Exception:
+                return
+
+    @classmethod
+    def client_tls_context(cls):
+        with cls.tls_lock:
+            if cls.tls_context is None:
+                context = ssl.create_default_context()
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+                cls.tls_context = context
+            return cls.tls_context
+
+    def tls_session(self):
+        with self.tls_lock:
+            return self.tls_sessions.get((self.server_host, self.server_port))
+
+    def save_tls_session(self, session):
+        if session is None:
+            return
+        with self.tls_lock:
+            self.tls_sessions[(self.server_host, self.server_port)] = session
+
+    def busy_retries(self):
+        retries = self.config.get('transfer_config', {}).get('busy_retries', 3)
+        return retries if isinstance(retries, int) and retries >= 0 else 3
+
+    def pool_size(self):
+        size = self.config.get('transfer_config', {}).get('pool_size', 4)
+        return size if isinstance(size, int) and size >= 1 else 4
+
+    def back_off(self, attempt):
+        delay = min(self.retry_after * 2 ** attempt, MAX_BACKOFF)
+        time.sleep(delay * random.uniform(0.8, 1.2))
+
+    def note_busy(self, retry_after):
+        if retry_after:
+            self.retry_after = max(self.retry_after or 0, retry_after)
+
     def resource_path(self, relative_path):
         try:
             base_path = Path(sys._MEIPASS)
@@ -111,6 +303,49 @@ class FileClient:
             base_path = Path(__file__).parent
         return base_path / self.config_file
 
+    def state_path(self):
+        return self.config_path().with_name(self.state_file)
+
+    def open_trace(self, kind, filename, **fields):
+        trace_file = self.config.get('transfer_config', {}).get('trace_file')
+        if not trace_file or not isinstance(trace_file, str):
+            return tracing.NULL_TRACE
+        path = Path(trace_file)
+        if not path.is_absolute():
+            path = self.config_path().with_name(trace_file)
+        try:
+            tracer = tracing.Tracer(str(path))
+        except OSError:
+            return tracing.NULL_TRACE
+        return tracer.start('client', kind, filename, server=f"{self.server_host}:{self.server_port}",
+                            tls=self.tls_enabled, mux=isinstance(self.socket, multiplex.Stream), **fields)
+
+    def transfer_key(self, filename):
+        return f"{self.server_host}:{self.server_port}/{filename}"
+
+    def load_transfer_states(self):
+        try:
+            with open(self.state_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def save_transfer_state(self, key, state):
+        with FileClient.state_lock:
+            states = self.load_transfer_states()
+            if state is None:
+                if states.pop(key, None) is None:
+                    return
+            else:
+                states[key] = state
+            try:
+                tmp_path = self.state_path().with_name(self.state_file + '.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(states, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.state_path())
+            except Exception:
+                return
+
     def load_config(self):
         try:
             with open(self.config_path(), 'r', encoding='utf-8') as f:
@@ -153,82 +388,482 @@ class FileClient:
 
         response = self.receive_response()
         if response and response.get('status') == 'success':
+            self.auth_token = token
+            self.upgrade()
             return True
         else:
             return False
 
+    def upgrade(self):
+        if not self.multiplex or multiplex.PROTOCOL_VERSION not in self.protocol_versions:
+            return False
+
+        self.send_command({'command': 'upgrade', 'protocol': multiplex.PROTOCOL_VERSION})
+        response = self.receive_response()
+        if not response or response.get('status') != 'success':
+            return False
+
+        self.mux = multiplex.Multiplexer(self.socket)
+        self.mux.start()
+        self.download_modes = ['chunked']
+        return True
+
+    def enable_pool(self, size=None):
+        if self.mux is not None or self.pool is not None or self.socket is None:
+            return False
+        size = size or self.pool_size()
+        if size < 2:
+            return False
+        seed = copy.copy(self)
+        self.pool = ConnectionPool(self, size)
+        self.pool.add(seed)
+        return True
+
+    def concurrent(self):
+        return self.mux is not None or self.pool is not None
+
+    def open_channel(self):
+        channel = copy.copy(self)
+        channel.mux = None
+        channel.socket = self.mux.open_stream()
+        channel.socket.settimeout(self.timeout)
+        return channel
+
+    def compression_request(self):
+        requested = self.config.get('transfer_config', {}).get('compression', {'algorithm': 'zlib', 'level': 1})
+        return compression.negotiate(requested, self.compression_algorithms)
+
+    def decompressor_for(self, response):
+        codec = compression.negotiate(response.get('compression'))
+        return compression.ChunkDecompressor(codec['algorithm']) if codec else None
+
+    def compressor_for(self, response):
+        codec = compression.negotiate(response.get('compression'))
+        return compression.ChunkCompressor(codec['algorithm'], codec['level']) if codec else None
+
+    def transfer_tuner(self, sending=True):
+        self.tuning_stats = tuning.TransferTuner(self.socket, self.chunk_size, self.min_chunk_size,
+                                                 self.max_chunk_size, sending, self.rtt)
+        return self.tuning_stats
+
+    def record_transfer(self, streams, file_size, started):
+        self.last_transfer = {'streams': streams, 'size': file_size, 'seconds': time.time() - started}
+        if self.compression_stats:
+            self.last_transfer['compression'] = self.compression_stats.report()
+        if self.tuning_stats:
+            self.last_transfer['tuning'] = self.tuning_stats.report()
+
+    def request_download(self, filename, offset=0, length=None):
+        codec = self.compression_request()
+        mode = 'sendfile' if 'sendfile' in self.download_modes and not self.tls_enabled and not codec else 'chunked'
+
+        command = {
+            'command': 'download',
+            'filename': filename,
+            'mode': mode,
+            'offset': offset,
+            'max_chunk_size': self.max_chunk_size
+        }
+        if length is not None:
+            command['length'] = length
+        if codec:
+            command['compression'] = codec
+        self.send_command(command)
+
+        response = self.receive_response()
+        if not response or response.get('status') != 'success':
+            return None
+        return response
+
+    def delta_enabled(self):
+        return self.delta_supported and self.config.get('transfer_config', {}).get('delta', True)
+
+    def transfer_streams(self, file_size):
+        cfg = self.config.get('transfer_config', {})
+        streams = cfg.get('streams', 4)
+        threshold = cfg.get('stripe_threshold', 64 * 1024 * 1024)
+        if not isinstance(streams, int) or streams < 2 or file_size < threshold:
+            return 1
+        return min(streams, max(1, file_size // self.chunk_size))
+
+    def stripe_ranges(self, file_size, streams):
+        step = -(-file_size // streams)
+        step = -(-step // self.chunk_size) * self.chunk_size
+        return [(offset, min(step, file_size - offset)) for offset in range(0, file_size, step)]
+
+    def missing_ranges(self, received, file_size):
+        missing = []
+        covered = 0
+        for offset, length in sorted(received):
+            if offset > covered:
+                missing.append((covered, offset - covered))
+            covered = max(covered, offset + length)
+        if covered < file_size:
+            missing.append((covered, file_size - covered))
+        return missing
+
+    def open_stream(self, retry=True):
+        stream = FileClient(self.server_host, self.server_port)
+        stream.config = self.config
+        stream.auth_token = self.auth_token
+        stream.download_dir = self.download_dir
+        stream.multiplex = False
+        connect = stream.connect if retry else stream.connect_once
+        if connect(tls=self.tls_enabled) is not True:
+            self.note_busy(stream.retry_after)
+            stream.disconnect()
+            return None
+        return stream
+
+    def run_striped(self, ranges, worker, file_size, progress_callback=None, attempts=3):
+        base = file_size - sum(length for _, length in ranges)
+        done = [0] * len(ranges)
+        results = [False] * len(ranges)
+        stats = [None] * len(ranges)
+        progress_lock = threading.Lock()
+        interrupted = []
+
+        def run(index, offset, length):
+            def report(percent):
+                with progress_lock:
+                    done[index] = int(length * percent / 100)
+                    total = base + sum(done)
+                if progress_callback and file_size > 0:
+                    progress_callback(min(total / file_size * 100, 100))
+
+            stream = self.open_stream()
+            if stream is None:
+                return
+            with progress_lock:
+                done[index] = 0
+            try:
+                results[index] = worker(stream, offset, length, report)
+                stats[index] = stream.compression_stats
+            except Exception:
+                results[index] = False
+            except BaseException as e:
+                results[index] = False
+                interrupted.append(e)
+            finally:
+                self.note_busy(stream.retry_after)
+                stream.disconnect(graceful=results[index] is True)
+
+        pending = list(range(len(ranges)))
+        for attempt in range(attempts):
+            threads = [threading.Thread(target=run, args=(index, *ranges[index]), daemon=True) for index in pending]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            pending = [index for index in pending if not results[index]]
+            if not pending or interrupted:
+                break
+        ranges[:] = [(ranges[index][0] + done[index], ranges[index][1] - done[index])
+                     for index in pending if done[index] < ranges[index][1]]
+
+        self.compression_stats = None
+        self.tuning_stats = None
+        for item in stats:
+            if item:
+                if self.compression_stats is None:
+                    self.compression_stats = compression.CompressionStats(item.algorithm)
+                self.compression_stats.merge(item)
+        if interrupted:
+            raise interrupted[0]
+        return not pending
+
+    @multiplexed
+    @traced
     def download_file(self, filename, save_path=None, progress_callback=None):
         if not save_path:
             save_path = self.download_dir / filename
+        save_path = Path(save_path)
+        part_path = save_path.with_name(save_path.name + '.part')
+        state_key = self.transfer_key(filename)
+        started = time.time()
+        trace = self.trace = self.open_trace('download', filename)
 
-        self.send_command({
-            'command': 'download',
-            'filename': filename
-        })
+        offset = 0
+        state = self.load_transfer_states().get(state_key)
+        if state and state.get('save_path') == str(save_path) and part_path.exists():
+            if state.get('ranges') is not None:
+                trace.note(mode='striped', resumed=True)
+                return self.download_file_striped(filename, save_path, max(len(state['ranges']), 1), progress_callback, state)
+            offset = min(part_path.stat().st_size, state.get('size', 0))
 
-        response = self.receive_response()
+        with trace.phase('request'):
+            response = self.request_download(filename, offset)
+            if offset and response and (response.get('md5') != state.get('md5') or response['size'] != state.get('size')):
+                self.send_command({'status': 'cancel'})
+                response = self.request_download(filename, 0)
+            elif offset and not response and not self.retry_after:
+                response = self.request_download(filename, 0)
 
-        if not response or response.get('status') != 'success':
-            error_msg = response.get('message', 'Неизвестная ошибка') if response else 'Нет ответа от сервера'
+        if not response:
             return False
 
         file_size = response['size']
         server_md5 = response.get('md5', '')
+        offset = response.get('offset', 0)
+        length = response.get('length', file_size - offset)
 
+        streams = self.transfer_streams(file_size)
+        trace.note(size=file_size, offset=offset, mode=response.get('mode'), streams=streams if offset == 0 else 1)
+        if offset == 0 and streams > 1:
+            self.send_command({'status': 'cancel'})
+            return self.download_file_striped(filename, save_path, streams, progress_callback)
+
+        self.save_transfer_state(state_key, {'save_path': str(save_path), 'size': file_size, 'md5': server_md5})
         self.send_command({'status': 'ready'})
 
+        self.compression_stats = self.decompressor_for(response)
+        with trace.file(open(part_path, 'r+b' if offset else 'wb')) as f, trace.phase('transfer'):
+            f.seek(offset)
+            f.truncate()
+            if response.get('mode') == 'sendfile':
+                received = self.receive_stream(f, length, progress_callback, offset, file_size)
+            else:
+                received = self.receive_chunks(f, length, progress_callback, offset, file_size, self.compression_stats)
+
+        if received != length:
+            return False
+
+        if server_md5:
+            md5_hash = trace.hasher(hashlib.md5())
+            with trace.file(open(part_path, 'rb')) as f, trace.phase('verify'):
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    md5_hash.update(chunk)
+
+            if md5_hash.hexdigest() != server_md5:
+                os.remove(part_path)
+                self.save_transfer_state(state_key, None)
+                return False
+
+        os.replace(part_path, save_path)
+        self.save_transfer_state(state_key, None)
+        self.record_transfer(1, file_size, started)
+        if progress_callback:
+            progress_callback(100)
+        return True
+
+    def download_file_striped(self, filename, save_path, streams, progress_callback=None, state=None):
+        started = time.time()
+        response = self.request_download(filename, 0, 0)
+        if not response:
+            return False
+        self.send_command({'status': 'cancel'})
+
+        file_size = response['size']
+        server_md5 = response.get('md5', '')
+        part_path = save_path.with_name(save_path.name + '.part')
+        state_key = self.transfer_key(filename)
+        if state and (state.get('size'), state.get('md5')) == (file_size, server_md5):
+            ranges = [tuple(item) for item in state['ranges']]
+        else:
+            ranges = self.stripe_ranges(file_size, streams)
+            with open(part_path, 'wb') as f:
+                f.truncate(file_size)
+        state = {'save_path': str(save_path), 'size': file_size, 'md5': server_md5}
+        self.save_transfer_state(state_key, {**state, 'ranges': ranges})
+
+        def worker(stream, offset, length, report):
+            return stream.download_range(filename, offset, length, part_path, report, preallocated=True)
+
+        with self.trace.phase('transfer'):
+            try:
+                completed = self.run_striped(ranges, worker, file_size, progress_callback)
+            finally:
+                self.save_transfer_state(state_key, {**state, 'ranges': ranges})
+        if not completed:
+            return False
+
+        md5_hash = self.trace.hasher(hashlib.md5())
+        with self.trace.file(open(part_path, 'rb')) as f, self.trace.phase('verify'):
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                md5_hash.update(chunk)
+
+        if server_md5 and md5_hash.hexdigest() != server_md5:
+            os.remove(part_path)
+            self.save_transfer_state(state_key, None)
+            return False
+
+        os.replace(part_path, save_path)
+        self.save_transfer_state(state_key, None)
+        self.record_transfer(streams, file_size, started)
+        if progress_callback:
+            progress_callback(100)
+        return True
+
+    @multiplexed
+    @traced
+    def download_range(self, filename, offset, length, save_path, progress_callback=None, preallocated=False):
+        trace = self.trace = self.open_trace('download_range', filename, offset=offset, length=length)
+        with trace.phase('request'):
+            response = self.request_download(filename, offset, length)
+        if not response or response.get('offset') != offset or response.get('length') != length:
+            if response:
+                self.send_command({'status': 'cancel'})
+            return False
+
+        self.send_command({'status': 'ready'})
+
+        self.compression_stats = self.decompressor_for(response)
+        with trace.file(open(save_path, 'r+b' if preallocated else 'wb')) as f, trace.phase('transfer'):
+            if preallocated:
+                f.seek(offset)
+            if response.get('mode') == 'sendfile':
+                received = self.receive_stream(f, length, progress_callback)
+            else:
+                received = self.receive_chunks(f, length, progress_callback, decompressor=self.compression_stats)
+
+        return received == length
+
+    @multiplexed
+    @traced
+    def download_file_delta(self, filename, save_path=None, progress_callback=None):
+        save_path = Path(save_path or self.download_dir / filename)
+        if not self.delta_enabled() or not save_path.is_file():
+            return None
+
+        started = time.time()
+        trace = self.trace = self.open_trace('download_delta', filename)
+        with trace.file(open(save_path, 'rb')) as f, trace.phase('signature'):
+            chunks = delta.signature(f)
+
+        self.send_command({
+            'command': 'download_delta',
+            'filename': filename,
+            'signature': chunks,
+            'compression': self.compression_request(),
+            'max_chunk_size': self.max_chunk_size
+        })
+        with trace.phase('wait_ready'):
+            response = self.receive_response()
+        if not response:
+            return False
+        if response.get('status') != 'ready':
+            if response.get('message') == 'Неизвестная команда':
+                return None
+            return False
+
+        ops = response['ops']
+        file_size = response['size']
+        if not delta.valid_ops(ops, save_path.stat().st_size, file_size):
+            return False
+
+        literal = delta.literal_bytes(ops)
+        part_path = save_path.with_name(save_path.name + '.delta')
+        self.compression_stats = self.decompressor_for(response)
+        received = 0
+        try:
+            with trace.file(open(save_path, 'rb')) as base, trace.file(open(part_path, 'wb')) as f, trace.phase('transfer'):
+                for op in ops:
+                    if op[0] == 'copy':
+                        base.seek(op[1])
+                        remaining = op[2]
+                        while remaining:
+                            data = base.read(min(remaining, 1024 * 1024))
+                            if not data:
+                                return False
+                            f.write(data)
+                            remaining -= len(data)
+                    else:
+                        n = self.receive_chunks(f, op[1], progress_callback, received, literal, self.compression_stats)
+                        if n != op[1]:
+                            return False
+                        received += n
+
+            md5_hash = trace.hasher(hashlib.md5())
+            with trace.file(open(part_path, 'rb')) as f, trace.phase('verify'):
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    md5_hash.update(chunk)
+            if md5_hash.hexdigest() != response.get('md5'):
+                return False
+
+            os.replace(part_path, save_path)
+        finally:
+            if part_path.exists():
+                os.remove(part_path)
+
+        self.record_transfer(1, file_size, started)
+        self.last_transfer['delta'] = {'literal_bytes': literal, 'saved_bytes': file_size - literal}
+        if progress_callback:
+            progress_callback(100)
+        return True
+
+    def receive_chunks(self, f, length, progress_callback=None, base=0, total=None, decompressor=None):
+        total = total or length
         received = 0
-        with open(save_path, 'wb') as f:
-            while received < file_size:
+        tuner = self.transfer_tuner(sending=False)
+        with framing.borrow(framing.HEADER_SIZE + self.max_chunk_size) as buffer:
+            view = memoryview(buffer)
+            payload = view[framing.HEADER_SIZE:]
+            self.trace.begin_chunks()
+            while received < length:
                 try:
-                    chunk_size_data = self.receive_all(4)
-                    if not chunk_size_data or len(chunk_size_data) != 4:
+                    started = time.perf_counter()
+                    header = framing.recv_frame_header(self.socket, view)
+                    if header is None:
+                        break
+                    chunk_size, compressed = compression.split_header(header)
+                    if chunk_size > len(payload) or (compressed and decompressor is None):
                         break
 
-                    chunk_size = struct.unpack('>I', chunk_size_data)[0]
-
-                    chunk = self.receive_all(chunk_size)
-                    if not chunk or len(chunk) != chunk_size:
+                    chunk = payload[:chunk_size]
+                    if framing.recv_into_exact(self.socket, chunk) != chunk_size:
                         break
 
+                    if compressed:
+                        chunk = decompressor.decompress(chunk, min(len(payload), length - received))
+                    elif decompressor:
+                        decompressor.account(chunk_size)
+                    self.trace.chunk(len(chunk), started, 'recv')
+
                     f.write(chunk)
                     received += len(chunk)
+                    tuner.update(len(chunk))
 
-                    if progress_callback and file_size > 0:
-                        percent = (received / file_size) * 100
+                    if progress_callback and total > 0:
+                        percent = ((base + received) / total) * 100
                         progress_callback(percent)
 
-                    if file_size > 0:
-                        percent = (received / file_size) * 100
-
                 except socket.timeout:
                     break
                 except Exception:
                     break
+        return received
 
-        if received == file_size:
-            if server_md5:
-                md5_hash = hashlib.md5()
-                with open(save_path, 'rb') as f:
-                    for chunk in iter(lambda: f.read(8192), b''):
-                        md5_hash.update(chunk)
+    def receive_stream(self, f, length, progress_callback=None, base=0, total=None):
+        total = total or length
+        received = 0
+        tuner = self.transfer_tuner(sending=False)
+        with framing.borrow(framing.HEADER_SIZE + self.max_chunk_size) as buffer:
+            view = memoryview(buffer)
+            self.trace.begin_chunks()
+            while received < length:
+                try:
+                    started = time.perf_counter()
+                    n = self.socket.recv_into(view, min(len(view), length - received))
+                    if not n:
+                        break
+                    self.trace.chunk(n, started, 'recv')
 
-                client_md5 = md5_hash.hexdigest()
+                    f.write(view[:n])
+                    received += n
+                    tuner.update(n)
 
-                if client_md5 == server_md5:
-                    if progress_callback:
-                        progress_callback(100)
-                    return True
-                else:
-                    if os.path.exists(save_path):
-                        os.remove(save_path)
-                    return False
-            return True
-        else:
-            if os.path.exists(save_path):
-                os.remove(save_path)
-            return False
+                    if progress_callback and total > 0:
+                        percent = ((base + received) / total) * 100
+                        progress_callback(percent)
+
+                except socket.timeout:
+                    break
+                except Exception:
+                    break
+        return received
 
+    @multiplexed
+    @traced
     def upload_file(self, filepath, progress_callback=None):
         path = Path(filepath)
 
@@ -240,52 +875,89 @@ class FileClient:
         if file_size > self.max_file_size:
             return False
 
-        md5_hash = hashlib.md5()
-        with open(path, 'rb') as f:
-            for chunk in iter(lambda: f.read(8192), b''):
-                md5_hash.update(chunk)
+        started = time.time()
+        trace = self.trace = self.open_trace('upload', path.name, size=file_size)
+        dedup = (self.dedup_supported and file_size >= chunking.MAX_SIZE
+                 and self.config.get('transfer_config', {}).get('dedup', True))
+        chunks = None
+        md5_hash = trace.hasher(hashlib.md5())
+        with trace.file(open(path, 'rb')) as f, trace.phase('hash'):
+            if dedup:
+                chunks = chunking.manifest(f, md5_hash)
+            else:
+                for chunk in iter(lambda: f.read(8192), b''):
+                    md5_hash.update(chunk)
         original_md5 = md5_hash.hexdigest()
 
+        if dedup:
+            trace.note(mode='dedup')
+            result = self.upload_file_dedup(path, file_size, original_md5, chunks, progress_callback)
+            if result is not None:
+                return result
+
+        streams = self.transfer_streams(file_size)
+        if streams > 1:
+            trace.note(mode='striped', streams=streams)
+            result = self.upload_file_striped(path, file_size, original_md5, streams, progress_callback, chunks)
+            if result is not None:
+                return result
+
+        trace.note(mode='chunked', streams=1)
         self.send_command({
             'command': 'upload',
             'filename': path.name,
-            'size': file_size
+            'size': file_size,
+            'md5': original_md5,
+            'resume': True,
+            'compression': self.compression_request(),
+            'chunks': chunks
         })
 
-        response = self.receive_response()
+        with trace.phase('wait_ready'):
+            response = self.receive_response()
 
         if not response:
             return False
 
         if response.get('status') == 'ready':
 
-            uploaded = 0
-            with open(path, 'rb') as f:
+            uploaded = response.get('offset', 0)
+            trace.note(offset=uploaded)
+            compressor = self.compression_stats = self.compressor_for(response)
+            tuner = self.transfer_tuner()
+            with trace.file(open(path, 'rb')) as f, framing.borrow(framing.HEADER_SIZE + tuner.maximum) as buffer, \
+                    trace.phase('transfer'):
+                f.seek(uploaded)
+                view = memoryview(buffer)
+                trace.begin_chunks()
                 while True:
-                    chunk = f.read(self.chunk_size)
-                    if not chunk:
+                    chunk_size = f.readinto(view[framing.HEADER_SIZE:framing.HEADER_SIZE + tuner.chunk_size])
+                    if not chunk_size:
                         break
 
-                    chunk_size = len(chunk)
                     try:
-                        self.socket.sendall(struct.pack('>I', chunk_size))
-                        self.socket.sendall(chunk)
+                        chunk_started = time.perf_counter()
+                        if compressor:
+                            compressor.send_chunk(self.socket, view, chunk_size)
+                        else:
+                            framing.send_chunk(self.socket, view, chunk_size)
+                        trace.chunk(chunk_size, chunk_started)
                     except (ConnectionError, BrokenPipeError):
                         return False
 
-                    uploaded += len(chunk)
+                    uploaded += chunk_size
+                    tuner.update(chunk_size)
 
                     if progress_callback and file_size > 0:
                         percent = (uploaded / file_size) * 100
                         progress_callback(percent)
 
-                    if file_size > 0:
-                        percent = (uploaded / file_size) * 100
-
-            response = self.receive_response()
+            with trace.phase('wait_result'):
+                response = self.receive_response()
             if response and response.get('status') == 'success':
                 server_md5 = response.get('md5', '')
                 if server_md5 == original_md5:
+                    self.record_transfer(1, file_size, started)
                     if progress_callback:
                         progress_callback(100)
                     return True
@@ -298,12 +970,588 @@ class FileClient:
             error_msg = response.get('message', 'Неизвестная ошибка')
             return False
 
-    def disconnect(self):
-        if self.socket:
+    def upload_file_dedup(self, path, file_size, md5, chunks, progress_callback=None):
+        started = time.time()
+        self.send_command({
+            'command': 'upload_dedup',
+            'filename': path.name,
+            'size': file_size,
+            'md5': md5,
+            'chunks': chunks,
+            'compression': self.compression_request()
+        })
+        with self.trace.phase('wait_ready'):
+            response = self.receive_response()
+        if not response:
+            return False
+        if response.get('status') != 'ready':
+            if response.get('message') == 'Неизвестная команда':
+                return None
+            return False
+
+        offsets = []
+        position = 0
+        for _, length in chunks:
+            offsets.append(position)
+            position += length
+        missing = response.get('missing', [])
+        missing_bytes = sum(chunks[index][1] for index in missing)
+
+        if missing_bytes * 10 > file_size * 9:
+            self.send_command({'status': 'cancel'})
+            return None
+        self.send_command({'status': 'ready'})
+
+        compressor = self.compression_stats = self.compressor_for(response)
+        tuner = self.transfer_tuner()
+        sent = 0
+        trace = self.trace
+        trace.note(missing=len(missing), saved_bytes=file_size - missing_bytes)
+        with trace.file(open(path, 'rb')) as f, framing.borrow(framing.HEADER_SIZE + tuner.maximum) as buffer, \
+                trace.phase('transfer'):
+            view = memoryview(buffer)
+            trace.begin_chunks()
+            for index in missing:
+                f.seek(offsets[index])
+                remaining = chunks[index][1]
+                while remaining:
+                    chunk_size = f.readinto(view[framing.HEADER_SIZE:framing.HEADER_SIZE + min(tuner.chunk_size, remaining)])
+                    if not chunk_size:
+                        return False
+
+                    try:
+                        chunk_started = time.perf_counter()
+                        if compressor:
+                            compressor.send_chunk(self.socket, view, chunk_size)
+                        else:
+                            framing.send_chunk(self.socket, view, chunk_size)
+                        trace.chunk(chunk_size, chunk_started)
+                    except (ConnectionError, BrokenPipeError):
+                        return False
+
+                    remaining -= chunk_size
+                    sent += chunk_size
+                    tuner.update(chunk_size)
+
+                    if progress_callback and missing_bytes > 0:
+                        progress_callback((sent / missing_bytes) * 100)
+
+        with trace.phase('wait_result'):
+            response = self.receive_response()
+        if not response or response.get('status') != 'success' or response.get('md5') != md5:
+            return False
+
+        self.record_transfer(1, file_size, started)
+        self.last_transfer['dedup'] = {
+            'chunks': len(chunks),
+            'missing': len(missing),
+            'saved_bytes': file_size - missing_bytes,
+            'ratio': round(file_size / missing_bytes, 2) if missing_bytes else None
+        }
+        if progress_callback:
+            progress_callback(100)
+        return True
+
+    @multiplexed
+    @traced
+    def upload_file_delta(self, filepath, progress_callback=None):
+        path = Path(filepath)
+        if not self.delta_enabled() or not path.is_file():
+            return None
+
+        file_size = path.stat().st_size
+        if file_size > self.max_file_size:
+            return False
+
+        started = time.time()
+        trace = self.trace = self.open_trace('upload_delta', path.name, size=file_size)
+        self.send_command({'command': 'signature', 'filename': path.name})
+        with trace.phase('signature'):
+            response = self.receive_response()
+        if not response or response.get('status') != 'success':
+            return None
+
+        md5_hash = hashlib.md5()
+        with trace.file(open(path, 'rb')) as f, trace.phase('delta'):
+            ops = delta.delta(f, response['signature'], md5_hash)
+        md5 = md5_hash.hexdigest()
+
+        literal = delta.literal_bytes(ops)
+        if literal * 10 > file_size * 9:
+            return None
+        trace.note(saved_bytes=file_size - literal)
+
+        self.send_command({
+            'command': 'upload_delta',
+            'filename': path.name,
+            'size': file_size,
+            'md5': md5,
+            'base_md5': response['md5'],
+            'ops': ops,
+            'compression': self.compression_request()
+        })
+        with trace.phase('wait_ready'):
+            response = self.receive_response()
+        if not response or response.get('status') != 'ready':
+            return False
+
+        compressor = self.compression_stats = self.compressor_for(response)
+        tuner = self.transfer_tuner()
+        sent = 0
+        with trace.file(open(path, 'rb')) as f, framing.borrow(framing.HEADER_SIZE + tuner.maximum) as buffer, \
+                trace.phase('transfer'):
+            view = memoryview(buffer)
+            trace.begin_chunks()
+            for offset, length in delta.literals(ops):
+                f.seek(offset)
+                while length:
+                    chunk_size = f.readinto(view[framing.HEADER_SIZE:framing.HEADER_SIZE + min(tuner.chunk_size, length)])
+                    if not chunk_size:
+                        return False
+
+                    try:
+                        chunk_started = time.perf_counter()
+                        if compressor:
+                            compressor.send_chunk(self.socket, view, chunk_size)
+                        else:
+                            framing.send_chunk(self.socket, view, chunk_size)
+                        trace.chunk(chunk_size, chunk_started)
+                    except (ConnectionError, BrokenPipeError):
+                        return False
+
+                    length -= chunk_size
+                    sent += chunk_size
+                    tuner.update(chunk_size)
+
+                    if progress_callback and literal > 0:
+                        progress_callback((sent / literal) * 100)
+
+        with trace.phase('wait_result'):
+            response = self.receive_response()
+        if not response or response.get('status') != 'success' or response.get('md5') != md5:
+            return False
+
+        self.record_transfer(1, file_size, started)
+        self.last_transfer['delta'] = {'literal_bytes': literal, 'saved_bytes': file_size - literal}
+        if progress_callback:
+            progress_callback(100)
+        return True
+
+    def upload_file_striped(self, path, file_size, md5, streams, progress_callback=None, chunks=None):
+        started = time.time()
+        state_key = 'upload:' + self.transfer_key(path.name)
+        state = {'path': str(path), 'size': file_size, 'md5': md5}
+        saved = dict(self.load_transfer_states().get(state_key) or {})
+        resume_id = saved.pop('transfer_id', None)
+        self.send_command({
+            'command': 'stripe_begin',
+            'filename': path.name,
+            'size': file_size,
+            'md5': md5,
+            'chunks': chunks,
+            'transfer_id': resume_id if saved == state else None
+        })
+        response = self.receive_response()
+        if not response:
+            return False
+        if response.get('status') != 'success':
+            if response.get('message') == 'Неизвестная команда':
+                return None
+            return False
+
+        transfer_id = response['transfer_id']
+        self.save_transfer_state(state_key, {**state, 'transfer_id': transfer_id})
+        if response.get('ranges'):
+            ranges = self.missing_ranges(response['ranges'], file_size)
+            self.trace.note(resumed=file_size - sum(length for _, length in ranges))
+        else:
+            ranges = self.stripe_ranges(file_size, streams)
+
+        def worker(stream, offset, length, report):
+            return stream.upload_range(transfer_id, path, offset, length, report)
+
+        with self.trace.phase('transfer'):
+            completed = self.run_striped(ranges, worker, file_size, progress_callback)
+
+        if not completed:
+            self.send_command({'command': 'stripe_abort', 'transfer_id': transfer_id})
+            self.receive_response()
+            self.save_transfer_state(state_key, None)
+            return False
+
+        self.send_command({'command': 'stripe_commit', 'transfer_id': transfer_id})
+        with self.trace.phase('wait_result'):
+            response = self.receive_response()
+        self.save_transfer_state(state_key, None)
+        if not response or response.get('status') != 'success' or response.get('md5') != md5:
+            return False
+
+        self.record_transfer(streams, file_size, started)
+        if progress_callback:
+            progress_callback(100)
+        return True
+
+    @multiplexed
+    @traced
+    def upload_range(self, transfer_id, path, offset, length, progress_callback=None):
+        trace = self.trace = self.open_trace('upload_range', Path(path).name, offset=offset, length=length)
+        self.send_command({
+            'command': 'stripe_upload',
+            'transfer_id': transfer_id,
+            'offset': offset,
+            'length': length,
+            'compression': self.compression_request()
+        })
+        with trace.phase('wait_ready'):
+            response = self.receive_response()
+        if not response or response.get('status') != 'ready':
+            return False
+
+        compressor = self.compression_stats = self.compressor_for(response)
+        tuner = self.transfer_tuner()
+        sent = 0
+        with trace.file(open(path, 'rb')) as f, framing.borrow(framing.HEADER_SIZE + tuner.maximum) as buffer, \
+                trace.phase('transfer'):
+            f.seek(offset)
+            view = memoryview(buffer)
+            trace.begin_chunks()
+            while sent < length:
+                chunk_size = f.readinto(view[framing.HEADER_SIZE:framing.HEADER_SIZE + min(tuner.chunk_size, length - sent)])
+                if not chunk_size:
+                    return False
+
+                try:
+                    started = time.perf_counter()
+                    if compressor:
+                        compressor.send_chunk(self.socket, view, chunk_size)
+                    else:
+                        framing.send_chunk(self.socket, view, chunk_size)
+                    trace.chunk(chunk_size, started)
+                except (ConnectionError, BrokenPipeError):
+                    return False
+
+                sent += chunk_size
+                tuner.update(chunk_size)
+
+                if progress_callback and length > 0:
+                    progress_callback((sent / length) * 100)
+
+        with trace.phase('wait_result'):
+            response = self.receive_response()
+        return bool(response and response.get('status') == 'success')
+
+    @multiplexed
+    @traced
+    def upload_many(self, filepaths, progress_callback=None, remote_dir=''):
+        paths = [Path(filepath) for filepath in filepaths]
+        if not self.batch_supported or not paths:
+            return None
+
+        started = time.time()
+        trace = self.trace = self.open_trace('upload_many', f'{len(paths)} файлов', count=len(paths))
+        self.send_command({'command': 'upload_many', 'count': len(paths), 'compression': self.compression_request()})
+        with trace.phase('wait_ready'):
+            response = self.receive_response()
+        if not response:
+            return False
+        if response.get('status') != 'ready':
+            if response.get('message') == 'Неизвестная команда':
+                return None
+            return False
+
+        total = 0
+        for path in paths:
             try:
-                self.send_command({'command': 'disconnect'})
-            except:
+                total += path.stat().st_size
+            except OSError:
                 pass
+        sent = [0]
+
+        def report(nbytes):
+            sent[0] += nbytes
+            if progress_callback and total > 0:
+                progress_callback(min(sent[0] / total * 100, 100))
+
+        compressor = self.compression_stats = self.compressor_for(response)
+        tuner = self.transfer_tuner()
+        with framing.borrow(framing.HEADER_SIZE + tuner.maximum) as buffer, trace.phase('transfer'):
+            view = memoryview(buffer)
+            trace.begin_chunks()
+            for path in paths:
+                name = f'{remote_dir}/{path.name}' if remote_dir else path.name
+                try:
+                    self.send_batch_file(path, view, compressor, tuner, report, name)
+                except (ConnectionError, BrokenPipeError, socket.timeout):
+                    return False
+
+        results = self.receive_batch_results()
+        if results is None:
+            return False
+        self.finish_batch(results, len(paths), sent[0], started, progress_callback)
+        return results
+
+    @multiplexed
+    @traced
+    def upload_tree(self, local_dir, remote_dir='', progress_callback=None):
+        local_dir = Path(local_dir)
+        if not self.tree_supported:
+            return None
+
+        base = local_dir.resolve().name or 'root'
+        base = f'{remote_dir}/{base}' if remote_dir else base
+        started = time.time()
+        trace = self.trace = self.open_trace('upload_tree', base)
+        self.send_command({'command': 'upload_many', 'compression': self.compression_request()})
+        with trace.phase('wait_ready'):
+            response = self.receive_response()
+        if not response or response.get('status') != 'ready':
+            return False
+
+        totals = {'files': 0, 'bytes': 0}
+        sent = [0]
+
+        def report(nbytes):
+            sent[0] += nbytes
+            if progress_callback and totals['bytes'] > 0:
+                progress_callback(min(sent[0] / totals['bytes'] * 100, 100))
+
+        compressor = self.compression_stats = self.compressor_for(response)
+        tuner = self.transfer_tuner()
+        with framing.borrow(framing.HEADER_SIZE + tuner.maximum) as buffer, trace.phase('transfer'):
+            view = memoryview(buffer)
+            trace.begin_chunks()
+            try:
+                self.send_command({'filename': base, 'type': 'dir'})
+                for name, st, data in tree.pipeline(local_dir, totals=totals):
+                    if st is None:
+                        self.send_command({'filename': f'{base}/{name}', 'type': 'dir'})
+                    else:
+                        self.send_batch_file(local_dir / name, view, compressor, tuner, report, f'{base}/{name}', st, data)
+                self.send_command({'end': True})
+            except (ConnectionError, BrokenPipeError, socket.timeout):
+                return False
+
+        results = self.receive_batch_results()
+        if results is None:
+            return False
+        self.finish_batch(results, totals['files'], sent[0], started, progress_callback)
+        return results
+
+    def send_batch_file(self, path, view, compressor, tuner, report, name=None, st=None, data=None):
+        name = name or path.name
+        try:
+            f = self.trace.file(io.BytesIO(data) if data is not None else open(path, 'rb'))
+        except OSError as e:
+            self.send_command({'filename': name, 'size': 0})
+            self.send_command({'error': str(e)})
+            return
+
+        error = None
+        md5_hash = self.trace.hasher(hashlib.md5())
+        with f:
+            if data is None:
+                st = os.fstat(f.fileno())
+            file_size = st.st_size if data is None else len(data)
+            if file_size > self.max_file_size:
+                self.send_command({'filename': name, 'size': 0})
+                self.send_command({'error': 'Файл слишком большой'})
+                return
+
+            self.send_command({'filename': name, 'size': file_size, 'mtime': st.st_mtime})
+            remaining = file_size
+            while remaining:
+                payload = view[framing.HEADER_SIZE:framing.HEADER_SIZE + min(tuner.chunk_size, remaining)]
+                chunk_size = f.readinto(payload)
+                if not chunk_size:
+                    chunk_size = len(payload)
+                    payload[:] = bytes(chunk_size)
+                    error = 'Файл был изменён во время отправки'
+                elif not error:
+                    md5_hash.update(payload[:chunk_size])
+
+                started = time.perf_counter()
+                if compressor:
+                    compressor.send_chunk(self.socket, view, chunk_size)
+                else:
+                    framing.send_chunk(self.socket, view, chunk_size)
+                self.trace.chunk(chunk_size, started)
+                remaining -= chunk_size
+                tuner.update(chunk_size)
+                report(chunk_size)
+
+        self.send_command({'error': error} if error else {'md5': md5_hash.hexdigest()})
+
+    def receive_batch_results(self):
+        with self.trace.phase('wait_result'):
+            response = self.receive_response()
+        if not response or response.get('status') != 'success':
+            return None
+        return {item.get('filename'): True if item.get('status') == 'success' else item.get('message', 'Неизвестная ошибка')
+                for item in response.get('results', [])}
+
+    def finish_batch(self, results, files, nbytes, started, progress_callback):
+        self.record_transfer(1, nbytes, started)
+        self.last_transfer['batch'] = {'files': files, 'failed': sum(1 for result in results.values() if result is not True)}
+        if progress_callback:
+            progress_callback(100)
+
+    @multiplexed
+    @traced
+    def download_many(self, filenames, save_dir=None, progress_callback=None):
+        filenames = list(filenames)
+        if not self.batch_supported or not filenames:
+            return None
+
+        save_dir = Path(save_dir or self.download_dir)
+        started = time.time()
+        trace = self.trace = self.open_trace('download_many', f'{len(filenames)} файлов', count=len(filenames))
+        self.send_command({
+            'command': 'download_many',
+            'filenames': filenames,
+            'compression': self.compression_request(),
+            'max_chunk_size': self.max_chunk_size
+        })
+        with trace.phase('wait_ready'):
+            response = self.receive_response()
+        if not response:
+            return False
+        if response.get('status') != 'ready':
+            if response.get('message') == 'Неизвестная команда':
+                return None
+            return False
+
+        count = response.get('count', len(filenames))
+        decompressor = self.compression_stats = self.decompressor_for(response)
+        results = {}
+        received_bytes = 0
+        with trace.phase('transfer'):
+            for index in range(count):
+                header = self.receive_response()
+                if not header:
+                    return False
+                filename = header.get('filename')
+                if header.get('status') != 'success':
+                    results[filename] = header.get('message', 'Неизвестная ошибка')
+                    continue
+
+                def report(percent, index=index):
+                    if progress_callback:
+                        progress_callback(min((index + percent / 100) / count * 100, 100))
+
+                result, received = self.receive_batch_file(header, save_dir / Path(filename).name, decompressor, report)
+                if result is None:
+                    return False
+                received_bytes += received
+                results[filename] = result
+
+        with trace.phase('wait_result'):
+            response = self.receive_response()
+        if not response or response.get('status') != 'success':
+            return False
+
+        self.finish_batch(results, len(filenames), received_bytes, started, progress_callback)
+        return results
+
+    @multiplexed
+    @traced
+    def download_tree(self, path, save_dir=None, progress_callback=None):
+        if not self.tree_supported:
+            return None
+
+        target = Path(save_dir or self.download_dir) / (PurePosixPath(path).name or 'root')
+        started = time.time()
+        trace = self.trace = self.open_trace('download_tree', path)
+        self.send_command({
+            'command': 'download_tree',
+            'path': path,
+            'compression': self.compression_request(),
+            'max_chunk_size': self.max_chunk_size
+        })
+        with trace.phase('wait_ready'):
+            response = self.receive_response()
+        if not response or response.get('status') != 'ready':
+            return False
+
+        decompressor = self.compression_stats = self.decompressor_for(response)
+        target.mkdir(parents=True, exist_ok=True)
+        results = {path: True}
+        files = 0
+        received_bytes = 0
+        with trace.phase('transfer'):
+            while True:
+                header = self.receive_response()
+                if not header:
+                    return False
+                if 'filename' not in header:
+                    break
+                name = header['filename']
+                relative = tree.local_path(name)
+                if relative is None:
+                    raise ValueError(f"Сервер прислал некорректный путь: {name}")
+                if header.get('status') != 'success':
+                    results[name] = header.get('message', 'Неизвестная ошибка')
+                    continue
+                save_path = target / relative
+                if header.get('type') == 'dir':
+                    save_path.mkdir(parents=True, exist_ok=True)
+                    results[name] = True
+                    continue
+
+                save_path.parent.mkdir(parents=True, exist_ok=True)
+                files += 1
+                result, received = self.receive_batch_file(header, save_path, decompressor, progress_callback)
+                if result is None:
+                    return False
+                received_bytes += received
+                results[name] = result
+
+        if header.get('status') != 'success':
+            return False
+        self.finish_batch(results, files, received_bytes, started, progress_callback)
+        return results
+
+    def receive_batch_file(self, header, save_path, decompressor, report):
+        file_size = header['size']
+        part_path = save_path.with_name(save_path.name + '.part')
+        md5_hash = self.trace.hasher(hashlib.md5())
+        with self.trace.file(open(part_path, 'wb')) as f:
+            received = self.receive_chunks(HashingWriter(f, md5_hash), file_size, report, decompressor=decompressor)
+        trailer = self.receive_response() if received == file_size else None
+        if not trailer:
+            os.remove(part_path)
+            return None, received
+        if trailer.get('error') or trailer.get('md5') != md5_hash.hexdigest():
+            os.remove(part_path)
+            return trailer.get('error') or 'Контрольная сумма скачанного файла не совпадает', received
+
+        mtime = header.get('mtime')
+        if isinstance(mtime, (int, float)):
+            os.utime(part_path, (mtime, mtime))
+        os.replace(part_path, save_path)
+        return True, received
+
+    def browse(self, path, **params):
+        return self.list_files(path=path, **params)
+
+    def reconnect(self):
+        self.disconnect(graceful=False)
+        return self.connect(self.tls_enabled)
+
+    def disconnect(self, graceful=True):
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+            self.socket = None
+        if self.mux:
+            self.mux.close()
+            self.mux = None
+            self.socket = None
+        if self.socket:
+            if graceful:
+                try:
+                    self.send_command({'command': 'disconnect'})
+                except:
+                    pass
             try:
                 self.socket.close()
             except:
@@ -312,9 +1560,7 @@ class FileClient:
 
     def send_command(self, command):
         try:
-            json_data = json.dumps(command).encode('utf-8')
-            self.socket.sendall(len(json_data).to_bytes(4, 'big'))
-            self.socket.sendall(json_data)
+            framing.send_message(self.socket, command)
         except Exception:
             return None
 
@@ -322,39 +1568,55 @@ class FileClient:
         if not self.socket:
             return None
 
-        data = b''
-        while len(data) < length:
-            try:
-                chunk = self.socket.recv(min(4096, length - len(data)))
-                if not chunk:
-                    break
-                data += chunk
-            except socket.timeout:
-                break
-            except Exception:
-                break
-        return data
+        try:
+            return framing.recv_exact(self.socket, length)
+        except Exception:
+            return b''
 
     def receive_response(self):
         try:
-            length_data = self.receive_all(4)
-            if not length_data or len(length_data) != 4:
-                return None
+            response = framing.recv_message(self.socket, MAX_RESPONSE)
+        except Exception:
+            return None
+        if isinstance(response, dict) and response.get('status') == 'busy':
+            self.note_busy(response.get('retry_after') or 1)
+        return response
 
-            data_length = struct.unpack('>I', length_data)[0]
-            json_data = self.receive_all(data_length)
+    @multiplexed
+    def list_files(self, **params):
+        self.send_command({'command': 'list', **params})
+        return self.receive_response()
 
-            if not json_data:
-                return None
+    def sync_file_list(self):
+        with self.list_lock:
+            return self.sync_file_list_locked()
 
-            return json.loads(json_data.decode('utf-8'))
-        except Exception:
-            return None
+    def sync_file_list_locked(self):
+        params = {}
+        if self.list_epoch is not None:
+            params = {'since_version': self.list_version, 'epoch': self.list_epoch}
 
-    def list_files(self):
-        self.send_command({'command': 'list'})
-        response = self.receive_response()
+        response = self.list_files(**params)
+        if not response or response.get('status') != 'success':
+            return response, None
+
+        self.list_epoch = response.get('epoch')
+        self.list_version = response.get('version')
+        self.dirs = {directory['name']: directory for directory in response.get('dirs', [])}
 
+        if response.get('delta'):
+            changed = response.get('changed', [])
+            removed = response.get('removed', [])
+            for name in removed:
+                self.files.pop(name, None)
+            for file in changed:
+                self.files[file['name']] = file
+            return response, (changed, removed)
+
+        self.files = {file['name']: file for file in response.get('files', [])}
+        return response, None
+
+    @multiplexed
     def delete_file(self, filename):
         self.send_command({
             'command': 'delete',
@@ -368,6 +1630,24 @@ class FileClient:
             error_msg = response.get('message', 'Неизвестная ошибка') if response else 'Нет ответа от сервера'
             return error_msg
 
+    @multiplexed
+    def ping(self):
+        started = time.perf_counter()
+        self.send_command({'command': 'ping'})
+        response = self.receive_response()
+        return time.perf_counter() - started if response else None
+
+    @multiplexed
     def get_server_info(self):
         self.send_command({'command': 'info'})
-        response = self.receive_response()
\ No newline at end of file
+        return self.receive_response()
+
+    @multiplexed
+    def get_stats(self):
+        self.send_command({'command': 'stats'})
+        return self.receive_response()
+
+    @multiplexed
+    def admin(self, token, action, **params):
+        self.send_command({'command': 'admin', 'token': token, 'action': action, **params})
+        return self.receive_response()
\ No newline at end of file
@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
 import threading
 from client import FileClient
+from jobs import TransferJob, TransferQueue, Interrupted, QUEUED, RUNNING, PAUSED, DONE, FAILED, CANCELLED
 import os
 from PIL import Image, ImageTk
 import time
@@ -15,15 +16,17 @@ class FileManagerGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("SLANFM")
-        self.root.geometry("850x600")
-        self.root.minsize(800, 550)
+        self.root.geometry("850x760")
+        self.root.minsize(800, 680)
 
         self.client = None
-        self.server_files = []
+        self.server_files = {}
+        self.server_dirs = {}
+        self.current_path = ''
         self.progress_queue = queue.Queue()
-        self.user_response_queue = queue.Queue()
         self.current_operation = None
-        self.operation_in_progress = False
+        self.active_operations = 0
+        self.operations_lock = threading.Lock()
         self.connect_operation = False
         self.connected = False
         self.ip = None
@@ -37,6 +40,11 @@ class FileManagerGUI:
         self.sort_reverse = True
         self.sort_column = 'modified'
 
+        self.transfers = TransferQueue(1)
+        self.shown_jobs = {}
+        self.parallel_var = tk.IntVar()
+        self.parallel_var.set(self.parallel_jobs())
+
         self.progress_var = tk.DoubleVar()
         self.progress_var.set(0)
         self.status_text = tk.StringVar()
@@ -44,15 +52,39 @@ class FileManagerGUI:
 
         self.create_widgets()
         self.start_progress_monitor()
+        self.start_jobs_monitor()
 
         self.download_dir = Path('downloads')
         self.download_dir.mkdir(exist_ok=True)
 
         self.files_tree.bind('<<TreeviewSelect>>', self.on_file_selection_changed)
+        self.files_tree.bind('<Double-1>', self.open_selected_dir)
 
         self.total_size = 0
         self.total_number = 0
 
+    @property
+    def operation_in_progress(self):
+        return self.active_operations > 0
+
+    def begin_operation(self):
+        with self.operations_lock:
+            self.active_operations += 1
+
+    def end_operation(self):
+        with self.operations_lock:
+            self.active_operations = max(self.active_operations - 1, 0)
+
+    def operation_blocked(self):
+        if not self.operation_in_progress:
+            return False
+        return self.connect_operation or not (self.client and self.client.concurrent())
+
+    def ask(self, message):
+        reply = queue.Queue()
+        self.progress_queue.put({**message, 'reply': reply})
+        return reply.get()
+
     def start_progress_monitor(self):
         self.check_progress_queue()
         self.root.after(100, self.start_progress_monitor)
@@ -72,14 +104,23 @@ class FileManagerGUI:
                             "Файл существует",
                             f'Файл "{filename}" уже существует на сервере.\nПерезаписать?'
                         )
-                        self.user_response_queue.put('yes' if answer else 'no')
+                        message['reply'].put('yes' if answer else 'no')
+                    if 'ask_overwrite_many' in message:
+                        names = message['ask_overwrite_many']
+                        shown = '\n'.join(names[:10]) + ('\n...' if len(names) > 10 else '')
+                        answer = messagebox.askyesnocancel(
+                            "Файлы существуют",
+                            f'{len(names)} файл(ов) уже существуют:\n{shown}\n\n'
+                            f'Перезаписать? («Нет» — пропустить эти файлы)'
+                        )
+                        message['reply'].put({True: 'yes', False: 'no'}.get(answer, 'cancel'))
                     if 'ask_overwrite_local' in message:
                         filepath = message['ask_overwrite_local']
                         answer = messagebox.askyesno(
                             "Файл существует",
                             f'Локальный файл "{filepath}" уже существует.\nПерезаписать?'
                         )
-                        self.user_response_queue.put('yes' if answer else 'no')
+                        message['reply'].put('yes' if answer else 'no')
                 elif isinstance(message, str):
                     self.status_text.set(message)
         except queue.Empty:
@@ -134,6 +175,10 @@ class FileManagerGUI:
         files_frame = ttk.LabelFrame(self.root, text="Файлы на сервере", padding=10)
         files_frame.pack(fill="both", expand=True, padx=10, pady=5)
 
+        self.path_var = tk.StringVar()
+        self.path_var.set("Папка: /")
+        ttk.Label(files_frame, textvariable=self.path_var).pack(side=tk.TOP, anchor="w", pady=(0, 5))
+
         columns = ('name', 'size', 'modified')
         self.files_tree = ttk.Treeview(files_frame, columns=columns, show='headings')
 
@@ -158,6 +203,8 @@ class FileManagerGUI:
                    command=self.refresh_files).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Загрузить на сервер",
                    command=self.upload_file).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Загрузить папку",
+                   command=self.upload_folder).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Скачать с сервера",
                    command=self.download_file).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Удалить с сервера",
@@ -165,6 +212,53 @@ class FileManagerGUI:
         ttk.Button(button_frame, text="?", width=3,
                    command=self.show_about).pack(side=tk.RIGHT, padx=5)
 
+        queue_frame = ttk.LabelFrame(self.root, text="Очередь передач", padding=10)
+        queue_frame.pack(fill="x", padx=10, pady=5)
+
+        jobs_frame = ttk.Frame(queue_frame)
+        jobs_frame.pack(fill="x")
+
+        columns = ('name', 'kind', 'state', 'progress', 'speed', 'eta')
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=columns, show='headings', height=5)
+
+        self.jobs_tree.heading('name', text='Имя')
+        self.jobs_tree.heading('kind', text='Направление')
+        self.jobs_tree.heading('state', text='Состояние')
+        self.jobs_tree.heading('progress', text='Прогресс')
+        self.jobs_tree.heading('speed', text='Скорость')
+        self.jobs_tree.heading('eta', text='Осталось')
+
+        self.jobs_tree.column('name', width=220)
+        self.jobs_tree.column('kind', width=90)
+        self.jobs_tree.column('state', width=170)
+        self.jobs_tree.column('progress', width=70)
+        self.jobs_tree.column('speed', width=80)
+        self.jobs_tree.column('eta', width=70)
+
+        jobs_scrollbar = ttk.Scrollbar(jobs_frame, orient=tk.VERTICAL, command=self.jobs_tree.yview)
+        self.jobs_tree.configure(yscrollcommand=jobs_scrollbar.set)
+
+        self.jobs_tree.pack(side=tk.LEFT, fill="x", expand=True)
+        jobs_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        jobs_buttons = ttk.Frame(queue_frame)
+        jobs_buttons.pack(fill="x", pady=(5, 0))
+
+        ttk.Button(jobs_buttons, text="Пауза",
+                   command=self.pause_jobs).pack(side=tk.LEFT, padx=5)
+        ttk.Button(jobs_buttons, text="Продолжить",
+                   command=self.resume_jobs).pack(side=tk.LEFT, padx=5)
+        ttk.Button(jobs_buttons, text="Отменить",
+                   command=self.cancel_jobs).pack(side=tk.LEFT, padx=5)
+        ttk.Button(jobs_buttons, text="Очистить завершённые",
+                   command=self.clear_jobs).pack(side=tk.LEFT, padx=5)
+        parallel_spinbox = ttk.Spinbox(jobs_buttons, from_=1, to=16, width=4, textvariable=self.parallel_var,
+                                       command=self.update_parallelism)
+        parallel_spinbox.pack(side=tk.RIGHT, padx=5)
+        parallel_spinbox.bind('<Return>', lambda event: self.update_parallelism())
+        parallel_spinbox.bind('<FocusOut>', lambda event: self.update_parallelism())
+        ttk.Label(jobs_buttons, text="Одновременно:").pack(side=tk.RIGHT)
+
         progress_frame = ttk.Frame(self.root)
         progress_frame.pack(fill="x", padx=10, pady=1)
 
@@ -204,30 +298,20 @@ class FileManagerGUI:
 
         self.sort_column = column
 
-        items = [(self.files_tree.set(item, column), item) for item in self.files_tree.get_children('')]
+        def sort_key(item):
+            file = self.server_files.get(item, {})
+            if column == 'name':
+                return file.get('name', '').lower()
+            elif column == 'size':
+                return file.get('size', 0)
+            modified = file.get('modified')
+            return modified if isinstance(modified, (int, float)) else 0
 
-        if column == 'name':
-            items.sort(key=lambda x: x[0].lower(), reverse=self.sort_reverse)
-        elif column == 'size':
-            items.sort(key=lambda x: float(x[0].split()[0]) if x[0] and 'MB' in x[0] else 0,
-                       reverse=self.sort_reverse)
-        elif column == 'modified':
-            def parse_date(date_str):
-                try:
-                    if date_str and date_str != "неизвестно":
-                        parts = date_str.split()
-                        if len(parts) >= 2:
-                            date_part = parts[0]
-                            time_part = parts[1] if len(parts) > 1 else "00:00"
-                            day, month, year = date_part.split('.')
-                            return time.mktime(time.strptime(f"{year}-{month}-{day} {time_part}", "%Y-%m-%d %H:%M"))
-                except:
-                    return 0
-                return 0
-
-            items.sort(key=lambda x: parse_date(x[0]), reverse=self.sort_reverse)
-
-        for index, (_, item) in enumerate(items):
+        children = self.files_tree.get_children('')
+        dirs = sorted((item for item in children if item.endswith('/')), key=lambda item: (item != '../', item.lower()))
+        items = dirs + sorted((item for item in children if not item.endswith('/')), key=sort_key, reverse=self.sort_reverse)
+
+        for index, item in enumerate(items):
             self.files_tree.move(item, '', index)
 
         for col in ['name', 'size', 'modified']:
@@ -247,38 +331,44 @@ class FileManagerGUI:
         if token:
 
             def auth_thread():
+                self.begin_operation()
+                success = False
                 try:
 
                     if self.client.authenticate(token):
                         self.progress_queue.put({'status': f'Подключено к {ip}:{port}'})
                         self.root.after(0, lambda: messagebox.showinfo("Успех", f"Успешно подключено к серверу {ip}:{port}"))
-                        self.status_var.set(f"Подключено к {ip}:{port}")
+                        self.root.after(0, lambda: self.status_var.set(f"Подключено к {ip}:{port}"))
                         self.save_input(ip, "host")
+                        success = True
                         self.connected = True
                         self.ip, self.port = ip, port
-                        self.root.after(0, self.refresh_files(True))
+                        self.client.enable_pool()
+                        self.root.after(0, self.update_parallelism)
 
                     else:
-                        messagebox.showerror("Ошибка", "Неверный токен")
-                        self.disconnect_server()
+                        self.root.after(0, lambda: messagebox.showerror("Ошибка", "Неверный токен"))
 
                 except Exception as e:
-                    messagebox.showerror("Ошибка", f"Ошибка аутентификации: {e}")
-                    self.disconnect_server()
+                    error_msg = str(e)
+                    self.root.after(0, lambda: messagebox.showerror("Ошибка", f"Ошибка аутентификации: {error_msg}"))
 
                 finally:
-                    self.operation_in_progress = False
+                    self.end_operation()
                     self.connect_operation = False
+                    if success:
+                        self.refresh_later()
+                    else:
+                        self.root.after(0, self.disconnect_server)
 
             threading.Thread(target=auth_thread, daemon=True).start()
 
         else:
             self.client.disconnect()
-            self.operation_in_progress = False
             self.connect_operation = False
 
     def connect_server(self):
-        if self.operation_in_progress:
+        if self.operation_in_progress or self.transfers.pending():
             messagebox.showwarning("Внимание", "Дождитесь завершения текущей операции")
             return
 
@@ -295,7 +385,7 @@ class FileManagerGUI:
         self.client = FileClient(ip, port)
 
         def connect_thread():
-            self.operation_in_progress = True
+            self.begin_operation()
             self.connect_operation = True
             success = False
             try:
@@ -306,11 +396,13 @@ class FileManagerGUI:
                 if connect_result is True:
                     self.progress_queue.put({'status': f'Подключено к {ip}:{port}'})
                     self.root.after(0, lambda: messagebox.showinfo("Успех", f"Успешно подключено к серверу {ip}:{port}"))
-                    self.status_var.set(f"Подключено к {ip}:{port}")
+                    self.root.after(0, lambda: self.status_var.set(f"Подключено к {ip}:{port}"))
                     self.save_input(ip, "host")
                     success = True
                     self.connected = True
                     self.ip, self.port = ip, port
+                    self.client.enable_pool()
+                    self.root.after(0, self.update_parallelism)
 
                 elif connect_result == "need_auth":
                     self.progress_queue.put({'status': 'Требуется аутентификация'})
@@ -319,24 +411,24 @@ class FileManagerGUI:
                 elif isinstance(connect_result, str):
                     self.progress_queue.put({'status': 'Ошибка подключения'})
                     self.client = None
-                    messagebox.showerror("Ошибка", connect_result)
+                    self.root.after(0, lambda: messagebox.showerror("Ошибка", connect_result))
 
                 else:
                     self.progress_queue.put({'status': 'Ошибка подключения'})
                     self.client = None
-                    messagebox.showerror("Ошибка", "Ошибка подключения")
+                    self.root.after(0, lambda: messagebox.showerror("Ошибка", "Ошибка подключения"))
 
             except Exception as e:
                 error_msg = str(e)
                 self.progress_queue.put({'status': f'Ошибка: {error_msg}'})
                 self.client = None
-                messagebox.showerror("Ошибка", f"Ошибка: {error_msg}")
+                self.root.after(0, lambda: messagebox.showerror("Ошибка", f"Ошибка: {error_msg}"))
 
             finally:
-                self.operation_in_progress = False
+                self.end_operation()
                 self.connect_operation = False
                 if success:
-                    self.root.after(0, self.refresh_files(True))
+                    self.refresh_later()
 
         threading.Thread(target=connect_thread, daemon=True).start()
 
@@ -345,12 +437,20 @@ class FileManagerGUI:
             messagebox.showwarning("Внимание", "Дождитесь завершения текущей операции")
             return
 
+        if self.transfers.pending():
+            messagebox.showwarning("Внимание", "Дождитесь завершения передач или отмените их")
+            return
+
         if self.client:
             self.client.disconnect()
             self.client = None
             self.status_text.set("Отключено")
             self.status_var.set("Отключено")
             self.clear_files_list()
+            self.server_files = {}
+            self.server_dirs = {}
+            self.current_path = ''
+            self.path_var.set("Папка: /")
             self.total_size = 0
             self.total_number = 0
             self.connected = False
@@ -362,26 +462,24 @@ class FileManagerGUI:
             messagebox.showwarning("Предупреждение", "Сначала подключитесь к серверу")
             return
 
-        if self.operation_in_progress:
+        if self.operation_blocked():
             messagebox.showwarning("Внимание", "Дождитесь завершения текущей операции")
             return
 
+        background = self.operation_in_progress
+
         def refresh_thread():
-            self.operation_in_progress = True
-            try:
+            if not background:
+                self.begin_operation()
                 self.progress_queue.put({'status': 'Получение списка файлов...'})
-
-                self.client.send_command({'command': 'list'})
-                response = self.client.receive_response()
+            try:
+                response = self.fetch_files()
 
                 if response and response.get('status') == 'success':
-                    self.server_files = response.get('files', [])
-                    self.root.after(0, self.update_files_list)
-                    self.progress_queue.put({'status': 'Список файлов обновлен'})
-                    self.total_size = 0
-                    self.total_number = 0
-                    if not dont_reset_progress:
-                        self.reset_progress(immediate=True)
+                    if not background:
+                        self.progress_queue.put({'status': 'Список файлов обновлен'})
+                        if not dont_reset_progress:
+                            self.root.after(0, lambda: self.reset_progress(immediate=True))
                 else:
                     error_msg = response.get('message', 'Неизвестная ошибка') if response else 'Нет ответа от сервера'
                     self.progress_queue.put({'status': f'Ошибка: {error_msg}'})
@@ -391,40 +489,120 @@ class FileManagerGUI:
                 self.progress_queue.put({'status': f'Ошибка: {error_msg}'})
                 self.root.after(0, lambda msg=error_msg: messagebox.showerror("Ошибка", f"Ошибка при получении списка файлов: {msg}"))
             finally:
-                self.operation_in_progress = False
+                if not background:
+                    self.end_operation()
 
         threading.Thread(target=refresh_thread, daemon=True).start()
 
+    def refresh_later(self):
+        def refresh():
+            if self.client and not self.operation_blocked():
+                self.refresh_files(True)
+
+        self.root.after(0, refresh)
+
+    def fetch_files(self):
+        if self.current_path:
+            response = self.client.browse(self.current_path)
+            if response and response.get('status') == 'success':
+                self.server_files = {file['name']: file for file in response.get('files', [])}
+                self.server_dirs = {directory['name']: directory for directory in response.get('dirs', [])}
+                self.root.after(0, self.update_files_list)
+            return response
+
+        response, delta = self.client.sync_file_list()
+        if response and response.get('status') == 'success':
+            self.server_files = self.client.files
+            self.server_dirs = self.client.dirs
+            if delta is None:
+                self.root.after(0, self.update_files_list)
+            else:
+                self.root.after(0, lambda: self.apply_files_delta(*delta))
+        return response
+
+    def remote_name(self, item):
+        name = item.rstrip('/')
+        return f'{self.current_path}/{name}' if self.current_path else name
+
+    def open_selected_dir(self, event):
+        item = self.files_tree.identify_row(event.y)
+        if not item.endswith('/') or not self.client:
+            return
+        if self.operation_blocked():
+            messagebox.showwarning("Внимание", "Дождитесь завершения текущей операции")
+            return
+        if item == '../':
+            self.current_path = self.current_path.rpartition('/')[0]
+        else:
+            self.current_path = self.remote_name(item)
+        self.path_var.set(f"Папка: /{self.current_path}")
+        self.server_files = {}
+        self.server_dirs = {}
+        self.clear_files_list()
+        self.refresh_files()
+
+    def sync_dir_rows(self):
+        rows = {f'{name}/': (f'{name}/', 'папка', self.format_file_row({**directory, 'size': 0})[2])
+                for name, directory in self.server_dirs.items()}
+        if self.current_path:
+            rows['../'] = ('..', '', '')
+        for item in self.files_tree.get_children(''):
+            if item.endswith('/') and item not in rows:
+                self.files_tree.delete(item)
+        for item, values in rows.items():
+            if self.files_tree.exists(item):
+                self.files_tree.item(item, values=values)
+            else:
+                self.files_tree.insert('', tk.END, iid=item, values=values)
+
+    def format_file_row(self, file):
+        modified_value = file.get('modified', '')
+        modified_str = ''
+
+        if isinstance(modified_value, (int, float)):
+            try:
+                modified_str = time.strftime("%d.%m.%Y %H:%M",
+                                             time.localtime(float(modified_value)))
+            except:
+                modified_str = str(modified_value)
+        elif isinstance(modified_value, str) and modified_value:
+            modified_str = modified_value
+        else:
+            modified_str = "неизвестно"
+
+        size_mb = file['size'] / (1024 * 1024)
+        return file['name'], f"{size_mb:.2f} MB", modified_str
+
+    def count_totals(self):
+        self.total_number = len(self.server_files)
+        self.total_size = sum(file['size'] for file in self.server_files.values()) / (1024 * 1024)
+
     def update_files_list(self):
         for item in self.files_tree.get_children():
             self.files_tree.delete(item)
 
-        self.total_number = 0
-        self.total_size = 0
-
-        for file in self.server_files:
-            modified_value = file.get('modified', '')
-            modified_str = ''
+        for name, file in self.server_files.items():
+            self.files_tree.insert('', tk.END, iid=name, values=self.format_file_row(file))
+        self.sync_dir_rows()
 
-            if isinstance(modified_value, (int, float)):
-                try:
-                    modified_str = time.strftime("%d.%m.%Y %H:%M",
-                                                 time.localtime(float(modified_value)))
-                except:
-                    modified_str = str(modified_value)
-            elif isinstance(modified_value, str) and modified_value:
-                modified_str = modified_value
-            else:
-                modified_str = "неизвестно"
+        self.count_totals()
+        self.sort_treeview(self.sort_column, self.sort_reverse)
 
-            size_mb = file['size'] / (1024 * 1024)
-            self.files_tree.insert('', tk.END,
-                                   values=(file['name'], f"{size_mb:.2f} MB", modified_str))
+    def apply_files_delta(self, changed, removed):
+        for name in removed:
+            if self.files_tree.exists(name):
+                self.files_tree.delete(name)
 
-            self.total_number += 1
-            self.total_size += size_mb
+        for file in changed:
+            if self.files_tree.exists(file['name']):
+                self.files_tree.item(file['name'], values=self.format_file_row(file))
+            else:
+                self.files_tree.insert('', tk.END, iid=file['name'], values=self.format_file_row(file))
+        self.sync_dir_rows()
 
-        self.sort_treeview(self.sort_column, self.sort_reverse)
+        self.count_totals()
+        if changed or removed or self.server_dirs:
+            self.sort_treeview(self.sort_column, self.sort_reverse)
 
     def clear_files_list(self):
         for item in self.files_tree.get_children():
@@ -435,13 +613,17 @@ class FileManagerGUI:
             messagebox.showwarning("Предупреждение", "Сначала подключитесь к серверу")
             return
 
-        if self.operation_in_progress:
+        if self.connect_operation:
             messagebox.showwarning("Внимание", "Дождитесь завершения текущей операции")
             return
 
-        filepath = filedialog.askopenfilename(title="Выберите файл для загрузки")
-        if not filepath:
+        filepaths = filedialog.askopenfilenames(title="Выберите файлы для загрузки")
+        if not filepaths:
+            return
+        if len(filepaths) > 1 or self.current_path:
+            self.upload_files(filepaths)
             return
+        filepath = filepaths[0]
 
         try:
             file_size = os.path.getsize(filepath)
@@ -452,39 +634,33 @@ class FileManagerGUI:
             messagebox.showerror("Ошибка", f"Не удалось проверить размер файла: {e}")
             return
 
-        def upload_thread():
-            self.operation_in_progress = True
+        def upload_job(job):
+            self.begin_operation()
             operation_success = False
             try:
                 self.progress_queue.put({'status': 'Проверка наличия файла на сервере...'})
-                self.client.send_command({'command': 'list'})
-                response = self.client.receive_response()
+                response = self.fetch_files()
                 if response and response.get('status') == 'success':
-                    server_files = response.get('files', [])
                     filename = os.path.basename(filepath)
-                    file_exists = any(f['name'] == filename for f in server_files)
+                    file_exists = filename in self.server_files
                     if file_exists:
-                        self.progress_queue.put({'ask_overwrite': filename})
-                        answer = self.user_response_queue.get()
-                        if answer != 'yes':
+                        if self.ask({'ask_overwrite': filename}) != 'yes':
                             self.progress_queue.put({'status': 'Загрузка отменена'})
                             return
                 else:
                     error_msg = response.get('message', 'Неизвестная ошибка') if response else 'Нет ответа от сервера'
                     self.progress_queue.put({'status': f'Ошибка получения списка файлов: {error_msg}'})
                     self.root.after(0, lambda: messagebox.showerror("Ошибка", f"Не удалось проверить наличие файла: {error_msg}"))
-                    return
-
-                self.progress_queue.put({'status': f'Загрузка файла {os.path.basename(filepath)}...', 'percent': 0})
+                    return False
 
-                def update_progress(percent):
-                    self.progress_queue.put({'percent': percent, 'status': f'Загрузка: {percent:.1f}%'})
+                self.progress_queue.put({'status': f'Загрузка файла {os.path.basename(filepath)}...'})
 
-                success = self.client.upload_file(filepath, update_progress)
+                success = self.client.upload_file_delta(filepath, job.progress) if file_exists else None
+                if success is None:
+                    success = self.client.upload_file(filepath, job.progress)
 
                 if success:
-                    self.progress_queue.put({'percent': 100, 'status': 'Файл успешно загружен'})
-                    self.root.after(0, lambda: messagebox.showinfo("Успех", "Файл успешно загружен на сервер"))
+                    self.progress_queue.put({'status': f'Файл {os.path.basename(filepath)} успешно загружен{self.transfer_summary()}'})
                     operation_success = True
                 else:
                     self.progress_queue.put({'status': 'Ошибка загрузки файла'})
@@ -494,54 +670,54 @@ class FileManagerGUI:
                 self.progress_queue.put({'status': f'Ошибка: {error_msg}'})
                 self.root.after(0, lambda msg=error_msg: messagebox.showerror("Ошибка", f"Ошибка загрузки: {msg}"))
             finally:
-                self.operation_in_progress = False
+                self.end_operation()
                 if operation_success:
-                    self.root.after(0, self.refresh_files(True))
+                    self.refresh_later()
+            return operation_success
 
-        threading.Thread(target=upload_thread, daemon=True).start()
+        self.enqueue('upload', os.path.basename(filepath), upload_job, file_size)
 
     def download_file(self):
         if not self.client:
             messagebox.showwarning("Предупреждение", "Сначала подключитесь к серверу")
             return
 
-        if self.operation_in_progress:
+        if self.connect_operation:
             messagebox.showwarning("Внимание", "Дождитесь завершения текущей операции")
             return
 
-        selected = self.files_tree.selection()
+        selected = [item for item in self.files_tree.selection() if item != '../']
         if not selected:
             messagebox.showwarning("Предупреждение", "Выберите файл для скачивания")
             return
 
-        item = self.files_tree.item(selected[0])
-        filename = item['values'][0]
+        if len(selected) > 1 or selected[0].endswith('/'):
+            self.download_files(selected)
+            return
+
+        filename = self.remote_name(selected[0])
+        size = self.server_files.get(selected[0], {}).get('size')
 
-        def download_thread():
-            self.operation_in_progress = True
+        def download_job(job):
+            self.begin_operation()
             operation_success = False
             try:
-                filename = item['values'][0]
                 save_path = self.download_dir / os.path.basename(filename)
+                local_exists = save_path.exists()
 
-                if save_path.exists():
-                    self.progress_queue.put({'ask_overwrite_local': str(save_path)})
-                    answer = self.user_response_queue.get()
-                    if answer != 'yes':
+                if local_exists:
+                    if self.ask({'ask_overwrite_local': str(save_path)}) != 'yes':
                         self.progress_queue.put({'status': 'Скачивание отменено'})
                         return
 
-                self.progress_queue.put({'status': f'Скачивание файла {filename}...', 'percent': 0})
-
-                def update_progress(percent):
-                    self.progress_queue.put({'percent': percent, 'status': f'Скачивание: {percent:.1f}%'})
+                self.progress_queue.put({'status': f'Скачивание файла {filename}...'})
 
-                success = self.client.download_file(filename, save_path, update_progress)
+                success = self.client.download_file_delta(filename, save_path, job.progress) if local_exists else None
+                if success is None:
+                    success = self.client.download_file(filename, save_path, job.progress)
 
                 if success:
-                    self.progress_queue.put({'percent': 100, 'status': 'Файл успешно скачан'})
-                    self.root.after(0, lambda f=filename, d=str(self.download_dir):
-                    messagebox.showinfo("Успех", f"Файл {f} успешно скачан в папку {d}"))
+                    self.progress_queue.put({'status': f'Файл {filename} успешно скачан{self.transfer_summary()}'})
                     operation_success = True
                 else:
                     self.progress_queue.put({'status': 'Ошибка скачивания файла'})
@@ -553,18 +729,209 @@ class FileManagerGUI:
                 self.root.after(0, lambda msg=error_msg:
                 messagebox.showerror("Ошибка", f"Ошибка скачивания: {msg}"))
             finally:
-                self.operation_in_progress = False
+                self.end_operation()
                 if operation_success:
-                    self.root.after(0, self.refresh_files(True))
+                    self.refresh_later()
+            return operation_success
+
+        self.enqueue('download', filename, download_job, size)
+
+    def ask_skip_existing(self, names, existing):
+        existing = [name for name in names if name in existing]
+        if not existing:
+            return names
+        answer = self.ask({'ask_overwrite_many': existing})
+        if answer == 'cancel':
+            return None
+        if answer == 'no':
+            return [name for name in names if name not in existing]
+        return names
+
+    def report_batch(self, action, results, total):
+        done = sum(1 for result in results.values() if result is True)
+        failed = [f"{name}: {result}" for name, result in results.items() if result is not True]
+        self.progress_queue.put({'percent': 100, 'status': f'{action} {done} из {total}{self.transfer_summary()}'})
+        if failed:
+            shown = '\n'.join(failed[:10]) + ('\n...' if len(failed) > 10 else '')
+            self.root.after(0, lambda: messagebox.showwarning("Внимание", f"{action} {done} из {total}.\n\n{shown}"))
+        return done > 0
+
+    def upload_files(self, filepaths):
+        try:
+            size = sum(os.path.getsize(filepath) for filepath in filepaths)
+        except OSError:
+            size = None
 
-        threading.Thread(target=download_thread, daemon=True).start()
+        def upload_job(job):
+            self.begin_operation()
+            operation_success = False
+            try:
+                self.progress_queue.put({'status': 'Проверка наличия файлов на сервере...'})
+                response = self.fetch_files()
+                if not response or response.get('status') != 'success':
+                    error_msg = response.get('message', 'Неизвестная ошибка') if response else 'Нет ответа от сервера'
+                    self.progress_queue.put({'status': f'Ошибка получения списка файлов: {error_msg}'})
+                    self.root.after(0, lambda: messagebox.showerror("Ошибка", f"Не удалось проверить наличие файлов: {error_msg}"))
+                    return False
+
+                by_name = {os.path.basename(filepath): filepath for filepath in filepaths}
+                names = self.ask_skip_existing(list(by_name), self.server_files)
+                if not names:
+                    self.progress_queue.put({'status': 'Загрузка отменена'})
+                    return
+                paths = [by_name[name] for name in names]
+
+                self.progress_queue.put({'status': f'Загрузка {len(paths)} файлов...'})
+
+                results = self.client.upload_many(paths, job.progress, self.current_path)
+                if results is None:
+                    results = {}
+                    for i, path in enumerate(paths):
+                        self.progress_queue.put({'status': f'Загрузка файла {os.path.basename(path)} ({i + 1}/{len(paths)})...'})
+                        success = self.client.upload_file(path, job.progress)
+                        results[os.path.basename(path)] = True if success else 'ошибка загрузки'
+                elif results is False:
+                    self.progress_queue.put({'status': 'Ошибка загрузки файлов'})
+                    self.root.after(0, lambda: messagebox.showerror("Ошибка", "Не удалось загрузить файлы на сервер"))
+                    return False
+
+                operation_success = self.report_batch('Загружено', results, len(paths))
+            except Exception as e:
+                error_msg = str(e)
+                self.progress_queue.put({'status': f'Ошибка: {error_msg}'})
+                self.root.after(0, lambda msg=error_msg: messagebox.showerror("Ошибка", f"Ошибка загрузки: {msg}"))
+            finally:
+                self.end_operation()
+                if operation_success:
+                    self.refresh_later()
+            return operation_success
+
+        self.enqueue('upload', f'{len(filepaths)} файл(ов)', upload_job, size)
+
+    def upload_folder(self):
+        if not self.client:
+            messagebox.showwarning("Предупреждение", "Сначала подключитесь к серверу")
+            return
+
+        if self.connect_operation:
+            messagebox.showwarning("Внимание", "Дождитесь завершения текущей операции")
+            return
+
+        folder = filedialog.askdirectory(title="Выберите папку для загрузки")
+        if not folder:
+            return
+
+        name = Path(folder).resolve().name
+
+        def upload_job(job):
+            self.begin_operation()
+            operation_success = False
+            try:
+                if name in self.server_dirs:
+                    if self.ask({'ask_overwrite': f'{name}/'}) != 'yes':
+                        self.progress_queue.put({'status': 'Загрузка отменена'})
+                        return
+
+                self.progress_queue.put({'status': f'Загрузка папки {name}...'})
+
+                results = self.client.upload_tree(folder, self.current_path, job.progress)
+                if not results:
+                    error_msg = 'Сервер не поддерживает загрузку папок' if results is None else 'Не удалось загрузить папку на сервер'
+                    self.progress_queue.put({'status': error_msg})
+                    self.root.after(0, lambda: messagebox.showerror("Ошибка", error_msg))
+                    return False
+
+                operation_success = self.report_batch('Загружено', results, len(results))
+            except Exception as e:
+                error_msg = str(e)
+                self.progress_queue.put({'status': f'Ошибка: {error_msg}'})
+                self.root.after(0, lambda msg=error_msg: messagebox.showerror("Ошибка", f"Ошибка загрузки: {msg}"))
+            finally:
+                self.end_operation()
+                if operation_success:
+                    self.refresh_later()
+            return operation_success
+
+        self.enqueue('upload', f'{name}/', upload_job)
+
+    def download_files(self, items):
+        size = None
+        if not any(item.endswith('/') for item in items):
+            size = sum(self.server_files.get(item, {}).get('size', 0) for item in items)
+
+        def download_job(job):
+            self.begin_operation()
+            operation_success = False
+            try:
+                local = {item for item in items if (self.download_dir / item.rstrip('/')).exists()}
+                items_left = self.ask_skip_existing(items, local)
+                if not items_left:
+                    self.progress_queue.put({'status': 'Скачивание отменено'})
+                    return
+                names = [self.remote_name(item) for item in items_left if not item.endswith('/')]
+                folders = [self.remote_name(item) for item in items_left if item.endswith('/')]
+
+                self.progress_queue.put({'status': f'Скачивание {len(items_left)} объектов...'})
+
+                results = {}
+                for folder in folders:
+                    self.progress_queue.put({'status': f'Скачивание папки {folder}...'})
+                    folder_results = self.client.download_tree(folder, self.download_dir, job.progress)
+                    if not folder_results:
+                        results[folder] = 'сервер не поддерживает скачивание папок' if folder_results is None else 'ошибка скачивания'
+                    else:
+                        results.update(folder_results)
+
+                batch_results = self.client.download_many(names, self.download_dir, job.progress) if names else {}
+                if batch_results is None:
+                    batch_results = {}
+                    for i, name in enumerate(names):
+                        self.progress_queue.put({'status': f'Скачивание файла {name} ({i + 1}/{len(names)})...'})
+                        success = self.client.download_file(name, self.download_dir / os.path.basename(name), job.progress)
+                        batch_results[name] = True if success else 'ошибка скачивания'
+                elif batch_results is False:
+                    batch_results = {name: 'ошибка скачивания' for name in names}
+                results.update(batch_results)
+
+                operation_success = self.report_batch('Скачано', results, len(results))
+            except Exception as e:
+                error_msg = str(e)
+                self.progress_queue.put({'status': f'Ошибка: {error_msg}'})
+                self.root.after(0, lambda msg=error_msg: messagebox.showerror("Ошибка", f"Ошибка скачивания: {msg}"))
+            finally:
+                self.end_operation()
+                if operation_success:
+                    self.refresh_later()
+            return operation_success
+
+        name = items[0] if len(items) == 1 else f'{len(items)} объект(ов)'
+        self.enqueue('download', name, download_job, size)
+
+    def transfer_summary(self):
+        transfer = self.client.last_transfer if self.client else None
+        if not transfer:
+            return ''
+        speed = transfer['size'] / max(transfer['seconds'], 0.001) / (1024 * 1024)
+        summary = f"потоков: {transfer['streams']}, {speed:.1f} МБ/с"
+        if 'compression' in transfer:
+            stats = transfer['compression']
+            summary += f", сжатие {stats['algorithm']} x{stats['ratio']:.2f} за {stats['seconds']:.1f} с"
+        if 'dedup' in transfer:
+            saved = transfer['dedup']['saved_bytes'] / (1024 * 1024)
+            summary += f", дедупликация: сэкономлено {saved:.1f} МБ"
+        if 'delta' in transfer:
+            saved = transfer['delta']['saved_bytes'] / (1024 * 1024)
+            summary += f", дельта: сэкономлено {saved:.1f} МБ"
+        if 'batch' in transfer:
+            summary += f", файлов: {transfer['batch']['files']}"
+        return f" ({summary})"
 
     def delete_file(self):
         if not self.client:
             messagebox.showwarning("Предупреждение", "Сначала подключитесь к серверу")
             return
 
-        if self.operation_in_progress:
+        if self.operation_blocked():
             messagebox.showwarning("Внимание", "Дождитесь завершения текущей операции")
             return
 
@@ -573,14 +940,15 @@ class FileManagerGUI:
             messagebox.showwarning("Предупреждение", "Выберите файл для удаления")
             return
 
-        item = self.files_tree.item(selected[0])
-        filename = item['values'][0]
+        if selected[0] == '../':
+            return
+        filename = self.remote_name(selected[0])
 
-        if not messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить файл '{filename}' с сервера?"):
+        if not messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить '{filename}' с сервера?"):
             return
 
         def delete_thread():
-            self.operation_in_progress = True
+            self.begin_operation()
             operation_success = False
             try:
                 self.progress_queue.put({'status': f'Удаление файла {filename}...'})
@@ -593,8 +961,8 @@ class FileManagerGUI:
                     self.root.after(0, lambda: messagebox.showerror("Ошибка", f"Ошибка удаления: {msg}"))
 
                 else:
-                    self.progress_queue.put({'status': 'Файл успешно удален'})
-                    self.root.after(0, lambda: messagebox.showinfo("Успех", "Файл успешно удален с сервера"))
+                    self.progress_queue.put({'status': 'Успешно удалено'})
+                    self.root.after(0, lambda: messagebox.showinfo("Успех", f"'{filename}' успешно удален с сервера"))
                     operation_success = True
 
             except Exception as e:
@@ -603,12 +971,94 @@ class FileManagerGUI:
                 self.root.after(0, lambda msg=error_msg:
                 messagebox.showerror("Ошибка", f"Ошибка удаления: {msg}"))
             finally:
-                self.operation_in_progress = False
+                self.end_operation()
                 if operation_success:
-                    self.root.after(0, self.refresh_files(True))
+                    self.refresh_later()
 
         threading.Thread(target=delete_thread, daemon=True).start()
 
+    def parallel_jobs(self):
+        jobs = self.config.get('transfer_config', {}).get('parallel_jobs', 2)
+        return jobs if isinstance(jobs, int) and jobs >= 1 else 2
+
+    def update_parallelism(self):
+        try:
+            jobs = max(int(self.parallel_var.get()), 1)
+        except (tk.TclError, ValueError):
+            return
+        if not self.client:
+            return
+        concurrent = self.client.concurrent()
+        self.transfers.set_parallelism(jobs if concurrent else 1, max(self.client.timeout / 2, 1))
+
+    def enqueue(self, kind, name, work, size=None):
+        def run(job):
+            while self.client and not self.client.concurrent() and self.operation_in_progress:
+                time.sleep(0.1)
+            try:
+                return work(job)
+            except Interrupted:
+                if self.client and not self.client.concurrent():
+                    self.client.reconnect()
+                raise
+
+        return self.transfers.submit(TransferJob(kind, name, run, size))
+
+    def start_jobs_monitor(self):
+        self.refresh_jobs()
+        self.root.after(250, self.start_jobs_monitor)
+
+    def refresh_jobs(self):
+        jobs = self.transfers.snapshot()
+        for job in jobs:
+            if self.shown_jobs.get(job.id) == job.version:
+                continue
+            self.shown_jobs[job.id] = job.version
+            iid = str(job.id)
+            if self.jobs_tree.exists(iid):
+                self.jobs_tree.item(iid, values=self.format_job_row(job))
+            else:
+                self.jobs_tree.insert('', 'end', iid=iid, values=self.format_job_row(job))
+
+        running = [job for job in jobs if job.state == RUNNING]
+        if running:
+            self.progress_var.set(sum(job.percent for job in running) / len(running))
+
+    def format_job_row(self, job):
+        states = {QUEUED: 'В очереди', RUNNING: 'Выполняется', PAUSED: 'Пауза',
+                  DONE: 'Готово', FAILED: 'Ошибка', CANCELLED: 'Отменено'}
+        state = f"{states[job.state]}: {job.message}" if job.message else states[job.state]
+        speed = job.throughput()
+        eta = job.eta()
+        return (job.name,
+                'Загрузка' if job.kind == 'upload' else 'Скачивание',
+                state,
+                f"{job.percent:.1f}%",
+                f"{speed / (1024 * 1024):.1f} МБ/с" if speed else '',
+                f"{int(eta) // 3600}:{int(eta) % 3600 // 60:02}:{int(eta) % 60:02}" if eta is not None else '')
+
+    def selected_jobs(self):
+        selected = set(self.jobs_tree.selection())
+        return [job for job in self.transfers.snapshot() if str(job.id) in selected]
+
+    def pause_jobs(self):
+        for job in self.selected_jobs():
+            self.transfers.pause(job)
+
+    def resume_jobs(self):
+        for job in self.selected_jobs():
+            self.transfers.resume(job)
+
+    def cancel_jobs(self):
+        for job in self.selected_jobs():
+            self.transfers.cancel(job)
+
+    def clear_jobs(self):
+        for job in self.transfers.clear_finished():
+            self.shown_jobs.pop(job.id, None)
+            if self.jobs_tree.exists(str(job.id)):
+                self.jobs_tree.delete(str(job.id))
+
     def reset_progress(self, immediate=False):
         if immediate:
             self.progress_var.set(0)
@@ -680,7 +1130,7 @@ class FileManagerGUI:
                 return f"{value // (1024 ** 4)} TB"
         
         if self.connected:
-            self.update_files_list()
+            self.count_totals()
 
             total_size, ts_unit = format_total_size(self.total_size)
             max_file_size, mfs_unit = format_size(self.client.max_file_size)
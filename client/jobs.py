@@ -0,0 +1,194 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+QUEUED = 'queued'
+RUNNING = 'running'
+PAUSED = 'paused'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SAMPLE_INTERVAL = 0.25
+SPEED_WINDOW = 5
+
+
+class Interrupted(BaseException):
+    pass
+
+
+class TransferJob:
+    ids = itertools.count(1)
+
+    def __init__(self, kind, name, work, size=None):
+        self.id = next(self.ids)
+        self.kind = kind
+        self.name = name
+        self.work = work
+        self.size = size
+        self.state = QUEUED
+        self.message = ''
+        self.percent = 0.0
+        self.rate = None
+        self.samples = deque()
+        self.hold = None
+        self.pause_requested = False
+        self.cancel_requested = False
+        self.released = False
+        self.resumed = threading.Event()
+        self.resumed.set()
+        self.version = 0
+
+    def set_state(self, state, message=''):
+        self.state = state
+        self.message = message
+        self.version += 1
+
+    def progress(self, percent):
+        if self.cancel_requested:
+            raise Interrupted()
+        if self.pause_requested:
+            self.wait_resumed()
+
+        now = time.monotonic()
+        self.percent = percent
+        if self.samples and now - self.samples[-1][0] < SAMPLE_INTERVAL:
+            return
+        self.samples.append((now, percent))
+        while now - self.samples[0][0] > SPEED_WINDOW:
+            self.samples.popleft()
+        first_time, first_percent = self.samples[0]
+        if now > first_time and percent > first_percent:
+            self.rate = (percent - first_percent) / (now - first_time)
+        self.version += 1
+
+    def wait_resumed(self):
+        self.set_state(PAUSED)
+        if not self.resumed.wait(self.hold):
+            self.released = True
+            raise Interrupted()
+        if self.cancel_requested:
+            raise Interrupted()
+        self.samples.clear()
+        self.rate = None
+        self.set_state(RUNNING)
+
+    def throughput(self):
+        if self.state != RUNNING or not self.rate or not self.size:
+            return None
+        return self.rate * self.size / 100
+
+    def eta(self):
+        if self.state != RUNNING or not self.rate:
+            return None
+        return max(100 - self.percent, 0) / self.rate
+
+
+class TransferQueue:
+    def __init__(self, parallelism=2, hold=60):
+        self.parallelism = parallelism
+        self.hold = hold
+        self.jobs = []
+        self.running = set()
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        with self.lock:
+            self.jobs.append(job)
+        self.schedule()
+        return job
+
+    def schedule(self):
+        with self.lock:
+            for job in self.jobs:
+                if len(self.running) >= self.parallelism:
+                    return
+                if job.state == QUEUED:
+                    self.running.add(job.id)
+                    job.set_state(RUNNING)
+                    threading.Thread(target=self.run, args=(job,), name=f'job-{job.id}', daemon=True).start()
+
+    def run(self, job):
+        job.hold = self.hold
+        job.samples.clear()
+        job.rate = None
+        job.released = False
+        message = ''
+        try:
+            result = job.work(job)
+        except Interrupted:
+            result = None
+        except Exception as e:
+            result = False
+            message = str(e)
+
+        with self.lock:
+            self.running.discard(job.id)
+            if result is True:
+                job.percent = 100
+                job.set_state(DONE)
+            elif job.cancel_requested:
+                job.set_state(CANCELLED)
+            elif job.pause_requested:
+                job.set_state(PAUSED, 'соединение освобождено')
+            elif job.released:
+                job.set_state(QUEUED)
+            elif result is None:
+                job.set_state(CANCELLED)
+            else:
+                job.set_state(FAILED, message)
+        self.schedule()
+
+    def pause(self, job):
+        with self.lock:
+            if job.state in FINISHED or job.pause_requested:
+                return False
+            job.pause_requested = True
+            job.resumed.clear()
+            if job.id not in self.running:
+                job.set_state(PAUSED)
+            return True
+
+    def resume(self, job):
+        with self.lock:
+            if not job.pause_requested:
+                return False
+            job.pause_requested = False
+            job.resumed.set()
+            if job.id not in self.running:
+                job.set_state(QUEUED)
+        self.schedule()
+        return True
+
+    def cancel(self, job):
+        with self.lock:
+            if job.state in FINISHED:
+                return False
+            job.cancel_requested = True
+            job.resumed.set()
+            if job.id not in self.running:
+                job.set_state(CANCELLED)
+            return True
+
+    def set_parallelism(self, parallelism, hold=None):
+        with self.lock:
+            self.parallelism = parallelism
+            if hold:
+                self.hold = hold
+        self.schedule()
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.jobs)
+
+    def pending(self):
+        with self.lock:
+            return sum(1 for job in self.jobs if job.state not in FINISHED)
+
+    def clear_finished(self):
+        with self.lock:
+            finished = [job for job in self.jobs if job.state in FINISHED]
+            self.jobs = [job for job in self.jobs if job.state not in FINISHED]
+        return finished
@@ -0,0 +1,133 @@
+import select
+import threading
+import time
+
+OPEN_BACKOFF = 1
+
+
+class ConnectionPool:
+    def __init__(self, client, size, check_interval=None):
+        self.client = client
+        self.size = size
+        self.check_interval = check_interval or max(1, min(30, client.timeout / 3))
+        self.idle = []
+        self.opened = 0
+        self.reopen_at = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        threading.Thread(target=self.check_idle, name='pool', daemon=True).start()
+
+    def add(self, stream):
+        with self.condition:
+            self.opened += 1
+            self.idle.append((stream, time.monotonic()))
+            self.condition.notify()
+
+    def acquire(self):
+        while True:
+            with self.condition:
+                while not self.closed and not self.idle and not self.can_open():
+                    self.condition.wait(self.open_delay())
+                if self.closed:
+                    return None, False
+                if self.idle:
+                    stream, _ = self.idle.pop()
+                else:
+                    retry = not self.opened
+                    self.opened += 1
+                    stream = None
+
+            if stream is not None:
+                if self.usable(stream):
+                    return stream, True
+                self.release(stream, broken=True)
+                continue
+
+            try:
+                stream = self.client.open_stream(retry)
+            finally:
+                if stream is None:
+                    with self.condition:
+                        self.opened -= 1
+                        self.reopen_at = time.monotonic() + (self.client.retry_after or OPEN_BACKOFF)
+                        self.condition.notify()
+            if stream is not None:
+                return stream, False
+            with self.condition:
+                if not self.opened:
+                    return None, False
+
+    def can_open(self):
+        return self.opened < self.size and (not self.opened or time.monotonic() >= self.reopen_at)
+
+    def open_delay(self):
+        if self.opened >= self.size:
+            return None
+        return self.reopen_at - time.monotonic()
+
+    def release(self, stream, broken=False):
+        with self.condition:
+            if not broken and not self.closed:
+                self.idle.append((stream, time.monotonic()))
+                self.condition.notify()
+                return
+            self.opened -= 1
+            self.condition.notify()
+        stream.disconnect(graceful=not broken)
+
+    def call(self, method, *args, **kwargs):
+        while True:
+            stream, reused = self.acquire()
+            if stream is None:
+                return False
+            try:
+                result = method(stream, *args, **kwargs)
+            except OSError:
+                self.release(stream, broken=True)
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                self.release(stream, broken=True)
+                raise
+            self.client.last_transfer = stream.last_transfer
+            self.client.retry_after = stream.retry_after
+            self.release(stream, broken=stream.socket is None)
+            return result
+
+    def usable(self, stream):
+        try:
+            if stream.socket is None:
+                return False
+            if hasattr(stream.socket, 'pending') and stream.socket.pending():
+                return False
+            readable, _, _ = select.select([stream.socket], [], [], 0)
+            return not readable
+        except (OSError, ValueError):
+            return False
+
+    def check_idle(self):
+        while True:
+            time.sleep(self.check_interval)
+            with self.condition:
+                if self.closed:
+                    return
+                now = time.monotonic()
+                stale = [entry for entry in self.idle if now - entry[1] >= self.check_interval]
+                self.idle = [entry for entry in self.idle if now - entry[1] < self.check_interval]
+            for stream, _ in stale:
+                self.release(stream, broken=stream.ping() is None)
+
+    def stats(self):
+        with self.condition:
+            return {'size': self.size, 'open': self.opened, 'idle': len(self.idle)}
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            idle = self.idle
+            self.idle = []
+            self.opened -= len(idle)
+            self.condition.notify_all()
+        for stream, _ in idle:
+            stream.disconnect()
@@ -0,0 +1,104 @@
+import math
+import threading
+import time
+
+MAX_RETRY_AFTER = 60
+
+
+class Admission:
+    def __init__(self, max_connections=0, max_transfers=0, queue_timeout=30):
+        self.max_connections = max_connections
+        self.max_transfers = max_transfers
+        self.queue_timeout = queue_timeout
+        self.cond = threading.Condition()
+        self.connections = 0
+        self.transfers = 0
+        self.waiting = 0
+        self.average_seconds = 0.0
+        self.rejected = 0
+        self.listeners = []
+
+    def admit_connection(self):
+        with self.cond:
+            if self.max_connections and self.connections >= self.max_connections:
+                self.rejected += 1
+                return False
+            self.connections += 1
+            return True
+
+    def release_connection(self):
+        with self.cond:
+            self.connections -= 1
+
+    def acquire_transfer(self):
+        with self.cond:
+            if not self.max_transfers:
+                self.transfers += 1
+                return True
+            self.waiting += 1
+            try:
+                admitted = self.cond.wait_for(lambda: self.transfers < self.max_transfers, self.queue_timeout)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                self.rejected += 1
+                return False
+            self.transfers += 1
+            return True
+
+    def try_acquire_transfer(self):
+        with self.cond:
+            if self.max_transfers and self.transfers >= self.max_transfers:
+                return False
+            self.transfers += 1
+            return True
+
+    def enter_queue(self):
+        with self.cond:
+            self.waiting += 1
+
+    def leave_queue(self, rejected=False):
+        with self.cond:
+            self.waiting -= 1
+            if rejected:
+                self.rejected += 1
+
+    def release_transfer(self, seconds):
+        with self.cond:
+            self.transfers -= 1
+            self.average_seconds = seconds if not self.average_seconds else 0.8 * self.average_seconds + 0.2 * seconds
+            self.cond.notify()
+        for listener in self.listeners:
+            listener()
+
+    def retry_after(self):
+        with self.cond:
+            slots = self.max_transfers or 1
+            estimate = self.average_seconds * (self.waiting + 1) / slots
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def busy_response(self):
+        return {'status': 'busy', 'message': 'Сервер перегружен, повторите позже', 'retry_after': self.retry_after()}
+
+    def report(self):
+        with self.cond:
+            return {
+                'connections': self.connections,
+                'max_connections': self.max_connections,
+                'transfers': self.transfers,
+                'max_transfers': self.max_transfers,
+                'waiting': self.waiting,
+                'rejected': self.rejected
+            }
+
+
+class TransferSlot:
+    def __init__(self, admission):
+        self.admission = admission
+        self.started = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.admission.release_transfer(time.monotonic() - self.started)
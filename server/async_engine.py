@@ -0,0 +1,433 @@
+import asyncio
+import json
+import logging
+import select
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from slanfm import framing, multiplex
+
+MUX_READ_BUDGET = 16
+
+
+class LoopMultiplexer(multiplex.Multiplexer):
+    def __init__(self, engine, sock, on_stream=None, max_streams=0):
+        super().__init__(sock, on_stream=on_stream, max_streams=max_streams)
+        self.engine = engine
+        self.waiters = {}
+
+    def accept(self, stream):
+        self.waiters[stream.stream_id] = asyncio.Event()
+        self.engine.loop.create_task(self.on_stream(stream))
+
+    def dispatch(self, stream_id, frame_type, payload):
+        super().dispatch(stream_id, frame_type, payload)
+        waiter = self.waiters.get(stream_id)
+        if waiter:
+            waiter.set()
+
+    def send_frame(self, stream_id, frame_type, payload):
+        if self.engine.in_loop():
+            try:
+                self.engine.executor.submit(self.send_control, stream_id, frame_type, bytes(payload))
+            except RuntimeError:
+                pass
+            return
+        with self.send_lock:
+            if self.closed:
+                raise ConnectionError("Соединение закрыто")
+            self.write([multiplex.FRAME.pack(stream_id, frame_type, len(payload)), payload])
+
+    def send_control(self, stream_id, frame_type, payload):
+        try:
+            self.send_frame(stream_id, frame_type, payload)
+        except (OSError, ValueError):
+            pass
+
+    def write(self, buffers):
+        views = [memoryview(buffer).cast('B') for buffer in buffers]
+        while views:
+            try:
+                if framing.can_sendmsg(self.sock):
+                    sent = self.sock.sendmsg(views)
+                else:
+                    sent = self.sock.send(views[0])
+            except (BlockingIOError, ssl.SSLWantWriteError):
+                select.select([], [self.sock], [])
+                continue
+            except ssl.SSLWantReadError:
+                select.select([self.sock], [], [])
+                continue
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if views and sent:
+                views[0] = views[0][sent:]
+
+    def close(self):
+        super().close()
+        try:
+            self.engine.loop.call_soon_threadsafe(self.wake_all)
+        except RuntimeError:
+            pass
+
+    def wake_all(self):
+        for waiter in self.waiters.values():
+            waiter.set()
+
+
+class AsyncEngine:
+    def __init__(self, file_server):
+        self.file_server = file_server
+        self.executor = ThreadPoolExecutor(max_workers=file_server.io_workers, thread_name_prefix='io')
+        self.transfer_executor = ThreadPoolExecutor(max_workers=file_server.max_transfers or file_server.io_workers,
+                                                    thread_name_prefix='transfer')
+        self.reject_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='reject')
+        self.loop = None
+        self.loop_thread = None
+        self.slot_freed = None
+        file_server.mux_factory = self.create_mux
+
+    def serve(self):
+        try:
+            with asyncio.Runner(loop_factory=asyncio.SelectorEventLoop) as runner:
+                runner.run(self.accept_loop())
+        finally:
+            for executor in (self.executor, self.transfer_executor, self.reject_executor):
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    async def accept_loop(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.slot_freed = asyncio.Event()
+        self.file_server.admission.listeners.append(self.slot_released)
+        listener = self.file_server.server
+        listener.setblocking(False)
+
+        while True:
+            client_socket, address = await self.loop.sock_accept(listener)
+            client_socket.setblocking(False)
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.loop.create_task(self.serve_client(client_socket, address))
+
+    def slot_released(self):
+        try:
+            self.loop.call_soon_threadsafe(self.slot_freed.set)
+        except RuntimeError:
+            pass
+
+    async def serve_client(self, client_socket, address):
+        server = self.file_server
+        try:
+            if server.tls_enabled and server.ssl_context:
+                tls_socket = await self.handshake(client_socket, address)
+                if tls_socket is None:
+                    return
+                client_socket = tls_socket
+
+            if not server.admission.admit_connection():
+                await self.run_blocking(self.reject_executor, server.reject_client, client_socket, address)
+                return
+
+            if not await self.greet(client_socket, address):
+                return
+
+            while True:
+                command = await self.read_command(client_socket, address)
+                if command is None or not await self.execute(client_socket, address, command):
+                    break
+                mux = server.client_mux(client_socket)
+                if mux:
+                    await self.serve_mux(client_socket, mux)
+                    break
+
+        except Exception as e:
+            logging.error(f"Ошибка с клиентом {address}: {e}", exc_info=True)
+        finally:
+            server.close_client(client_socket)
+
+    async def greet(self, client_socket, address):
+        server = self.file_server
+        server.register_client(client_socket, address)
+        if not await self.send_message(client_socket, server.init_message(client_socket)):
+            return False
+        if not server.auth_token:
+            return True
+
+        command = await self.read_command(client_socket, address)
+        if command is None:
+            return False
+        response = server.check_auth(client_socket, command)
+        await self.send_message(client_socket, response)
+        return response['status'] == 'success'
+
+    async def read_command(self, client_socket, address):
+        server = self.file_server
+        if not await self.wait_readable(client_socket):
+            return None
+        deadline = self.loop.time() + server.timeout
+        data_length = server.command_length(client_socket, address,
+                                            await self.recv_exact(client_socket, framing.HEADER_SIZE, deadline))
+        if data_length is None:
+            return None
+        json_data = await self.recv_exact(client_socket, data_length, deadline)
+        if not json_data or len(json_data) != data_length:
+            return None
+        return self.decode_command(json_data, address)
+
+    def decode_command(self, json_data, address):
+        try:
+            command = json.loads(json_data.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            logging.error(f"Ошибка декодирования JSON от {address}")
+            return None
+        return command if isinstance(command, dict) else None
+
+    async def execute(self, client_socket, address, command):
+        server = self.file_server
+        if not server.is_transfer(command):
+            return await self.run_blocking(self.executor, server.execute_command, client_socket, address, command)
+
+        if not await self.acquire_transfer():
+            response = server.transfer_rejected(address, command.get('command'))
+            if isinstance(client_socket, multiplex.Stream):
+                await self.run_blocking(self.executor, server.send_response, client_socket, response)
+                return True
+            return await self.send_message(client_socket, response)
+        return await self.run_blocking(self.transfer_executor, server.execute_command,
+                                       client_socket, address, command, True)
+
+    async def acquire_transfer(self):
+        admission = self.file_server.admission
+        if admission.try_acquire_transfer():
+            return True
+
+        deadline = self.loop.time() + admission.queue_timeout
+        admission.enter_queue()
+        rejected = False
+        try:
+            while True:
+                self.slot_freed.clear()
+                if admission.try_acquire_transfer():
+                    return True
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    rejected = True
+                    return False
+                try:
+                    await asyncio.wait_for(self.slot_freed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            admission.leave_queue(rejected)
+
+    async def handshake(self, client_socket, address):
+        server = self.file_server
+        try:
+            if await self.wait_readable(client_socket, server.tls_detect_timeout):
+                first = client_socket.recv(1, socket.MSG_PEEK)
+            else:
+                first = None
+        except OSError:
+            first = b''
+        if not server.is_client_hello(first):
+            await self.run_blocking(self.reject_executor, server.check_client_hello,
+                                    client_socket, address, first, blocking=False)
+            return None
+
+        tls_socket = server.ssl_context.wrap_socket(client_socket, server_side=True, do_handshake_on_connect=False)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.drive_handshake(tls_socket), server.tls_handshake_timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"Ошибка TLS-рукопожатия с {address}: превышено время ожидания")
+            server.metrics.observe_handshake()
+            tls_socket.close()
+            return None
+        except (ssl.SSLError, OSError) as e:
+            logging.error(f"Ошибка TLS-рукопожатия с {address}: {e}")
+            server.metrics.observe_handshake()
+            tls_socket.close()
+            return None
+
+        server.metrics.observe_handshake(time.perf_counter() - started)
+        if tls_socket.session_reused:
+            logging.debug(f"TLS-сессия {address} возобновлена")
+        return tls_socket
+
+    async def drive_handshake(self, tls_socket):
+        while True:
+            try:
+                tls_socket.do_handshake()
+                return
+            except ssl.SSLWantReadError:
+                ready = await self.wait_readable(tls_socket)
+            except ssl.SSLWantWriteError:
+                ready = await self.wait_writable(tls_socket)
+            if not ready:
+                raise ConnectionError("Соединение закрыто во время рукопожатия")
+
+    async def recv_exact(self, client_socket, length, deadline):
+        buffer = bytearray()
+        try:
+            client_socket.setblocking(False)
+            while len(buffer) < length:
+                try:
+                    data = client_socket.recv(min(length - len(buffer), framing.RECV_STEP))
+                except (BlockingIOError, ssl.SSLWantReadError):
+                    if not await self.wait_readable(client_socket, deadline - self.loop.time()):
+                        break
+                    continue
+                except ssl.SSLWantWriteError:
+                    if not await self.wait_writable(client_socket, deadline - self.loop.time()):
+                        break
+                    continue
+                if not data:
+                    break
+                buffer += data
+        except OSError:
+            pass
+        return bytes(buffer)
+
+    async def send_message(self, client_socket, data):
+        deadline = self.loop.time() + self.file_server.timeout
+        payload = json.dumps(data).encode('utf-8')
+        view = memoryview(framing.HEADER.pack(len(payload)) + payload)
+        try:
+            client_socket.setblocking(False)
+            while view:
+                try:
+                    sent = client_socket.send(view)
+                except (BlockingIOError, ssl.SSLWantWriteError):
+                    if not await self.wait_writable(client_socket, deadline - self.loop.time()):
+                        return False
+                    continue
+                except ssl.SSLWantReadError:
+                    if not await self.wait_readable(client_socket, deadline - self.loop.time()):
+                        return False
+                    continue
+                view = view[sent:]
+        except OSError:
+            return False
+        return True
+
+    async def run_blocking(self, executor, func, client_socket, *args, blocking=True):
+        if blocking:
+            client_socket.settimeout(self.file_server.timeout)
+        return await self.loop.run_in_executor(executor, func, client_socket, *args)
+
+    def in_loop(self):
+        return threading.get_ident() == self.loop_thread
+
+    def create_mux(self, client_socket, address):
+        return LoopMultiplexer(self, client_socket, on_stream=lambda stream: self.serve_stream(stream, address),
+                               max_streams=self.file_server.max_streams)
+
+    async def serve_mux(self, client_socket, mux):
+        client_socket.setblocking(False)
+        closed = self.loop.create_future()
+
+        def readable():
+            if closed.done():
+                return
+            if not self.receive_frames(client_socket, mux):
+                closed.set_result(None)
+            elif isinstance(client_socket, ssl.SSLSocket) and client_socket.pending():
+                self.loop.call_soon(readable)
+
+        fd = client_socket.fileno()
+        self.loop.add_reader(fd, readable)
+        try:
+            readable()
+            await closed
+        finally:
+            self.loop.remove_reader(fd)
+
+    def receive_frames(self, client_socket, mux):
+        for _ in range(MUX_READ_BUDGET):
+            try:
+                data = client_socket.recv(framing.RECV_STEP)
+            except (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError):
+                return True
+            except OSError:
+                return False
+            if not data or not mux.receive(data):
+                return False
+        return True
+
+    async def serve_stream(self, stream, address):
+        try:
+            while True:
+                command = await self.read_stream_command(stream, address)
+                if command is None or not await self.execute(stream, address, command):
+                    break
+        except Exception as e:
+            logging.error(f"Ошибка с клиентом {address}: {e}", exc_info=True)
+        finally:
+            stream.mux.waiters.pop(stream.stream_id, None)
+            stream.close()
+            stream.mux.release_stream()
+
+    async def read_stream_command(self, stream, address):
+        server = self.file_server
+        if not await self.stream_readable(stream):
+            return None
+        deadline = self.loop.time() + server.timeout
+        data_length = server.command_length(stream, address,
+                                            await self.recv_stream(stream, framing.HEADER_SIZE, deadline))
+        if data_length is None:
+            return None
+        json_data = await self.recv_stream(stream, data_length, deadline)
+        if not json_data or len(json_data) != data_length:
+            return None
+        return self.decode_command(json_data, address)
+
+    async def recv_stream(self, stream, length, deadline):
+        buffer = bytearray(length)
+        received = 0
+        while received < length and await self.stream_readable(stream, deadline):
+            received += stream.recv_into(memoryview(buffer)[received:])
+        del buffer[received:]
+        return bytes(buffer)
+
+    async def stream_readable(self, stream, deadline=None):
+        waiter = stream.mux.waiters[stream.stream_id]
+        while not stream.buffer:
+            if stream.remote_closed or stream.closed:
+                return False
+            waiter.clear()
+            timeout = None if deadline is None else deadline - self.loop.time()
+            if timeout is not None and timeout <= 0:
+                return False
+            try:
+                await asyncio.wait_for(waiter.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def wait_readable(self, client_socket, timeout=None):
+        if isinstance(client_socket, ssl.SSLSocket) and client_socket.pending():
+            return True
+        return await self.wait_ready(client_socket, self.loop.add_reader, self.loop.remove_reader, timeout)
+
+    async def wait_writable(self, client_socket, timeout=None):
+        return await self.wait_ready(client_socket, self.loop.add_writer, self.loop.remove_writer, timeout)
+
+    async def wait_ready(self, client_socket, add, remove, timeout):
+        if timeout is not None and timeout <= 0:
+            return False
+        fd = client_socket.fileno()
+        if fd < 0:
+            return False
+
+        ready = self.loop.create_future()
+        add(fd, lambda: ready.done() or ready.set_result(True))
+        try:
+            return await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            remove(fd)
@@ -0,0 +1,79 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class ChunkStore:
+    def __init__(self, root, path):
+        self.root = Path(root)
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS chunks (hash TEXT, name TEXT, offset INTEGER, length INTEGER)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS chunks_hash ON chunks (hash)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS chunks_name ON chunks (name)')
+
+    def key(self, filepath):
+        return Path(filepath).resolve().relative_to(self.root.resolve()).as_posix()
+
+    def lookup(self, hashes):
+        hashes = list(hashes)
+        refs = {}
+        with self.lock:
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                rows = self.db.execute(
+                    f"SELECT hash, name, offset, length FROM chunks WHERE hash IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                for digest, name, offset, length in rows:
+                    refs.setdefault(digest, []).append((name, offset, length))
+        return refs
+
+    def read(self, digest, refs, files):
+        for name, offset, length in refs:
+            try:
+                f = files.get(name)
+                if f is None:
+                    f = files[name] = open(self.root / name, 'rb')
+                f.seek(offset)
+                data = f.read(length)
+            except OSError:
+                continue
+            if len(data) == length and hashlib.sha256(data).hexdigest() == digest:
+                return data
+        return None
+
+    def add(self, filepath, chunks):
+        name = self.key(filepath)
+        rows = []
+        offset = 0
+        for digest, length in chunks:
+            rows.append((digest, name, offset, length))
+            offset += length
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM chunks WHERE name = ?', (name,))
+            self.db.executemany('INSERT INTO chunks VALUES (?, ?, ?, ?)', rows)
+
+    def forget(self, filepath):
+        try:
+            name = self.key(filepath)
+            with self.lock, self.db:
+                self.db.execute('DELETE FROM chunks WHERE name = ?', (name,))
+        except Exception as e:
+            logging.warning(f"Не удалось обновить хранилище чанков для {filepath}: {e}")
+
+    def forget_many(self, filepaths):
+        try:
+            names = [(self.key(filepath),) for filepath in filepaths]
+            with self.lock, self.db:
+                self.db.executemany('DELETE FROM chunks WHERE name = ?', names)
+        except Exception as e:
+            logging.warning(f"Не удалось обновить хранилище чанков: {e}")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
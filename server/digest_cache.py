@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class DigestCache:
+    def __init__(self, root, path, flush_interval=5, prune_every=720):
+        self.root = Path(root)
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.prune_every = prune_every
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            if isinstance(entries, dict):
+                self.entries = entries
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Не удалось прочитать кэш контрольных сумм {self.path}: {e}")
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            entries = dict(self.entries)
+            self.dirty = False
+
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.dirty = True
+            logging.warning(f"Не удалось сохранить кэш контрольных сумм {self.path}: {e}")
+
+    def prune(self):
+        with self.lock:
+            names = list(self.entries)
+        missing = [name for name in names if not (self.root / name).is_file()]
+        if missing:
+            with self.lock:
+                for name in missing:
+                    self.entries.pop(name, None)
+                self.dirty = True
+            logging.info(f"Из кэша контрольных сумм удалено записей об отсутствующих файлах: {len(missing)}")
+
+    def start_flusher(self):
+        threading.Thread(target=self.flush_loop, name='digests', daemon=True).start()
+
+    def flush_loop(self):
+        ticks = 0
+        while True:
+            try:
+                if ticks % self.prune_every == 0:
+                    self.prune()
+                self.save()
+            except Exception as e:
+                logging.error(f"Ошибка сохранения кэша контрольных сумм: {e}")
+            ticks += 1
+            time.sleep(self.flush_interval)
+
+    def key(self, filepath):
+        return Path(filepath).resolve().relative_to(self.root.resolve()).as_posix()
+
+    def signature(self, st):
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def get(self, filepath):
+        st = os.stat(filepath)
+        with self.lock:
+            entry = self.entries.get(self.key(filepath))
+        if entry and entry.get('stat') == self.signature(st):
+            return entry['md5']
+        return None
+
+    def put(self, filepath, md5, st=None):
+        st = st or os.stat(filepath)
+        with self.lock:
+            self.entries[self.key(filepath)] = {'stat': self.signature(st), 'md5': md5}
+            self.dirty = True
+
+    def put_many(self, items):
+        if not items:
+            return
+        with self.lock:
+            for filepath, md5, st in items:
+                self.entries[self.key(filepath)] = {'stat': self.signature(st), 'md5': md5}
+            self.dirty = True
+
+    def invalidate(self, filepath):
+        with self.lock:
+            if self.entries.pop(self.key(filepath), None) is not None:
+                self.dirty = True
+
+    def digest(self, filepath):
+        cached = self.get(filepath)
+        if cached:
+            return cached
+
+        before = os.stat(filepath)
+        md5_hash = hashlib.md5()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                md5_hash.update(chunk)
+        md5 = md5_hash.hexdigest()
+
+        after = os.stat(filepath)
+        if self.signature(before) == self.signature(after):
+            self.put(filepath, md5, after)
+        return md5
@@ -0,0 +1,355 @@
+import bisect
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+SORT_KEYS = {
+    'name': lambda entry: (entry['name'].lower(), entry['name']),
+    'size': lambda entry: (entry['size'], entry['name']),
+    'modified': lambda entry: (entry['modified'], entry['name'])
+}
+
+
+class FileIndex:
+    def __init__(self, root, hidden_prefix, snapshot_path, poll_interval=5, change_log_size=10000):
+        self.root = Path(root)
+        self.hidden_prefix = hidden_prefix
+        self.snapshot_path = Path(snapshot_path)
+        self.poll_interval = poll_interval
+        self.entries = {}
+        self.dirs = {}
+        self.total_size = 0
+        self.dir_mtime_ns = None
+        self.verified = False
+        self.dirty = False
+        self.epoch = uuid.uuid4().hex
+        self.version = 0
+        self.changes = deque(maxlen=change_log_size)
+        self.sorted_cache = {}
+        self.lock = threading.RLock()
+        self.watcher = None
+
+    def is_hidden(self, name):
+        return name.startswith(self.hidden_prefix)
+
+    def entry_for(self, name, st):
+        return {
+            'name': name,
+            'size': st.st_size,
+            'modified': st.st_mtime
+        }
+
+    def dir_entry_for(self, name, st):
+        return {
+            'name': name,
+            'modified': st.st_mtime,
+            'type': 'dir'
+        }
+
+    def set_entry(self, name, entry):
+        old = self.entries.get(name)
+        if old == entry:
+            return
+        if old:
+            self.total_size -= old['size']
+        if entry:
+            self.entries[name] = entry
+            self.total_size += entry['size']
+        else:
+            del self.entries[name]
+        self.version += 1
+        self.changes.append((self.version, name))
+        self.dirty = True
+
+    def list_directory(self, path):
+        files = {}
+        dirs = {}
+        with os.scandir(path) as it:
+            for entry in it:
+                if self.is_hidden(entry.name):
+                    continue
+                try:
+                    if entry.is_file():
+                        files[entry.name] = self.entry_for(entry.name, entry.stat())
+                    elif entry.is_dir():
+                        dirs[entry.name] = self.dir_entry_for(entry.name, entry.stat())
+                except OSError:
+                    continue
+        return files, dirs
+
+    def scan(self):
+        dir_mtime_ns = os.stat(self.root).st_mtime_ns
+        found, dirs = self.list_directory(self.root)
+
+        with self.lock:
+            for name in list(self.entries):
+                if name not in found:
+                    self.set_entry(name, None)
+            for name, entry in found.items():
+                self.set_entry(name, entry)
+            if dirs != self.dirs:
+                self.dirs = dirs
+                self.dirty = True
+            self.dir_mtime_ns = dir_mtime_ns
+            self.verified = True
+
+    def refresh(self, path):
+        path = Path(path)
+        try:
+            relative = path.resolve().relative_to(self.root.resolve())
+        except ValueError:
+            return
+        if not relative.parts or self.is_hidden(relative.parts[0]):
+            return
+        name = relative.parts[0]
+        path = self.root / name
+        entry = directory = None
+        try:
+            st = path.stat()
+            if path.is_file():
+                entry = self.entry_for(name, st)
+            elif path.is_dir():
+                directory = self.dir_entry_for(name, st)
+        except OSError:
+            pass
+
+        with self.lock:
+            if entry or name in self.entries:
+                self.set_entry(name, entry)
+                self.dir_mtime_ns = os.stat(self.root).st_mtime_ns
+            if directory != self.dirs.get(name):
+                if directory:
+                    self.dirs[name] = directory
+                else:
+                    del self.dirs[name]
+                self.dirty = True
+                self.dir_mtime_ns = os.stat(self.root).st_mtime_ns
+
+    def files(self):
+        with self.lock:
+            return list(self.entries.values())
+
+    def directories(self):
+        with self.lock:
+            return sorted(self.dirs.values(), key=SORT_KEYS['name'])
+
+    def totals(self):
+        with self.lock:
+            return len(self.entries), self.total_size
+
+    def sorted_entries(self, sort):
+        with self.lock:
+            cached = self.sorted_cache.get(sort)
+            if cached and cached[0] == self.version:
+                return cached[1], cached[2]
+            key = SORT_KEYS[sort]
+            entries = sorted(self.entries.values(), key=key)
+            keys = [key(entry) for entry in entries]
+            self.sorted_cache[sort] = (self.version, entries, keys)
+            return entries, keys
+
+    def matches(self, entry, filters):
+        if not filters:
+            return True
+        name = filters.get('name')
+        if name and name.lower() not in entry['name'].lower():
+            return False
+        if 'min_size' in filters and entry['size'] < filters['min_size']:
+            return False
+        if 'max_size' in filters and entry['size'] > filters['max_size']:
+            return False
+        if 'modified_after' in filters and entry['modified'] < filters['modified_after']:
+            return False
+        if 'modified_before' in filters and entry['modified'] > filters['modified_before']:
+            return False
+        return True
+
+    def query(self, sort='name', reverse=False, filters=None, cursor=None, limit=None):
+        entries, keys = self.sorted_entries(sort)
+        return self.page(entries, keys, sort, reverse, filters, cursor, limit)
+
+    def browse(self, path, sort='name', reverse=False, filters=None, cursor=None, limit=None):
+        files, dirs = self.list_directory(path)
+        key = SORT_KEYS[sort]
+        entries = sorted(files.values(), key=key)
+        keys = [key(entry) for entry in entries]
+        page, next_cursor = self.page(entries, keys, sort, reverse, filters, cursor, limit)
+        return sorted(dirs.values(), key=SORT_KEYS['name']), page, next_cursor
+
+    def page(self, entries, keys, sort, reverse, filters, cursor, limit):
+        if reverse:
+            end = bisect.bisect_left(keys, tuple(cursor)) if cursor else len(entries)
+            indices = range(end - 1, -1, -1)
+        else:
+            start = bisect.bisect_right(keys, tuple(cursor)) if cursor else 0
+            indices = range(start, len(entries))
+
+        page = []
+        for i in indices:
+            if self.matches(entries[i], filters):
+                page.append(entries[i])
+                if limit and len(page) > limit:
+                    break
+
+        next_cursor = None
+        if limit and len(page) > limit:
+            page = page[:limit]
+            next_cursor = list(SORT_KEYS[sort](page[-1]))
+        return page, next_cursor
+
+    def changes_since(self, epoch, version):
+        with self.lock:
+            if epoch != self.epoch or version > self.version:
+                return None
+            if version < self.version and (not self.changes or self.changes[0][0] > version + 1):
+                return None
+            names = {name for v, name in self.changes if v > version}
+            return self.version, [(name, self.entries.get(name)) for name in names]
+
+    def load(self):
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            entries = {entry['name']: entry for entry in snapshot['files']}
+            dirs = {entry['name']: entry for entry in snapshot.get('dirs', [])}
+            with self.lock:
+                self.epoch = snapshot['epoch']
+                self.version = snapshot['version']
+                self.dir_mtime_ns = snapshot['dir_mtime_ns'] if 'dirs' in snapshot else None
+                self.entries = entries
+                self.dirs = dirs
+                self.total_size = sum(entry['size'] for entry in entries.values())
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Не удалось прочитать снимок индекса {self.snapshot_path}: {e}")
+
+        if self.dir_mtime_ns != os.stat(self.root).st_mtime_ns:
+            self.scan()
+            self.save()
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = {
+                'dir_mtime_ns': self.dir_mtime_ns,
+                'epoch': self.epoch,
+                'version': self.version,
+                'files': list(self.entries.values()),
+                'dirs': list(self.dirs.values())
+            }
+            self.dirty = False
+
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + '.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            logging.warning(f"Не удалось сохранить снимок индекса {self.snapshot_path}: {e}")
+
+    def start_watcher(self):
+        if InotifyWatcher.available():
+            try:
+                self.watcher = InotifyWatcher(self)
+            except OSError as e:
+                logging.warning(f"inotify недоступен ({e}), используется периодический опрос")
+        if self.watcher is None:
+            self.watcher = PollWatcher(self)
+        self.watcher.start()
+        logging.info(f"Индекс файлов: {len(self.entries)} файлов, наблюдение через {self.watcher.name}")
+
+
+class PollWatcher(threading.Thread):
+    def __init__(self, index, full_rescan_every=12):
+        super().__init__(name='poll', daemon=True)
+        self.index = index
+        self.full_rescan_every = full_rescan_every
+
+    def run(self):
+        ticks = 0
+        while True:
+            time.sleep(self.index.poll_interval)
+            ticks += 1
+            try:
+                changed = os.stat(self.index.root).st_mtime_ns != self.index.dir_mtime_ns
+                if changed or not self.index.verified or ticks % self.full_rescan_every == 0:
+                    self.index.scan()
+                self.index.save()
+            except Exception as e:
+                logging.error(f"Ошибка обновления индекса файлов: {e}")
+
+
+class InotifyWatcher(threading.Thread):
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    EVENT = struct.Struct('iIII')
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith('linux') and ctypes.util.find_library('c') is not None
+
+    def __init__(self, index, rescan_interval=300):
+        super().__init__(name='inotify', daemon=True)
+        self.index = index
+        self.rescan_interval = rescan_interval
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init')
+        mask = (self.IN_ATTRIB | self.IN_CLOSE_WRITE | self.IN_MOVED_FROM |
+                self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE)
+        if self.libc.inotify_add_watch(self.fd, os.fsencode(index.root), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch')
+
+    def run(self):
+        rescan_at = time.monotonic() + self.rescan_interval if self.index.verified else 0
+        while True:
+            try:
+                if time.monotonic() >= rescan_at:
+                    rescan_at = time.monotonic() + self.rescan_interval
+                    self.index.scan()
+                ready, _, _ = select.select([self.fd], [], [], self.index.poll_interval)
+                if ready:
+                    self.process(os.read(self.fd, 64 * 1024))
+                self.index.save()
+            except Exception as e:
+                logging.error(f"Ошибка обновления индекса файлов: {e}")
+                time.sleep(self.index.poll_interval)
+
+    def process(self, data):
+        names = set()
+        overflow = False
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                overflow = True
+            elif name:
+                names.add(os.fsdecode(name))
+
+        if overflow:
+            self.index.scan()
+        else:
+            for name in names:
+                self.index.refresh(self.index.root / name)
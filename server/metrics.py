@@ -0,0 +1,178 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from slanfm import tracing
+
+COMMAND_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30, 120, 600)
+HANDSHAKE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+TIMERS = ('hash', 'disk')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def report(self):
+        cumulative = []
+        total = 0
+        for count in self.counts[:-1]:
+            total += count
+            cumulative.append(total)
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'buckets': [[le, count] for le, count in zip(self.buckets, cumulative)]
+        }
+
+
+class Timer:
+    def __init__(self, metrics, kind):
+        self.metrics = metrics
+        self.kind = kind
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add(self.kind, time.perf_counter() - self.started)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.commands = {}
+        self.seconds = {kind: 0.0 for kind in TIMERS}
+        self.handshakes = Histogram(HANDSHAKE_BUCKETS)
+        self.handshake_failures = 0
+        self.connections_total = 0
+
+    def observe_command(self, command, seconds):
+        with self.lock:
+            histogram = self.commands.get(command)
+            if histogram is None:
+                histogram = self.commands[command] = Histogram(COMMAND_BUCKETS)
+            histogram.observe(seconds)
+
+    def observe_handshake(self, seconds=None):
+        with self.lock:
+            if seconds is None:
+                self.handshake_failures += 1
+            else:
+                self.handshakes.observe(seconds)
+
+    def connection_opened(self):
+        with self.lock:
+            self.connections_total += 1
+
+    def add(self, kind, seconds):
+        with self.lock:
+            self.seconds['disk' if kind in ('read', 'write') else kind] += seconds
+
+    def timer(self, kind):
+        return Timer(self, kind)
+
+    def disk(self, f, trace=tracing.NULL_TRACE):
+        return tracing.TimedFile(f, self, trace)
+
+    def hasher(self, hash_object, trace=tracing.NULL_TRACE):
+        return tracing.TimedHash(hash_object, self, trace)
+
+    def snapshot(self, shaping, admission):
+        with self.lock:
+            commands = {command: histogram.report() for command, histogram in sorted(self.commands.items())}
+            seconds = {kind: round(value, 6) for kind, value in self.seconds.items()}
+            handshakes = self.handshakes.report()
+            handshake_failures = self.handshake_failures
+            connections_total = self.connections_total
+        return {
+            'uptime': round(time.time() - self.started, 1),
+            'commands': commands,
+            'bytes_in': shaping['bytes']['upload'],
+            'bytes_out': shaping['bytes']['download'],
+            'total_rate': shaping['total_rate'],
+            'connections': admission['connections'],
+            'connections_total': connections_total,
+            'transfers': admission['transfers'],
+            'waiting': admission['waiting'],
+            'rejected': admission['rejected'],
+            'hash_seconds': seconds['hash'],
+            'disk_seconds': seconds['disk'],
+            'tls_handshakes': handshakes,
+            'tls_handshake_failures': handshake_failures
+        }
+
+
+def histogram_lines(name, report, labels=''):
+    separator = ',' if labels else ''
+    lines = []
+    for le, count in report['buckets']:
+        lines.append(f'{name}_bucket{{{labels}{separator}le="{le}"}} {count}')
+    lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {report["count"]}')
+    suffix = f'{{{labels}}}' if labels else ''
+    lines.append(f'{name}_sum{suffix} {report["sum"]}')
+    lines.append(f'{name}_count{suffix} {report["count"]}')
+    return lines
+
+
+def prometheus_text(stats):
+    lines = [
+        '# TYPE slanfm_uptime_seconds gauge',
+        f'slanfm_uptime_seconds {stats["uptime"]}',
+        '# TYPE slanfm_command_duration_seconds histogram'
+    ]
+    for command, report in stats['commands'].items():
+        lines.extend(histogram_lines('slanfm_command_duration_seconds', report, f'command="{command}"'))
+
+    for name, kind, key in (
+        ('slanfm_received_bytes_total', 'counter', 'bytes_in'),
+        ('slanfm_sent_bytes_total', 'counter', 'bytes_out'),
+        ('slanfm_transfer_rate_bytes', 'gauge', 'total_rate'),
+        ('slanfm_connections', 'gauge', 'connections'),
+        ('slanfm_connections_total', 'counter', 'connections_total'),
+        ('slanfm_transfers_active', 'gauge', 'transfers'),
+        ('slanfm_transfers_waiting', 'gauge', 'waiting'),
+        ('slanfm_rejected_total', 'counter', 'rejected'),
+        ('slanfm_hash_seconds_total', 'counter', 'hash_seconds'),
+        ('slanfm_disk_seconds_total', 'counter', 'disk_seconds'),
+        ('slanfm_tls_handshake_failures_total', 'counter', 'tls_handshake_failures')
+    ):
+        lines.append(f'# TYPE {name} {kind}')
+        lines.append(f'{name} {stats[key]}')
+
+    lines.append('# TYPE slanfm_tls_handshake_duration_seconds histogram')
+    lines.extend(histogram_lines('slanfm_tls_handshake_duration_seconds', stats['tls_handshakes']))
+    return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(host, port, collect):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = prometheus_text(collect()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name='metrics', daemon=True).start()
+    return httpd
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+class PartialUpload:
+    def __init__(self, store, filename, size, md5, resumable):
+        self.store = store
+        self.filename = filename
+        self.size = size
+        self.md5 = md5
+        self.resumable = resumable
+        key = hashlib.sha1(filename.encode('utf-8')).hexdigest()
+        self.part_path = store.root / f'{key}.part'
+        self.journal_path = store.root / f'{key}.json'
+        self.received = 0
+        self.checkpointed = 0
+        self.md5_hash = hashlib.md5()
+
+    def journal(self):
+        return {'filename': self.filename, 'size': self.size, 'md5': self.md5, 'received': self.received}
+
+    def checkpoint(self):
+        tmp_path = self.journal_path.with_name(self.journal_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.journal(), f)
+        os.replace(tmp_path, self.journal_path)
+        self.checkpointed = self.received
+
+
+class PartialStore:
+    def __init__(self, root, max_age=7 * 24 * 3600, checkpoint_bytes=16 * 1024 * 1024,
+                 striped_max_age=3600, max_striped=16):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self.checkpoint_bytes = checkpoint_bytes
+        self.striped_max_age = striped_max_age
+        self.max_striped = max_striped
+        self.active = set()
+        self.striped = {}
+        self.lock = threading.Lock()
+
+    def open(self, filename, size, md5, resume):
+        upload = PartialUpload(self, filename, size, md5, resume and bool(md5))
+        with self.lock:
+            if upload.part_path in self.active:
+                raise BlockingIOError(f"Файл {filename} уже загружается другим клиентом")
+            self.active.add(upload.part_path)
+
+        try:
+            if upload.resumable:
+                self.restore(upload)
+            if upload.received == 0:
+                open(upload.part_path, 'wb').close()
+                if upload.resumable:
+                    upload.checkpoint()
+        except Exception:
+            self.release(upload)
+            raise
+        return upload
+
+    def restore(self, upload):
+        try:
+            with open(upload.journal_path, 'r', encoding='utf-8') as f:
+                journal = json.load(f)
+            part_size = upload.part_path.stat().st_size
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        if (journal.get('filename'), journal.get('size'), journal.get('md5')) != (upload.filename, upload.size, upload.md5):
+            return
+
+        received = min(journal.get('received', 0), part_size, upload.size)
+        with open(upload.part_path, 'r+b') as f:
+            f.truncate(received)
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                upload.md5_hash.update(chunk)
+        upload.received = upload.checkpointed = received
+
+        if received:
+            logging.info(f"Возобновление загрузки {upload.filename} с {received}/{upload.size} байт")
+
+    def discard(self, upload):
+        for path in (upload.part_path, upload.journal_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def release(self, upload):
+        with self.lock:
+            self.active.discard(upload.part_path)
+
+    def begin_striped(self, filename, size, md5):
+        deadline = time.time() - self.striped_max_age
+        with self.lock:
+            for upload in list(self.striped.values()):
+                if upload.touched < deadline and not upload.receiving:
+                    logging.info(f"Незавершённая параллельная загрузка {upload.filename} удалена по истечении срока")
+                    self.drop_striped(upload)
+
+            if len(self.striped) >= self.max_striped:
+                raise OSError("Слишком много незавершённых параллельных загрузок, повторите позже")
+            reserved = sum(upload.size for upload in self.striped.values())
+            if shutil.disk_usage(self.root).free - reserved < size:
+                raise OSError("Недостаточно места на диске сервера")
+
+            upload = StripedUpload(self, filename, size, md5)
+            self.striped[upload.transfer_id] = upload
+        try:
+            upload.allocate()
+        except Exception:
+            self.finish_striped(upload)
+            raise
+        return upload
+
+    def get_striped(self, transfer_id):
+        with self.lock:
+            upload = self.striped.get(transfer_id)
+            if upload:
+                upload.touched = time.time()
+            return upload
+
+    def drop_striped(self, upload):
+        self.striped.pop(upload.transfer_id, None)
+        try:
+            upload.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def finish_striped(self, upload):
+        with self.lock:
+            self.drop_striped(upload)
+
+    def cleanup(self):
+        deadline = time.time() - self.max_age
+        for path in self.root.iterdir():
+            try:
+                if path.suffix == '.stripe' or path.stat().st_mtime < deadline:
+                    path.unlink()
+            except OSError:
+                continue
+
+
+class StripedUpload:
+    def __init__(self, store, filename, size, md5):
+        self.filename = filename
+        self.size = size
+        self.md5 = md5
+        self.transfer_id = uuid.uuid4().hex
+        self.path = store.root / f'{self.transfer_id}.stripe'
+        self.ranges = []
+        self.chunks = None
+        self.touched = time.time()
+        self.receiving = 0
+        self.lock = threading.Lock()
+
+    def allocate(self):
+        with open(self.path, 'wb') as f:
+            f.truncate(self.size)
+
+    def start_range(self):
+        with self.lock:
+            self.receiving += 1
+
+    def end_range(self):
+        with self.lock:
+            self.receiving -= 1
+            self.touched = time.time()
+
+    def add_range(self, offset, length):
+        with self.lock:
+            self.ranges.append((offset, length))
+
+    def received_ranges(self):
+        with self.lock:
+            return sorted(self.ranges)
+
+    def is_complete(self):
+        with self.lock:
+            covered = 0
+            for offset, length in sorted(self.ranges):
+                if offset > covered:
+                    return False
+                covered = max(covered, offset + length)
+            return covered >= self.size
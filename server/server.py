@@ -3,14 +3,39 @@ import threading
 import os
 import json
 import hashlib
+import hmac
+import io
 from pathlib import Path
 import logging
 import struct
 import sys
 import ssl
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from async_engine import AsyncEngine
+from chunk_store import ChunkStore
+from digest_cache import DigestCache
+from file_index import FileIndex, SORT_KEYS
+from partial_store import PartialStore
+from shaping import Shaper, valid_limits
+from admission import Admission, TransferSlot
+from metrics import Metrics, serve_metrics
+from slanfm import chunking, compression, delta, framing, multiplex, tracing, tree, tuning
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+INTERNAL_PREFIX = '.slanfm'
+TLS_RECORD_HANDSHAKE = b'\x16'
+COMMANDS = ('list', 'upload', 'download', 'upload_dedup', 'signature', 'upload_delta', 'download_delta',
+            'stripe_begin', 'stripe_upload', 'stripe_commit', 'stripe_abort', 'upload_many', 'download_many', 'download_tree',
+            'delete', 'info', 'stats', 'ping', 'admin', 'upgrade', 'disconnect')
+TRANSFER_COMMANDS = ('upload', 'download', 'upload_dedup', 'upload_delta', 'download_delta', 'stripe_upload',
+                     'upload_many', 'download_many', 'download_tree')
+
 
 class FileServer:
     def __init__(self, host='0.0.0.0', port=6666, upload_dir='server_files', config_path='server_config.json'):
@@ -23,6 +48,8 @@ class FileServer:
         self.server = None
         self.max_file_size = 2 * 1024 * 1024 * 1024
         self.chunk_size = 65536
+        self.chunk_size_min = 16 * 1024
+        self.chunk_size_max = 1024 * 1024
         self.timeout = 120
         self.can_clients_delete_files = True
         self.auth_token = None
@@ -30,12 +57,48 @@ class FileServer:
         self.cert_file = None
         self.key_file = None
         self.ssl_context = None
+        self.tls_handshake_timeout = 10
+        self.tls_detect_timeout = 1
+        self.engine = 'threaded'
+        self.io_workers = 32
+        self.index_poll_interval = 5
+        self.rate_limits = {}
+        self.admin_token = None
+        self.listen_backlog = 128
+        self.max_connections = 256
+        self.max_transfers = 64
+        self.max_streams = 32
+        self.mux_factory = None
+        self.queue_timeout = 30
+        self.metrics_host = '127.0.0.1'
+        self.metrics_port = 0
+        self.trace_file = ''
+        self.trace_max_bytes = tracing.MAX_BYTES
+        self.trace_backups = tracing.BACKUPS
+        self.tracer = None
 
         if config_path:
             self.load_config(config_path)
             if self.tls_enabled:
                 self.setup_tls()
 
+        self.meta_dir = self.upload_dir / INTERNAL_PREFIX
+        self.meta_dir.mkdir(exist_ok=True)
+        self.digest_cache = DigestCache(self.upload_dir, self.meta_dir / 'digests.json')
+        self.file_index = FileIndex(self.upload_dir, INTERNAL_PREFIX, self.meta_dir / 'index.json',
+                                    poll_interval=self.index_poll_interval)
+        self.partial_store = PartialStore(self.meta_dir / 'partial')
+        self.chunk_store = ChunkStore(self.upload_dir, self.meta_dir / 'chunks.db')
+        self.shaper = Shaper(self.rate_limits)
+        self.admission = Admission(self.max_connections, self.max_transfers, self.queue_timeout)
+        self.metrics = Metrics()
+        if self.trace_file:
+            try:
+                self.tracer = tracing.Tracer(self.trace_file, self.trace_max_bytes, self.trace_backups)
+                logging.info(f"Трассировка передач записывается в {self.trace_file}")
+            except Exception as e:
+                logging.error(f"Не удалось открыть файл трассировки {self.trace_file}: {e}")
+
     def resource_path(self, relative_path):
         try:
             base_path = Path(sys._MEIPASS)
@@ -98,6 +161,27 @@ class FileServer:
                 else:
                     logging.warning(f"Некорректный chunk_size в конфиге: {new_chunk}. Используется значение {self.chunk_size}")
 
+            if 'chunk_size_min' in config:
+                chunk_size_min = config['chunk_size_min']
+                if isinstance(chunk_size_min, int) and chunk_size_min > 0:
+                    self.chunk_size_min = chunk_size_min
+                else:
+                    logging.warning(f"Некорректный chunk_size_min в конфиге: {chunk_size_min}. Используется значение {self.chunk_size_min}")
+
+            if 'chunk_size_max' in config:
+                chunk_size_max = config['chunk_size_max']
+                if isinstance(chunk_size_max, int) and chunk_size_max > 0:
+                    self.chunk_size_max = chunk_size_max
+                else:
+                    logging.warning(f"Некорректный chunk_size_max в конфиге: {chunk_size_max}. Используется значение {self.chunk_size_max}")
+
+            if not self.chunk_size_min <= self.chunk_size <= self.chunk_size_max:
+                self.chunk_size_min = min(self.chunk_size_min, self.chunk_size)
+                self.chunk_size_max = max(self.chunk_size_max, self.chunk_size)
+                if 'chunk_size_min' in config or 'chunk_size_max' in config:
+                    logging.warning(f"chunk_size должен быть в пределах chunk_size_min и chunk_size_max. "
+                                    f"Используются пределы {self.chunk_size_min}-{self.chunk_size_max}")
+
             if 'timeout' in config:
                 new_timeout = config['timeout']
                 if isinstance(new_timeout, int) and new_timeout > 0:
@@ -126,6 +210,13 @@ class FileServer:
                 else:
                     logging.warning(f"Некорректный tls_enabled в конфиге: {tls_enabled}. Используется значение {self.tls_enabled}")
 
+            if 'tls_handshake_timeout' in config:
+                tls_handshake_timeout = config['tls_handshake_timeout']
+                if isinstance(tls_handshake_timeout, (int, float)) and tls_handshake_timeout > 0:
+                    self.tls_handshake_timeout = tls_handshake_timeout
+                else:
+                    logging.warning(f"Некорректный tls_handshake_timeout в конфиге: {tls_handshake_timeout}. Используется значение {self.tls_handshake_timeout}")
+
             if 'cert_file' in config:
                 if self.tls_enabled:
                     cert_file = config['cert_file']
@@ -142,6 +233,111 @@ class FileServer:
                     else:
                         logging.warning(f"Некорректный key_file в конфиге: {key_file}. Используется значение {self.key_file}")
 
+            if 'engine' in config:
+                engine = config['engine']
+                if engine in ('threaded', 'asyncio'):
+                    self.engine = engine
+                else:
+                    logging.warning(f"Некорректный engine в конфиге: {engine}. Используется значение {self.engine}")
+
+            if 'io_workers' in config:
+                io_workers = config['io_workers']
+                if isinstance(io_workers, int) and io_workers > 0:
+                    self.io_workers = io_workers
+                else:
+                    logging.warning(f"Некорректный io_workers в конфиге: {io_workers}. Используется значение {self.io_workers}")
+
+            if 'index_poll_interval' in config:
+                index_poll_interval = config['index_poll_interval']
+                if isinstance(index_poll_interval, (int, float)) and index_poll_interval > 0:
+                    self.index_poll_interval = index_poll_interval
+                else:
+                    logging.warning(f"Некорректный index_poll_interval в конфиге: {index_poll_interval}. Используется значение {self.index_poll_interval}")
+
+            if 'rate_limits' in config:
+                rate_limits = config['rate_limits']
+                if valid_limits(rate_limits):
+                    self.rate_limits = rate_limits
+                else:
+                    logging.warning(f"Некорректный rate_limits в конфиге: {rate_limits}. Ограничение скорости отключено")
+
+            if 'admin_token' in config:
+                admin_token = config['admin_token']
+                if isinstance(admin_token, str):
+                    self.admin_token = admin_token
+                else:
+                    logging.warning(f"Некорректный admin_token в конфиге: {admin_token}. Команда admin отключена")
+
+            if 'listen_backlog' in config:
+                listen_backlog = config['listen_backlog']
+                if isinstance(listen_backlog, int) and listen_backlog > 0:
+                    self.listen_backlog = listen_backlog
+                else:
+                    logging.warning(f"Некорректный listen_backlog в конфиге: {listen_backlog}. Используется значение {self.listen_backlog}")
+
+            if 'max_connections' in config:
+                max_connections = config['max_connections']
+                if isinstance(max_connections, int) and max_connections >= 0:
+                    self.max_connections = max_connections
+                else:
+                    logging.warning(f"Некорректный max_connections в конфиге: {max_connections}. Используется значение {self.max_connections}")
+
+            if 'max_transfers' in config:
+                max_transfers = config['max_transfers']
+                if isinstance(max_transfers, int) and max_transfers >= 0:
+                    self.max_transfers = max_transfers
+                else:
+                    logging.warning(f"Некорректный max_transfers в конфиге: {max_transfers}. Используется значение {self.max_transfers}")
+
+            if 'max_streams' in config:
+                max_streams = config['max_streams']
+                if isinstance(max_streams, int) and max_streams >= 0:
+                    self.max_streams = max_streams
+                else:
+                    logging.warning(f"Некорректный max_streams в конфиге: {max_streams}. Используется значение {self.max_streams}")
+
+            if 'queue_timeout' in config:
+                queue_timeout = config['queue_timeout']
+                if isinstance(queue_timeout, (int, float)) and queue_timeout >= 0:
+                    self.queue_timeout = queue_timeout
+                else:
+                    logging.warning(f"Некорректный queue_timeout в конфиге: {queue_timeout}. Используется значение {self.queue_timeout}")
+
+            if 'metrics_host' in config:
+                metrics_host = config['metrics_host']
+                if isinstance(metrics_host, str) and metrics_host:
+                    self.metrics_host = metrics_host
+                else:
+                    logging.warning(f"Некорректный metrics_host в конфиге: {metrics_host}. Используется значение {self.metrics_host}")
+
+            if 'metrics_port' in config:
+                metrics_port = config['metrics_port']
+                if isinstance(metrics_port, int) and 0 <= metrics_port <= 65535:
+                    self.metrics_port = metrics_port
+                else:
+                    logging.warning(f"Некорректный metrics_port в конфиге: {metrics_port}. Экспорт метрик отключён")
+
+            if 'trace_file' in config:
+                trace_file = config['trace_file']
+                if isinstance(trace_file, str):
+                    self.trace_file = trace_file
+                else:
+                    logging.warning(f"Некорректный trace_file в конфиге: {trace_file}. Трассировка отключена")
+
+            if 'trace_max_bytes' in config:
+                trace_max_bytes = config['trace_max_bytes']
+                if isinstance(trace_max_bytes, int) and trace_max_bytes > 0:
+                    self.trace_max_bytes = trace_max_bytes
+                else:
+                    logging.warning(f"Некорректный trace_max_bytes в конфиге: {trace_max_bytes}. Используется значение {self.trace_max_bytes}")
+
+            if 'trace_backups' in config:
+                trace_backups = config['trace_backups']
+                if isinstance(trace_backups, int) and trace_backups >= 0:
+                    self.trace_backups = trace_backups
+                else:
+                    logging.warning(f"Некорректный trace_backups в конфиге: {trace_backups}. Используется значение {self.trace_backups}")
+
             logging.info(f"Конфигурация загружена из {config_path}")
 
         except json.JSONDecodeError as e:
@@ -159,6 +355,8 @@ class FileServer:
 
             self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
             self.ssl_context.load_cert_chain(cert_file, key_file)
+            self.ssl_context.options &= ~ssl.OP_NO_TICKET
+            self.ssl_context.num_tickets = 2
 
         except Exception as e:
             logging.error(f"Ошибка загрузки TLS сертификата: {e}")
@@ -174,7 +372,20 @@ class FileServer:
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server.bind((self.host, self.port))
-        self.server.listen(5)
+        self.server.listen(self.listen_backlog)
+
+        self.file_index.load()
+        self.file_index.start_watcher()
+        self.digest_cache.start_flusher()
+        self.partial_store.cleanup()
+
+        metrics_server = None
+        if self.metrics_port:
+            try:
+                metrics_server = serve_metrics(self.metrics_host, self.metrics_port, self.collect_stats)
+                logging.info(f"Метрики Prometheus доступны на http://{self.metrics_host}:{self.metrics_port}/metrics")
+            except OSError as e:
+                logging.error(f"Не удалось запустить экспорт метрик на порту {self.metrics_port}: {e}")
 
         auth_required = 'включена' if self.auth_token else 'не требуется'
         tls_enabled = 'включён, сертификат и ключ загружены' if self.tls_enabled else 'выключен'
@@ -182,31 +393,41 @@ class FileServer:
         logging.info(f"Директория для серверных файлов: {self.upload_dir.absolute()}")
         logging.info(f"Аутентификация для пользователей {auth_required}")
         logging.info(f"TLS {tls_enabled}")
+        logging.info(f"Движок обработки соединений: {self.engine}")
+        logging.info(f"Предел соединений: {self.max_connections or 'не ограничен'}, "
+                     f"предел передач: {self.max_transfers or 'не ограничен'}, ожидание в очереди: {self.queue_timeout} с")
 
         try:
-            while True:
-                client_socket, address = self.server.accept()
-                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-
-                if self.tls_enabled and self.ssl_context:
-                    try:
-                        client_socket = self.ssl_context.wrap_socket(client_socket, server_side=True)
-                    except ssl.SSLError as e:
-                        logging.error(f"Ошибка TLS-рукопожатия с {address}: {e}")
-                        client_socket.close()
-                        continue
-
-                client_thread = threading.Thread(
-                    target=self.handle_client,
-                    args=(client_socket, address)
-                )
-                client_thread.daemon = True
-                client_thread.start()
+            if self.engine == 'asyncio':
+                AsyncEngine(self).serve()
+            else:
+                self.serve_threaded()
         except KeyboardInterrupt:
             logging.info("Остановка сервера...")
         finally:
             if self.server:
                 self.server.close()
+            if metrics_server:
+                metrics_server.shutdown()
+            self.file_index.save()
+            self.digest_cache.save()
+
+    def serve_threaded(self):
+        reject_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='reject')
+        while True:
+            client_socket, address = self.server.accept()
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            if not self.admission.admit_connection():
+                reject_pool.submit(self.handle_client, client_socket, address, False)
+                continue
+
+            client_thread = threading.Thread(
+                target=self.handle_client,
+                args=(client_socket, address)
+            )
+            client_thread.daemon = True
+            client_thread.start()
 
     def is_port_available(self):
         try:
@@ -223,115 +444,385 @@ class FileServer:
             user_path = Path(filename)
             if user_path.is_absolute():
                 return False
+            if any(part.startswith(INTERNAL_PREFIX) for part in user_path.parts):
+                return False
             requested_path = (self.upload_dir / user_path).resolve()
             base_path = self.upload_dir.resolve()
             return base_path == requested_path or base_path in requested_path.parents
         except Exception:
             return False
 
-    def handle_client(self, client_socket, address):
+    def wrap_tls(self, client_socket, address):
+        if not (self.tls_enabled and self.ssl_context):
+            return client_socket
+
+        timeout = client_socket.gettimeout()
         try:
-            self.send_response(client_socket, {
-                'type': 'init',
-                'chunk_size': self.chunk_size,
-                'max_file_size': self.max_file_size,
-                'timeout': self.timeout,
-                'auth_required': bool(self.auth_token)
-            })
+            client_socket.settimeout(self.tls_detect_timeout)
+            first = client_socket.recv(1, socket.MSG_PEEK)
+        except socket.timeout:
+            first = None
+        except OSError:
+            first = b''
+        if not self.check_client_hello(client_socket, address, first):
+            return None
 
-            if self.auth_token:
-                command_data = self.receive_all(client_socket, 4)
-                if not command_data or len(command_data) != 4:
-                    return
+        started = time.perf_counter()
+        try:
+            client_socket.settimeout(self.tls_handshake_timeout)
+            tls_socket = self.ssl_context.wrap_socket(client_socket, server_side=True)
+        except (ssl.SSLError, OSError) as e:
+            logging.error(f"Ошибка TLS-рукопожатия с {address}: {e}")
+            self.metrics.observe_handshake()
+            client_socket.close()
+            return None
 
-                data_length = struct.unpack('>I', command_data)[0]
-                json_data = self.receive_all(client_socket, data_length)
-                if not json_data:
-                    return
+        self.metrics.observe_handshake(time.perf_counter() - started)
+        tls_socket.settimeout(timeout)
+        if tls_socket.session_reused:
+            logging.debug(f"TLS-сессия {address} возобновлена")
+        return tls_socket
 
-                try:
-                    command = json.loads(json_data.decode('utf-8'))
-                except UnicodeDecodeError:
-                    self.send_response(client_socket, {'status': 'error', 'message': 'Ошибка декодирования'})
-                    return
+    def is_client_hello(self, first):
+        return first == TLS_RECORD_HANDSHAKE
 
-                if command.get('command') != 'auth':
-                    self.send_response(client_socket, {'status': 'error', 'message': 'Требуется аутентификация'})
-                    return
+    def check_client_hello(self, client_socket, address, first):
+        if self.is_client_hello(first):
+            return True
 
-                token = command.get('token', '')
-                if token != self.auth_token:
-                    self.send_response(client_socket, {'status': 'error', 'message': 'Неверный токен'})
-                    return
+        if first is None:
+            logging.warning(f"Клиент {address} подключился без TLS")
+            try:
+                client_socket.settimeout(1)
+                self.send_response(client_socket, {'type': 'tls_required', 'message': 'Сервер принимает только TLS-соединения'})
+            except:
+                pass
+        elif first:
+            logging.error(f"Ошибка TLS-рукопожатия с {address}: получены данные не в формате TLS")
+        try:
+            client_socket.close()
+        except:
+            pass
+        return False
 
-                self.send_response(client_socket, {'status': 'success', 'message': 'Аутентификация успешна'})
+    def unexpected_tls(self, client_socket, address, header):
+        if header[:1] != TLS_RECORD_HANDSHAKE or isinstance(client_socket, (ssl.SSLSocket, multiplex.Stream)):
+            return False
+        logging.warning(f"Клиент {address} пытается подключиться по TLS, но TLS на сервере выключен")
+        return True
 
-            while True:
-                try:
-                    command_data = self.receive_all(client_socket, 4)
-                    if not command_data or len(command_data) != 4:
-                        break
+    def reject_client(self, client_socket, address):
+        busy = self.admission.busy_response()
+        logging.warning(f"Подключение {address} отклонено: достигнут предел соединений ({self.max_connections})")
+        try:
+            client_socket.settimeout(1)
+            self.send_response(client_socket, {'type': 'busy', **busy})
+        except:
+            pass
+        try:
+            client_socket.close()
+        except:
+            pass
 
-                    data_length = struct.unpack('>I', command_data)[0]
-                    json_data = self.receive_all(client_socket, data_length)
+    def handle_client(self, client_socket, address, admitted=True):
+        client_socket = self.wrap_tls(client_socket, address)
+        if client_socket is None:
+            if admitted:
+                self.admission.release_connection()
+            return
+        if not admitted:
+            self.reject_client(client_socket, address)
+            return
 
-                    if not json_data:
-                        break
+        try:
+            if self.greet_client(client_socket, address):
+                while self.command_handler(client_socket)(client_socket, address):
+                    pass
+        except Exception as e:
+            logging.error(f"Ошибка с клиентом {address}: {e}", exc_info=True)
+        finally:
+            self.close_client(client_socket)
+
+    def register_client(self, client_socket, address):
+        with self.lock:
+            self.clients[client_socket] = {'address': address}
+        self.metrics.connection_opened()
+
+    def client_mux(self, client_socket):
+        with self.lock:
+            return self.clients.get(client_socket, {}).get('mux')
+
+    def init_message(self, client_socket):
+        return {
+            'type': 'init',
+            'chunk_size': self.chunk_size,
+            'min_chunk_size': self.chunk_size_min,
+            'max_chunk_size': self.chunk_size_max,
+            'max_file_size': self.max_file_size,
+            'timeout': self.timeout,
+            'auth_required': bool(self.auth_token),
+            'download_modes': self.download_modes(client_socket),
+            'protocol_versions': [1, multiplex.PROTOCOL_VERSION],
+            'compression': compression.ALGORITHMS,
+            'dedup': True,
+            'delta': True,
+            'batch': True,
+            'tree': True
+        }
+
+    def check_auth(self, client_socket, command):
+        if command.get('command') != 'auth':
+            return {'status': 'error', 'message': 'Требуется аутентификация'}
+
+        token = command.get('token', '')
+        if not self.token_matches(token, self.auth_token):
+            return {'status': 'error', 'message': 'Неверный токен'}
+
+        with self.lock:
+            self.clients[client_socket]['token'] = token
+        return {'status': 'success', 'message': 'Аутентификация успешна'}
+
+    def token_matches(self, token, expected):
+        if not isinstance(token, str) or not expected:
+            return False
+        return hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8'))
 
-                    try:
-                        command = json.loads(json_data.decode('utf-8'))
-                    except UnicodeDecodeError:
-                        logging.error(f"Ошибка декодирования JSON от {address}")
-                        break
-
-                    cmd = command.get('command')
-
-                    if cmd == 'list':
-                        self.send_file_list(client_socket)
-                    elif cmd == 'upload':
-                        self.receive_file(client_socket, command)
-                    elif cmd == 'download':
-                        self.send_file(client_socket, command)
-                    elif cmd == 'delete':
-                        self.delete_file(client_socket, command)
-                    elif cmd == 'info':
-                        self.send_server_info(client_socket)
-                    elif cmd == 'disconnect':
-                        break
-                    else:
-                        self.send_response(client_socket, {'status': 'error', 'message': 'Неизвестная команда'})
-                except Exception as e:
-                    logging.error(f"Ошибка с клиентом {address}: {e}", exc_info=True)
-                    break
+    def command_length(self, client_socket, address, header):
+        if not header or len(header) != 4:
+            return None
+        if self.unexpected_tls(client_socket, address, header):
+            return None
+
+        data_length = struct.unpack('>I', header)[0]
+        if data_length > framing.MAX_MESSAGE:
+            logging.warning(f"Слишком большое сообщение от {address}: {data_length} байт")
+            return None
+        return data_length
+
+    def greet_client(self, client_socket, address):
+        self.register_client(client_socket, address)
+        self.send_response(client_socket, self.init_message(client_socket))
+
+        if self.auth_token:
+            data_length = self.command_length(client_socket, address, self.receive_all(client_socket, 4))
+            if data_length is None:
+                return False
+            json_data = self.receive_all(client_socket, data_length)
+            if not json_data:
+                return False
+
+            try:
+                command = json.loads(json_data.decode('utf-8'))
+            except UnicodeDecodeError:
+                self.send_response(client_socket, {'status': 'error', 'message': 'Ошибка декодирования'})
+                return False
+
+            response = self.check_auth(client_socket, command)
+            self.send_response(client_socket, response)
+            return response['status'] == 'success'
+
+        return True
+
+    def handle_command(self, client_socket, address):
+        try:
+            data_length = self.command_length(client_socket, address, self.receive_all(client_socket, 4))
+            if data_length is None:
+                return False
+            json_data = self.receive_all(client_socket, data_length)
+
+            if not json_data:
+                return False
+
+            try:
+                command = json.loads(json_data.decode('utf-8'))
+            except UnicodeDecodeError:
+                logging.error(f"Ошибка декодирования JSON от {address}")
+                return False
+        except Exception as e:
+            logging.error(f"Ошибка с клиентом {address}: {e}", exc_info=True)
+            return False
+        return self.execute_command(client_socket, address, command)
 
+    def is_transfer(self, command):
+        return command.get('command') in TRANSFER_COMMANDS
+
+    def execute_command(self, client_socket, address, command, admitted=False):
+        cmd = command.get('command')
+        started = time.perf_counter()
+        try:
+            if admitted:
+                with TransferSlot(self.admission):
+                    return self.dispatch_command(client_socket, address, cmd, command)
+            return self.admit_command(client_socket, address, cmd, command)
         except Exception as e:
             logging.error(f"Ошибка с клиентом {address}: {e}", exc_info=True)
+            return False
         finally:
-            try:
-                client_socket.close()
-            except:
+            self.metrics.observe_command(cmd if cmd in COMMANDS else 'unknown', time.perf_counter() - started)
+
+    def admit_command(self, client_socket, address, cmd, command):
+        if cmd not in TRANSFER_COMMANDS:
+            return self.dispatch_command(client_socket, address, cmd, command)
+
+        if not self.admission.acquire_transfer():
+            self.send_response(client_socket, self.transfer_rejected(address, cmd))
+            return True
+        with TransferSlot(self.admission):
+            return self.dispatch_command(client_socket, address, cmd, command)
+
+    def transfer_rejected(self, address, cmd):
+        busy = self.admission.busy_response()
+        logging.warning(f"Команда {cmd} от {address} отклонена: очередь передач переполнена, "
+                        f"повтор через {busy['retry_after']} с")
+        return busy
+
+    def dispatch_command(self, client_socket, address, cmd, command):
+        if cmd == 'list':
+            self.send_file_list(client_socket, command)
+        elif cmd == 'upload':
+            self.receive_file(client_socket, command)
+        elif cmd == 'download':
+            self.send_file(client_socket, command)
+        elif cmd == 'upload_dedup':
+            self.receive_file_dedup(client_socket, command)
+        elif cmd == 'signature':
+            self.send_signature(client_socket, command)
+        elif cmd == 'upload_delta':
+            self.receive_file_delta(client_socket, command)
+        elif cmd == 'download_delta':
+            self.send_file_delta(client_socket, command)
+        elif cmd == 'stripe_begin':
+            self.begin_striped_upload(client_socket, command)
+        elif cmd == 'stripe_upload':
+            self.receive_stripe(client_socket, command)
+        elif cmd == 'stripe_commit':
+            self.commit_striped_upload(client_socket, command)
+        elif cmd == 'stripe_abort':
+            self.abort_striped_upload(client_socket, command)
+        elif cmd == 'upload_many':
+            self.receive_many(client_socket, command)
+        elif cmd == 'download_many':
+            self.send_many(client_socket, command)
+        elif cmd == 'download_tree':
+            self.send_tree(client_socket, command)
+        elif cmd == 'delete':
+            self.delete_file(client_socket, command)
+        elif cmd == 'info':
+            self.send_server_info(client_socket)
+        elif cmd == 'stats':
+            self.send_response(client_socket, {'status': 'success', 'stats': self.collect_stats()})
+        elif cmd == 'ping':
+            self.send_response(client_socket, {'status': 'success', 'time': time.time()})
+        elif cmd == 'admin':
+            self.handle_admin(client_socket, address, command)
+        elif cmd == 'upgrade':
+            return self.upgrade_connection(client_socket, address, command)
+        elif cmd == 'disconnect':
+            return False
+        else:
+            self.send_response(client_socket, {'status': 'error', 'message': 'Неизвестная команда'})
+        return True
+
+    def upgrade_connection(self, client_socket, address, command):
+        if command.get('protocol') != multiplex.PROTOCOL_VERSION or isinstance(client_socket, multiplex.Stream):
+            self.send_response(client_socket, {'status': 'error', 'message': 'Неподдерживаемая версия протокола'})
+            return True
+
+        self.send_response(client_socket, {'status': 'success', 'protocol': multiplex.PROTOCOL_VERSION})
+        logging.info(f"Клиент {address} перешёл на мультиплексированный протокол")
+
+        if self.mux_factory:
+            mux = self.mux_factory(client_socket, address)
+        else:
+            mux = multiplex.Multiplexer(client_socket, on_stream=lambda stream: self.serve_stream(stream, address),
+                                        max_streams=self.max_streams)
+        with self.lock:
+            self.clients[client_socket]['mux'] = mux
+        return True
+
+    def command_handler(self, client_socket):
+        mux = self.client_mux(client_socket)
+        if mux:
+            return lambda sock, address: mux.read_frame()
+        return self.handle_command
+
+    def serve_stream(self, stream, address):
+        try:
+            while self.handle_command(stream, address):
                 pass
+        finally:
+            stream.close()
+
+    def close_client(self, client_socket):
+        with self.lock:
+            state = self.clients.pop(client_socket, None)
+        if state is not None:
+            self.admission.release_connection()
+        if state and state.get('mux'):
+            state['mux'].close()
+        self.shaper.forget_connection(client_socket)
+        try:
+            client_socket.close()
+        except:
+            pass
 
-    def send_file_list(self, client_socket):
+    def send_file_list(self, client_socket, command):
         try:
-            files = []
-            for f in self.upload_dir.iterdir():
-                if f.is_file():
-                    files.append({
-                        'name': f.name,
-                        'size': f.stat().st_size,
-                        'modified': f.stat().st_mtime
-                    })
+            sort = command.get('sort', 'name')
+            reverse = command.get('reverse', False)
+            limit = command.get('limit')
+            cursor = command.get('cursor')
+            filters = command.get('filter') or {}
+            path = command.get('path') or ''
+
+            if (sort not in SORT_KEYS or not isinstance(reverse, bool)
+                    or not (limit is None or (isinstance(limit, int) and limit > 0))
+                    or not (cursor is None or (isinstance(cursor, list) and len(cursor) == 2))
+                    or not isinstance(filters, dict)):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректные параметры списка'})
+                return
+
+            if path:
+                if not isinstance(path, str) or not self.is_safe_path(path) or not (self.upload_dir / path).is_dir():
+                    self.send_response(client_socket, {'status': 'error', 'message': 'Папка не найдена'})
+                    return
+                dirs, files, next_cursor = self.file_index.browse(self.upload_dir / path, sort, reverse, filters,
+                                                                  cursor, limit)
+                self.send_response(client_socket, {
+                    'status': 'success',
+                    'path': path,
+                    'dirs': dirs,
+                    'files': files,
+                    'next_cursor': next_cursor
+                })
+                return
 
             response = {
                 'status': 'success',
-                'files': files
+                'epoch': self.file_index.epoch,
+                'version': self.file_index.version,
+                'dirs': self.file_index.directories()
             }
+
+            if 'since_version' in command:
+                delta = self.file_index.changes_since(command.get('epoch'), command['since_version'])
+                if delta is not None:
+                    response['version'], changes = delta
+                    response['delta'] = True
+                    response['changed'] = [entry for _, entry in changes if entry and self.file_index.matches(entry, filters)]
+                    response['removed'] = [name for name, entry in changes if not entry or not self.file_index.matches(entry, filters)]
+                    self.send_response(client_socket, response)
+                    return
+
+            files, next_cursor = self.file_index.query(sort, reverse, filters, cursor, limit)
+            response['files'] = files
+            response['next_cursor'] = next_cursor
             self.send_response(client_socket, response)
         except Exception as e:
             self.send_response(client_socket, {'status': 'error', 'message': str(e)})
 
     def send_file(self, client_socket, command):
+        trace = tracing.NULL_TRACE
         try:
             filename = command['filename']
             if not self.is_safe_path(filename):
@@ -344,54 +835,169 @@ class FileServer:
                 return
 
             file_size = filepath.stat().st_size
+            offset = command.get('offset', 0)
+            length = command.get('length')
+            if length is None and isinstance(offset, int):
+                length = file_size - offset
+
+            if (not isinstance(offset, int) or not isinstance(length, int)
+                    or offset < 0 or length < 0 or offset + length > file_size):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректный диапазон'})
+                return
 
-            md5_hash = hashlib.md5()
-            with open(filepath, 'rb') as f:
-                for chunk in iter(lambda: f.read(8192), b''):
-                    md5_hash.update(chunk)
+            trace = self.open_trace(client_socket, 'download', filename, offset=offset, length=length)
+            with self.metrics.timer('hash'), trace.phase('digest'):
+                md5 = self.digest_cache.digest(filepath)
+
+            codec = compression.negotiate(command.get('compression'))
+            mode = command.get('mode', 'chunked')
+            if mode not in self.download_modes(client_socket) or codec:
+                mode = 'chunked'
 
             self.send_response(client_socket, {
                 'status': 'success',
                 'size': file_size,
                 'filename': filename,
-                'md5': md5_hash.hexdigest()
+                'md5': md5,
+                'mode': mode,
+                'offset': offset,
+                'length': length,
+                'compression': codec
             })
 
-            response = self.receive_response(client_socket)
+            with trace.phase('wait_ready'):
+                response = self.receive_response(client_socket)
+            if response and response.get('status') == 'cancel':
+                trace.finish('cancel')
+                return
             if not response or response.get('status') != 'ready':
                 logging.error("Клиент не подтвердил готовность к приему файла")
+                trace.finish('error', error='no ready')
                 return
 
-            sent_total = 0
-            with open(filepath, 'rb') as f:
-                while True:
-                    chunk = f.read(self.chunk_size)
-                    if not chunk:
-                        break
-
-                    try:
-                        client_socket.sendall(struct.pack('>I', len(chunk)))
-                        client_socket.sendall(chunk)
-                    except (ConnectionError, BrokenPipeError):
-                        logging.error("Соединение разорвано при отправке файла")
-                        return
-
-                    sent_total += len(chunk)
+            compressor = compression.ChunkCompressor(codec['algorithm'], codec['level']) if codec else None
+            tuner = self.sending_tuner(client_socket, command)
+            try:
+                with self.open_transfer(client_socket, filename, 'download') as transfer, trace.phase('transfer'):
+                    if mode == 'sendfile':
+                        self.send_file_zero_copy(client_socket, filepath, filename, offset, length, tuner, transfer, trace)
+                    else:
+                        self.send_file_chunked(client_socket, filepath, filename, offset, length, compressor, tuner, transfer, trace)
+            except (ConnectionError, BrokenPipeError) as e:
+                logging.error("Соединение разорвано при отправке файла")
+                self.finish_trace(trace, tuner, compressor, 'error', error=str(e), mode=mode)
+                return
 
-                    if sent_total % (10 * 1024 * 1024) < self.chunk_size:
-                        percent = (sent_total / file_size) * 100
-                        logging.info(f"Отправка {filename}: {percent:.1f}% ({sent_total}/{file_size} байт)")
+            self.log_tuning(filename, tuner)
+            if compressor:
+                self.log_compression(filename, compressor)
+            self.finish_trace(trace, tuner, compressor, mode=mode)
 
-            logging.info(f"Файл {filename} отправлен клиенту ({file_size} байт)")
+            if length == file_size:
+                logging.info(f"Файл {filename} отправлен клиенту ({file_size} байт)")
+            else:
+                logging.info(f"Фрагмент файла {filename} отправлен клиенту ({offset}-{offset + length} из {file_size} байт)")
 
         except Exception as e:
             logging.error(f"Ошибка отправки файла: {e}", exc_info=True)
+            trace.finish('error', error=str(e))
             try:
                 self.send_response(client_socket, {'status': 'error', 'message': str(e)})
             except:
                 pass
 
+    def download_modes(self, client_socket):
+        if isinstance(client_socket, socket.socket) and not isinstance(client_socket, ssl.SSLSocket):
+            return ['chunked', 'sendfile']
+        return ['chunked']
+
+    def log_compression(self, filename, stats):
+        logging.info(f"Сжатие {filename} ({stats.algorithm}): {stats.raw_bytes} -> {stats.wire_bytes} байт, "
+                     f"коэффициент {stats.ratio():.2f}, затрачено {stats.seconds:.2f} с")
+
+    def sending_tuner(self, client_socket, command):
+        limit = command.get('max_chunk_size')
+        maximum = min(limit, self.chunk_size_max) if isinstance(limit, int) else self.chunk_size
+        return tuning.TransferTuner(client_socket, self.chunk_size, self.chunk_size_min, maximum, sending=True)
+
+    def receiving_tuner(self, client_socket):
+        return tuning.TransferTuner(client_socket, self.chunk_size, sending=False)
+
+    def log_tuning(self, filename, tuner):
+        report = tuner.report()
+        buffer_size = f"{report['buffer_size']} байт" if report['buffer_size'] else 'системный'
+        logging.info(f"Параметры передачи {filename}: чанк {report['chunk_size']} байт, буфер {buffer_size}, "
+                     f"RTT {report['rtt_ms']} мс, скорость {report['throughput'] / (1024 * 1024):.1f} МБ/с")
+
+    def open_trace(self, client_socket, kind, filename, **fields):
+        if not self.tracer:
+            return tracing.NULL_TRACE
+        connection = client_socket.mux.sock if isinstance(client_socket, multiplex.Stream) else client_socket
+        with self.lock:
+            address = self.clients.get(connection, {}).get('address')
+        return self.tracer.start('server', kind, filename,
+                                 address=f"{address[0]}:{address[1]}" if address else None,
+                                 tls=isinstance(connection, ssl.SSLSocket),
+                                 mux=isinstance(client_socket, multiplex.Stream), **fields)
+
+    def finish_trace(self, trace, tuner=None, codec_stats=None, result='ok', **fields):
+        trace.finish(result, tuning=tuner.report() if tuner else None,
+                     compression=codec_stats.report() if codec_stats else None, **fields)
+
+    def open_transfer(self, client_socket, filename, direction):
+        connection = client_socket.mux.sock if isinstance(client_socket, multiplex.Stream) else client_socket
+        with self.lock:
+            state = self.clients.get(connection, {})
+        return self.shaper.open(connection, state.get('token'), state.get('address'), filename, direction)
+
+    def send_file_chunked(self, client_socket, filepath, filename, offset, length, compressor, tuner, transfer, trace):
+        sent_total = 0
+        with self.metrics.disk(open(filepath, 'rb'), trace) as f, framing.borrow(framing.HEADER_SIZE + tuner.maximum) as buffer:
+            f.seek(offset)
+            view = memoryview(buffer)
+            trace.begin_chunks()
+            while sent_total < length:
+                n = f.readinto(view[framing.HEADER_SIZE:framing.HEADER_SIZE + min(tuner.chunk_size, length - sent_total)])
+                if not n:
+                    raise ConnectionError("Файл был усечён во время отправки")
+
+                started = time.perf_counter()
+                if compressor:
+                    compressor.send_chunk(client_socket, view, n)
+                else:
+                    framing.send_chunk(client_socket, view, n)
+                trace.chunk(n, started)
+
+                sent_total += n
+                tuner.update(n)
+                transfer.throttle(n)
+
+                if sent_total % (10 * 1024 * 1024) < n:
+                    percent = (sent_total / length) * 100
+                    logging.info(f"Отправка {filename}: {percent:.1f}% ({sent_total}/{length} байт)")
+
+    def send_file_zero_copy(self, client_socket, filepath, filename, offset, length, tuner, transfer, trace):
+        step = self.chunk_size_max if transfer.limited() else 10 * 1024 * 1024
+        sent_total = 0
+        with open(filepath, 'rb') as f:
+            trace.begin_chunks()
+            while sent_total < length:
+                count = min(step, length - sent_total)
+                started = time.perf_counter()
+                sent = client_socket.sendfile(f, offset + sent_total, count)
+                if sent == 0:
+                    raise ConnectionError("Файл был усечён во время отправки")
+                trace.chunk(sent, started, 'sendfile')
+                sent_total += sent
+                tuner.update(sent)
+                transfer.throttle(sent)
+
+                percent = (sent_total / length) * 100
+                logging.info(f"Отправка {filename}: {percent:.1f}% ({sent_total}/{length} байт)")
+
     def receive_file(self, client_socket, command):
+        upload = None
+        trace = tracing.NULL_TRACE
         try:
             filename = command['filename']
             if not self.is_safe_path(filename):
@@ -405,75 +1011,895 @@ class FileServer:
 
             filepath = self.upload_dir / filename
 
-            self.send_response(client_socket, {'status': 'ready'})
+            try:
+                upload = self.partial_store.open(filename, file_size, command.get('md5'), command.get('resume', False))
+            except BlockingIOError as e:
+                self.send_response(client_socket, {'status': 'error', 'message': str(e)})
+                return
 
-            received = 0
-            with open(filepath, 'wb') as f:
-                while received < file_size:
+            trace = self.open_trace(client_socket, 'upload', filename, offset=upload.received, length=file_size - upload.received)
+            codec = compression.negotiate(command.get('compression'))
+            decompressor = compression.ChunkDecompressor(codec['algorithm']) if codec else None
+            self.send_response(client_socket, {'status': 'ready', 'offset': upload.received, 'compression': codec})
+
+            tuner = self.receiving_tuner(client_socket)
+            md5_hash = self.metrics.hasher(upload.md5_hash, trace)
+            with self.metrics.disk(open(upload.part_path, 'r+b'), trace) as f, framing.borrow(framing.HEADER_SIZE + self.chunk_size_max) as buffer, \
+                    self.open_transfer(client_socket, filename, 'upload') as transfer, trace.phase('transfer'):
+                f.seek(upload.received)
+                view = memoryview(buffer)
+                trace.begin_chunks()
+                while upload.received < file_size:
                     try:
-                        chunk_size_data = self.receive_all(client_socket, 4)
-                        if not chunk_size_data or len(chunk_size_data) != 4:
-                            raise ConnectionError("Не удалось получить размер чанка")
+                        started = time.perf_counter()
+                        chunk = self.receive_chunk(client_socket, view, file_size - upload.received, decompressor)
+                        chunk_size = len(chunk)
+                        trace.chunk(chunk_size, started, 'recv')
 
-                        chunk_size = struct.unpack('>I', chunk_size_data)[0]
+                        f.write(chunk)
+                        md5_hash.update(chunk)
+                        upload.received += chunk_size
+                        tuner.update(chunk_size)
+                        transfer.throttle(chunk_size)
 
-                        if chunk_size > self.chunk_size:
-                            raise ValueError(f"Размер чанка {chunk_size} превышает максимально допустимый {self.chunk_size}")
+                        if upload.resumable and upload.received - upload.checkpointed >= self.partial_store.checkpoint_bytes:
+                            f.flush()
+                            os.fsync(f.fileno())
+                            upload.checkpoint()
 
-                        remaining = file_size - received
+                        if upload.received % (10 * 1024 * 1024) < chunk_size:
+                            percent = (upload.received / file_size) * 100
+                            logging.info(f"Прием {filename}: {percent:.1f}% ({upload.received}/{file_size} байт)")
 
-                        if chunk_size > remaining:
-                            raise ValueError(f"Размер чанка {chunk_size} превышает оставшийся размер файла {remaining}")
+                    except (ConnectionError, socket.timeout, struct.error, ValueError) as e:
+                        logging.error(f"Ошибка приема чанка: {e}")
+                        raise
 
-                        chunk = self.receive_all(client_socket, chunk_size)
-                        if not chunk or len(chunk) != chunk_size:
-                            raise ConnectionError(f"Не удалось получить чанк: ожидалось {chunk_size}, получено {len(chunk) if chunk else 0}")
+            md5 = md5_hash.hexdigest()
+            if upload.md5 and md5 != upload.md5:
+                self.partial_store.discard(upload)
+                self.send_response(client_socket, {
+                    'status': 'error',
+                    'message': 'Контрольная сумма загруженного файла не совпадает',
+                    'md5': md5
+                })
+                self.finish_trace(trace, tuner, decompressor, 'error', error='md5 mismatch')
+                return
 
-                        f.write(chunk)
-                        received += len(chunk)
+            os.replace(upload.part_path, filepath)
+            self.partial_store.discard(upload)
+            self.index_chunks(filepath, command.get('chunks'), file_size)
+            self.digest_cache.put(filepath, md5)
+            self.file_index.refresh(filepath)
 
-                        if received % (10 * 1024 * 1024) < self.chunk_size:
-                            percent = (received / file_size) * 100
-                            logging.info(f"Прием {filename}: {percent:.1f}% ({received}/{file_size} байт)")
+            self.send_response(client_socket, {
+                'status': 'success',
+                'message': 'Файл загружен',
+                'md5': md5
+            })
+            logging.info(f"Файл {filename} успешно загружен на сервер ({file_size} байт)")
+            self.log_tuning(filename, tuner)
+            if decompressor:
+                self.log_compression(filename, decompressor)
+            self.finish_trace(trace, tuner, decompressor)
 
-                    except (ConnectionError, socket.timeout, struct.error, ValueError) as e:
-                        logging.error(f"Ошибка приема чанка: {e}")
-                        raise
+        except Exception as e:
+            trace.finish('error', error=str(e))
+            if upload:
+                try:
+                    if upload.resumable:
+                        upload.checkpoint()
+                        logging.info(f"Частично загруженный файл {upload.filename} сохранён ({upload.received}/{upload.size} байт)")
+                    else:
+                        self.partial_store.discard(upload)
+                except:
+                    pass
+            logging.error(f"Ошибка приема файла: {e}", exc_info=True)
+            try:
+                self.send_response(client_socket, {'status': 'error', 'message': str(e)})
+            except:
+                pass
+        finally:
+            if upload:
+                self.partial_store.release(upload)
 
-            if received == file_size:
-                md5_hash = hashlib.md5()
-                with open(filepath, 'rb') as f:
-                    for chunk in iter(lambda: f.read(8192), b''):
-                        md5_hash.update(chunk)
+    def receive_chunk(self, client_socket, view, remaining, decompressor=None):
+        header = framing.recv_frame_header(client_socket, view)
+        if header is None:
+            raise ConnectionError("Не удалось получить размер чанка")
+        chunk_size, compressed = compression.split_header(header)
+
+        if chunk_size > self.chunk_size_max:
+            raise ValueError(f"Размер чанка {chunk_size} превышает максимально допустимый {self.chunk_size_max}")
+
+        if chunk_size > remaining and not compressed:
+            raise ValueError(f"Размер чанка {chunk_size} превышает оставшийся размер файла {remaining}")
+
+        if compressed and decompressor is None:
+            raise ValueError("Получен сжатый чанк без согласованного сжатия")
+
+        chunk = view[framing.HEADER_SIZE:framing.HEADER_SIZE + chunk_size]
+        chunk_received = framing.recv_into_exact(client_socket, chunk)
+        if chunk_received != chunk_size:
+            raise ConnectionError(f"Не удалось получить чанк: ожидалось {chunk_size}, получено {chunk_received}")
+
+        if compressed:
+            return memoryview(decompressor.decompress(chunk, min(self.chunk_size_max, remaining)))
+        if decompressor:
+            decompressor.account(chunk_size)
+        return chunk
+
+    def valid_manifest(self, chunks, file_size):
+        if not isinstance(chunks, list):
+            return False
+        total = 0
+        for chunk in chunks:
+            if (not isinstance(chunk, list) or len(chunk) != 2 or not isinstance(chunk[0], str)
+                    or len(chunk[0]) != 64 or not isinstance(chunk[1], int)
+                    or not 0 < chunk[1] <= chunking.MAX_SIZE):
+                return False
+            total += chunk[1]
+        return total == file_size
+
+    def index_chunks(self, filepath, chunks, file_size):
+        if self.valid_manifest(chunks, file_size):
+            self.chunk_store.add(filepath, chunks)
+        else:
+            self.chunk_store.forget(filepath)
+
+    def receive_file_dedup(self, client_socket, command):
+        part_path = None
+        trace = tracing.NULL_TRACE
+        try:
+            filename = command['filename']
+            if not self.is_safe_path(filename):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректное имя файла'})
+                return
+            file_size = int(command['size'])
+            chunks = command.get('chunks')
 
+            if file_size > self.max_file_size:
+                self.send_response(client_socket, {'status': 'error', 'message': 'Файл слишком большой'})
+                return
+            if not command.get('md5') or not self.valid_manifest(chunks, file_size):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректный список чанков'})
+                return
+
+            offsets = {}
+            position = 0
+            for index, (digest, length) in enumerate(chunks):
+                offsets.setdefault(digest, []).append((index, position))
+                position += length
+
+            trace = self.open_trace(client_socket, 'upload_dedup', filename, size=file_size, chunk_count=len(chunks))
+            part_path = self.partial_store.root / f'{uuid.uuid4().hex}.dedup'
+            refs = self.chunk_store.lookup(offsets)
+            missing = []
+            files = {}
+            started = time.time()
+            try:
+                with self.metrics.disk(open(part_path, 'wb'), trace) as f, trace.phase('assemble'):
+                    f.truncate(file_size)
+                    for digest, places in offsets.items():
+                        data = self.chunk_store.read(digest, refs.get(digest, []), files)
+                        if data is None:
+                            missing.append(places[0][0])
+                            continue
+                        for _, position in places:
+                            f.seek(position)
+                            f.write(data)
+            finally:
+                for handle in files.values():
+                    handle.close()
+            missing.sort()
+
+            codec = compression.negotiate(command.get('compression'))
+            decompressor = compression.ChunkDecompressor(codec['algorithm']) if codec else None
+            self.send_response(client_socket, {'status': 'ready', 'missing': missing, 'compression': codec})
+
+            with trace.phase('wait_ready'):
+                response = self.receive_response(client_socket)
+            if not response or response.get('status') != 'ready':
+                trace.finish('cancel')
+                return
+
+            missing_bytes = 0
+            tuner = self.receiving_tuner(client_socket)
+            with self.metrics.disk(open(part_path, 'r+b'), trace) as f, framing.borrow(framing.HEADER_SIZE + self.chunk_size_max) as buffer, \
+                    self.open_transfer(client_socket, filename, 'upload') as transfer, trace.phase('transfer'):
+                view = memoryview(buffer)
+                trace.begin_chunks()
+                for index in missing:
+                    digest, length = chunks[index]
+                    data = bytearray()
+                    while len(data) < length:
+                        chunk_started = time.perf_counter()
+                        chunk = self.receive_chunk(client_socket, view, length - len(data), decompressor)
+                        trace.chunk(len(chunk), chunk_started, 'recv')
+                        data += chunk
+                        tuner.update(len(chunk))
+                        transfer.throttle(len(chunk))
+                    if hashlib.sha256(data).hexdigest() != digest:
+                        raise ValueError(f"Контрольная сумма чанка {index} не совпадает")
+                    for _, position in offsets[digest]:
+                        f.seek(position)
+                        f.write(data)
+                    missing_bytes += length
+
+            md5_hash = self.metrics.hasher(hashlib.md5(), trace)
+            with self.metrics.disk(open(part_path, 'rb'), trace) as f, trace.phase('verify'):
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    md5_hash.update(block)
+            md5 = md5_hash.hexdigest()
+
+            if md5 != command['md5']:
                 self.send_response(client_socket, {
-                    'status': 'success',
-                    'message': 'Файл загружен',
-                    'md5': md5_hash.hexdigest()
+                    'status': 'error',
+                    'message': 'Контрольная сумма загруженного файла не совпадает',
+                    'md5': md5
                 })
-                logging.info(f"Файл {filename} успешно загружен на сервер ({file_size} байт)")
-            else:
-                if filepath.exists():
-                    os.remove(filepath)
+                self.finish_trace(trace, tuner, decompressor, 'error', error='md5 mismatch')
+                return
+
+            filepath = self.upload_dir / filename
+            os.replace(part_path, filepath)
+            self.chunk_store.add(filepath, chunks)
+            self.digest_cache.put(filepath, md5)
+            self.file_index.refresh(filepath)
+
+            saved = file_size - missing_bytes
+            self.send_response(client_socket, {
+                'status': 'success',
+                'message': 'Файл загружен',
+                'md5': md5,
+                'received_bytes': missing_bytes,
+                'saved_bytes': saved
+            })
+            logging.info(f"Файл {filename} загружен с дедупликацией ({file_size} байт): получено {missing_bytes} байт, "
+                         f"сэкономлено {saved} байт ({len(chunks) - len(missing)} из {len(chunks)} чанков), "
+                         f"{time.time() - started:.2f} с")
+            self.log_tuning(filename, tuner)
+            if decompressor:
+                self.log_compression(filename, decompressor)
+            self.finish_trace(trace, tuner, decompressor, missing=len(missing), saved_bytes=saved)
+
+        except Exception as e:
+            trace.finish('error', error=str(e))
+            logging.error(f"Ошибка приема файла: {e}", exc_info=True)
+            try:
+                self.send_response(client_socket, {'status': 'error', 'message': str(e)})
+            except:
+                pass
+        finally:
+            if part_path:
+                try:
+                    part_path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def send_signature(self, client_socket, command):
+        try:
+            filename = command['filename']
+            if not self.is_safe_path(filename):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректное имя файла'})
+                return
+            filepath = self.upload_dir / filename
+
+            if not filepath.is_file():
+                self.send_response(client_socket, {'status': 'error', 'message': 'Файл не найден'})
+                return
+
+            before = filepath.stat()
+            md5_hash = hashlib.md5()
+            with open(filepath, 'rb') as f, self.metrics.timer('hash'):
+                chunks = delta.signature(f, md5_hash)
+            md5 = md5_hash.hexdigest()
+
+            if self.digest_cache.signature(before) == self.digest_cache.signature(filepath.stat()):
+                self.digest_cache.put(filepath, md5, before)
+                self.chunk_store.add(filepath, chunks)
+
+            self.send_response(client_socket, {
+                'status': 'success',
+                'size': before.st_size,
+                'md5': md5,
+                'signature': chunks
+            })
+        except Exception as e:
+            self.send_response(client_socket, {'status': 'error', 'message': str(e)})
+
+    def receive_file_delta(self, client_socket, command):
+        part_path = None
+        trace = tracing.NULL_TRACE
+        try:
+            filename = command['filename']
+            if not self.is_safe_path(filename):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректное имя файла'})
+                return
+            file_size = int(command['size'])
+            ops = command.get('ops')
+            filepath = self.upload_dir / filename
+
+            if file_size > self.max_file_size:
+                self.send_response(client_socket, {'status': 'error', 'message': 'Файл слишком большой'})
+                return
+            if not filepath.is_file():
+                self.send_response(client_socket, {'status': 'error', 'message': 'Файл не найден'})
+                return
+            trace = self.open_trace(client_socket, 'upload_delta', filename, size=file_size)
+            with self.metrics.timer('hash'), trace.phase('digest'):
+                base_md5 = self.digest_cache.digest(filepath)
+            if base_md5 != command.get('base_md5'):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Файл на сервере изменился'})
+                return
+            if not command.get('md5') or not delta.valid_ops(ops, filepath.stat().st_size, file_size):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректный список операций'})
+                return
+
+            codec = compression.negotiate(command.get('compression'))
+            decompressor = compression.ChunkDecompressor(codec['algorithm']) if codec else None
+            self.send_response(client_socket, {'status': 'ready', 'compression': codec})
+
+            part_path = self.partial_store.root / f'{uuid.uuid4().hex}.delta'
+            received = 0
+            started = time.time()
+            md5_hash = self.metrics.hasher(hashlib.md5(), trace)
+            tuner = self.receiving_tuner(client_socket)
+            with self.metrics.disk(open(filepath, 'rb'), trace) as base, self.metrics.disk(open(part_path, 'wb'), trace) as f, \
+                    framing.borrow(framing.HEADER_SIZE + self.chunk_size_max) as buffer, \
+                    self.open_transfer(client_socket, filename, 'upload') as transfer, trace.phase('transfer'):
+                view = memoryview(buffer)
+                trace.begin_chunks()
+                for op in ops:
+                    if op[0] == 'copy':
+                        base.seek(op[1])
+                        remaining = op[2]
+                        while remaining:
+                            data = base.read(min(remaining, 1024 * 1024))
+                            if not data:
+                                raise ValueError("Файл на сервере был усечён во время загрузки")
+                            f.write(data)
+                            md5_hash.update(data)
+                            remaining -= len(data)
+                    else:
+                        remaining = op[1]
+                        while remaining:
+                            chunk_started = time.perf_counter()
+                            chunk = self.receive_chunk(client_socket, view, remaining, decompressor)
+                            trace.chunk(len(chunk), chunk_started, 'recv')
+                            f.write(chunk)
+                            md5_hash.update(chunk)
+                            remaining -= len(chunk)
+                            received += len(chunk)
+                            tuner.update(len(chunk))
+                            transfer.throttle(len(chunk))
+            md5 = md5_hash.hexdigest()
+
+            if md5 != command['md5']:
                 self.send_response(client_socket, {
                     'status': 'error',
-                    'message': f'Неполная загрузка файла: получено {received} из {file_size} байт'
+                    'message': 'Контрольная сумма загруженного файла не совпадает',
+                    'md5': md5
                 })
+                self.finish_trace(trace, tuner, decompressor, 'error', error='md5 mismatch')
+                return
+
+            os.replace(part_path, filepath)
+            self.chunk_store.forget(filepath)
+            self.digest_cache.put(filepath, md5)
+            self.file_index.refresh(filepath)
+
+            self.send_response(client_socket, {
+                'status': 'success',
+                'message': 'Файл загружен',
+                'md5': md5,
+                'received_bytes': received,
+                'saved_bytes': file_size - received
+            })
+            logging.info(f"Файл {filename} обновлён по дельте ({file_size} байт): получено {received} байт, "
+                         f"{time.time() - started:.2f} с")
+            self.log_tuning(filename, tuner)
+            if decompressor:
+                self.log_compression(filename, decompressor)
+            self.finish_trace(trace, tuner, decompressor, saved_bytes=file_size - received)
 
         except Exception as e:
+            trace.finish('error', error=str(e))
+            logging.error(f"Ошибка приема файла: {e}", exc_info=True)
+            try:
+                self.send_response(client_socket, {'status': 'error', 'message': str(e)})
+            except:
+                pass
+        finally:
+            if part_path:
+                try:
+                    part_path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def send_file_delta(self, client_socket, command):
+        trace = tracing.NULL_TRACE
+        try:
             filename = command['filename']
+            if not self.is_safe_path(filename):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректное имя файла'})
+                return
             filepath = self.upload_dir / filename
-            if 'filepath' in locals() and filepath.exists():
+
+            if not filepath.is_file():
+                self.send_response(client_socket, {'status': 'error', 'message': 'Файл не найден'})
+                return
+            if not delta.valid_signature(command.get('signature')):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректная сигнатура'})
+                return
+
+            trace = self.open_trace(client_socket, 'download_delta', filename)
+            md5_hash = hashlib.md5()
+            with open(filepath, 'rb') as f, self.metrics.timer('hash'), trace.phase('delta'):
+                ops = delta.delta(f, command['signature'], md5_hash)
+            file_size = sum(op[-1] for op in ops)
+            literal = delta.literal_bytes(ops)
+
+            codec = compression.negotiate(command.get('compression'))
+            compressor = compression.ChunkCompressor(codec['algorithm'], codec['level']) if codec else None
+            self.send_response(client_socket, {
+                'status': 'ready',
+                'size': file_size,
+                'md5': md5_hash.hexdigest(),
+                'ops': ops,
+                'compression': codec
+            })
+
+            tuner = self.sending_tuner(client_socket, command)
+            with self.metrics.disk(open(filepath, 'rb'), trace) as f, framing.borrow(framing.HEADER_SIZE + tuner.maximum) as buffer, \
+                    self.open_transfer(client_socket, filename, 'download') as transfer, trace.phase('transfer'):
+                view = memoryview(buffer)
+                trace.begin_chunks()
+                for offset, length in delta.literals(ops):
+                    f.seek(offset)
+                    while length:
+                        n = f.readinto(view[framing.HEADER_SIZE:framing.HEADER_SIZE + min(tuner.chunk_size, length)])
+                        if not n:
+                            raise ConnectionError("Файл был усечён во время отправки")
+                        started = time.perf_counter()
+                        if compressor:
+                            compressor.send_chunk(client_socket, view, n)
+                        else:
+                            framing.send_chunk(client_socket, view, n)
+                        trace.chunk(n, started)
+                        length -= n
+                        tuner.update(n)
+                        transfer.throttle(n)
+
+            logging.info(f"Файл {filename} отправлен по дельте ({file_size} байт): передано {literal} байт")
+            self.log_tuning(filename, tuner)
+            if compressor:
+                self.log_compression(filename, compressor)
+            self.finish_trace(trace, tuner, compressor, size=file_size, saved_bytes=file_size - literal)
+        except (ConnectionError, BrokenPipeError, socket.timeout):
+            trace.finish('error', error='connection lost')
+            logging.error("Соединение разорвано при отправке файла")
+        except Exception as e:
+            trace.finish('error', error=str(e))
+            self.send_response(client_socket, {'status': 'error', 'message': str(e)})
+
+    def receive_many(self, client_socket, command):
+        trace = tracing.NULL_TRACE
+        try:
+            count = command.get('count')
+            if count is not None and (not isinstance(count, int) or count < 0):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректное число файлов'})
+                return
+
+            label = f"{count} файлов" if count is not None else 'дерево файлов'
+            trace = self.open_trace(client_socket, 'upload_many', label, count=count)
+            codec = compression.negotiate(command.get('compression'))
+            decompressor = compression.ChunkDecompressor(codec['algorithm']) if codec else None
+            self.send_response(client_socket, {'status': 'ready', 'compression': codec})
+
+            results = []
+            completed = []
+            started = time.time()
+            tuner = self.receiving_tuner(client_socket)
+            try:
+                with framing.borrow(framing.HEADER_SIZE + self.chunk_size_max) as buffer, \
+                        self.open_transfer(client_socket, label, 'upload') as transfer, trace.phase('transfer'):
+                    view = memoryview(buffer)
+                    trace.begin_chunks()
+                    while count is None or len(results) < count:
+                        header = self.receive_response(client_socket)
+                        if not header:
+                            raise ConnectionError("Соединение разорвано во время пакетной загрузки")
+                        if count is None and header.get('end'):
+                            break
+                        if header.get('type') == 'dir':
+                            results.append(self.create_batch_dir(header))
+                        else:
+                            results.append(self.receive_batch_file(client_socket, header, view, decompressor, tuner,
+                                                                   transfer, trace, completed))
+            finally:
+                self.chunk_store.forget_many(filepath for filepath, _, _ in completed)
+                self.digest_cache.put_many(completed)
+
+            received = sum(1 for result in results if result['status'] == 'success')
+            self.send_response(client_socket, {
+                'status': 'success',
+                'message': f'Загружено файлов: {received} из {len(results)}',
+                'results': results
+            })
+            logging.info(f"Пакетная загрузка: принято {received} из {len(results)} файлов ({transfer.bytes} байт), "
+                         f"{time.time() - started:.2f} с")
+            self.log_tuning(label, tuner)
+            if decompressor:
+                self.log_compression(label, decompressor)
+            self.finish_trace(trace, tuner, decompressor, failed=len(results) - received)
+
+        except Exception as e:
+            trace.finish('error', error=str(e))
+            logging.error(f"Ошибка пакетной загрузки: {e}", exc_info=True)
+            try:
+                self.send_response(client_socket, {'status': 'error', 'message': str(e)})
+            except:
+                pass
+
+    def create_batch_dir(self, header):
+        filename = header.get('filename')
+        if not isinstance(filename, str) or not self.is_safe_path(filename):
+            return {'filename': filename, 'status': 'error', 'message': 'Некорректное имя папки'}
+        dirpath = self.upload_dir / filename
+        try:
+            dirpath.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            return {'filename': filename, 'status': 'error', 'message': str(e)}
+        self.file_index.refresh(dirpath)
+        return {'filename': filename, 'status': 'success'}
+
+    def receive_batch_file(self, client_socket, header, view, decompressor, tuner, transfer, trace, completed):
+        filename = header.get('filename')
+        file_size = header.get('size')
+        if not isinstance(file_size, int) or file_size < 0:
+            raise ValueError("Некорректный заголовок файла в пакете")
+
+        error = None
+        if not isinstance(filename, str) or not self.is_safe_path(filename):
+            error = 'Некорректное имя файла'
+        elif file_size > self.max_file_size:
+            error = 'Файл слишком большой'
+
+        part_path = None if error else self.partial_store.root / f'{uuid.uuid4().hex}.batch'
+        md5_hash = self.metrics.hasher(hashlib.md5(), trace)
+        try:
+            with self.metrics.disk(open(part_path or os.devnull, 'wb'), trace) as f:
+                received = 0
+                while received < file_size:
+                    started = time.perf_counter()
+                    chunk = self.receive_chunk(client_socket, view, file_size - received, decompressor)
+                    trace.chunk(len(chunk), started, 'recv')
+                    f.write(chunk)
+                    if not error:
+                        md5_hash.update(chunk)
+                    received += len(chunk)
+                    tuner.update(len(chunk))
+                    transfer.throttle(len(chunk))
+
+            trailer = self.receive_response(client_socket)
+            if not trailer:
+                raise ConnectionError("Соединение разорвано во время пакетной загрузки")
+            md5 = md5_hash.hexdigest()
+            error = error or trailer.get('error')
+            if not error and trailer.get('md5') != md5:
+                error = 'Контрольная сумма загруженного файла не совпадает'
+            if error:
+                return {'filename': filename, 'status': 'error', 'message': error}
+
+            filepath = self.upload_dir / filename
+            mtime = header.get('mtime')
+            try:
+                if isinstance(mtime, (int, float)):
+                    os.utime(part_path, (mtime, mtime))
+                filepath.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(part_path, filepath)
+            except OSError as e:
+                return {'filename': filename, 'status': 'error', 'message': str(e)}
+            part_path = None
+            completed.append((filepath, md5, os.stat(filepath)))
+            self.file_index.refresh(filepath)
+            return {'filename': filename, 'status': 'success', 'md5': md5}
+        finally:
+            if part_path:
                 try:
-                    os.remove(filepath)
-                except:
+                    part_path.unlink()
+                except FileNotFoundError:
                     pass
-            logging.error(f"Ошибка приема файла: {e}", exc_info=True)
+
+    def send_many(self, client_socket, command):
+        trace = tracing.NULL_TRACE
+        try:
+            filenames = command.get('filenames')
+            if not isinstance(filenames, list) or not all(isinstance(filename, str) for filename in filenames):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректный список файлов'})
+                return
+
+            label = f"{len(filenames)} файлов"
+            trace = self.open_trace(client_socket, 'download_many', label, count=len(filenames))
+            codec = compression.negotiate(command.get('compression'))
+            compressor = compression.ChunkCompressor(codec['algorithm'], codec['level']) if codec else None
+            self.send_response(client_socket, {'status': 'ready', 'count': len(filenames), 'compression': codec})
+
+            sent = 0
+            started = time.time()
+            tuner = self.sending_tuner(client_socket, command)
+            with framing.borrow(framing.HEADER_SIZE + tuner.maximum) as buffer, \
+                    self.open_transfer(client_socket, label, 'download') as transfer, trace.phase('transfer'):
+                view = memoryview(buffer)
+                trace.begin_chunks()
+                for filename in filenames:
+                    if self.send_batch_file(client_socket, filename, view, compressor, tuner, transfer, trace):
+                        sent += 1
+
+            self.send_response(client_socket, {
+                'status': 'success',
+                'message': f'Отправлено файлов: {sent} из {len(filenames)}'
+            })
+            logging.info(f"Пакетное скачивание: отправлено {sent} из {len(filenames)} файлов ({transfer.bytes} байт), "
+                         f"{time.time() - started:.2f} с")
+            self.log_tuning(label, tuner)
+            if compressor:
+                self.log_compression(label, compressor)
+            self.finish_trace(trace, tuner, compressor, failed=len(filenames) - sent)
+        except (ConnectionError, BrokenPipeError, socket.timeout):
+            trace.finish('error', error='connection lost')
+            logging.error("Соединение разорвано при пакетной отправке файлов")
+        except Exception as e:
+            trace.finish('error', error=str(e))
+            self.send_response(client_socket, {'status': 'error', 'message': str(e)})
+
+    def send_batch_file(self, client_socket, filename, view, compressor, tuner, transfer, trace,
+                        name=None, st=None, data=None):
+        name = name or filename
+        filepath = self.upload_dir / filename
+        if data is not None:
+            f = self.metrics.disk(io.BytesIO(data), trace)
+        elif not self.is_safe_path(filename) or not filepath.is_file():
+            framing.send_message(client_socket, {'filename': name, 'status': 'error', 'message': 'Файл не найден'})
+            return False
+        else:
+            try:
+                f = self.metrics.disk(open(filepath, 'rb'), trace)
+            except OSError as e:
+                framing.send_message(client_socket, {'filename': name, 'status': 'error', 'message': str(e)})
+                return False
+
+        error = None
+        md5_hash = self.metrics.hasher(hashlib.md5(), trace)
+        with f:
+            if data is None:
+                st = os.fstat(f.fileno())
+            file_size = st.st_size if data is None else len(data)
+            framing.send_message(client_socket, {
+                'filename': name,
+                'status': 'success',
+                'size': file_size,
+                'mtime': st.st_mtime
+            })
+            remaining = file_size
+            while remaining:
+                payload = view[framing.HEADER_SIZE:framing.HEADER_SIZE + min(tuner.chunk_size, remaining)]
+                n = f.readinto(payload)
+                if not n:
+                    n = len(payload)
+                    payload[:] = bytes(n)
+                    error = 'Файл был усечён во время отправки'
+                elif not error:
+                    md5_hash.update(payload[:n])
+                started = time.perf_counter()
+                if compressor:
+                    compressor.send_chunk(client_socket, view, n)
+                else:
+                    framing.send_chunk(client_socket, view, n)
+                trace.chunk(n, started)
+                remaining -= n
+                tuner.update(n)
+                transfer.throttle(n)
+
+        md5 = md5_hash.hexdigest()
+        framing.send_message(client_socket, {'error': error} if error else {'md5': md5})
+        return not error
+
+    def send_tree(self, client_socket, command):
+        trace = tracing.NULL_TRACE
+        try:
+            path = command.get('path') or ''
+            if not isinstance(path, str) or not self.is_safe_path(path) or not (self.upload_dir / path).is_dir():
+                self.send_response(client_socket, {'status': 'error', 'message': 'Папка не найдена'})
+                return
+
+            label = path or '/'
+            trace = self.open_trace(client_socket, 'download_tree', label)
+            codec = compression.negotiate(command.get('compression'))
+            compressor = compression.ChunkCompressor(codec['algorithm'], codec['level']) if codec else None
+            self.send_response(client_socket, {'status': 'ready', 'compression': codec})
+
+            sent = 0
+            total = 0
+            started = time.time()
+            tuner = self.sending_tuner(client_socket, command)
+            with framing.borrow(framing.HEADER_SIZE + tuner.maximum) as buffer, \
+                    self.open_transfer(client_socket, label, 'download') as transfer, trace.phase('transfer'):
+                view = memoryview(buffer)
+                trace.begin_chunks()
+                for name, st, data in tree.pipeline(self.upload_dir / path, INTERNAL_PREFIX):
+                    if st is None:
+                        framing.send_message(client_socket, {'filename': name, 'status': 'success', 'type': 'dir'})
+                        continue
+                    total += 1
+                    filename = f'{path}/{name}' if path else name
+                    if self.send_batch_file(client_socket, filename, view, compressor, tuner, transfer, trace,
+                                            name, st, data):
+                        sent += 1
+
+            self.send_response(client_socket, {
+                'status': 'success',
+                'message': f'Отправлено файлов: {sent} из {total}',
+                'count': total
+            })
+            logging.info(f"Скачивание папки {label}: отправлено {sent} из {total} файлов ({transfer.bytes} байт), "
+                         f"{time.time() - started:.2f} с")
+            self.log_tuning(label, tuner)
+            if compressor:
+                self.log_compression(label, compressor)
+            self.finish_trace(trace, tuner, compressor, failed=total - sent)
+        except (ConnectionError, BrokenPipeError, socket.timeout):
+            trace.finish('error', error='connection lost')
+            logging.error("Соединение разорвано при отправке папки")
+        except Exception as e:
+            trace.finish('error', error=str(e))
+            self.send_response(client_socket, {'status': 'error', 'message': str(e)})
+
+    def begin_striped_upload(self, client_socket, command):
+        try:
+            filename = command['filename']
+            if not self.is_safe_path(filename):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректное имя файла'})
+                return
+            file_size = int(command['size'])
+            md5 = command.get('md5')
+
+            if file_size > self.max_file_size:
+                self.send_response(client_socket, {'status': 'error', 'message': 'Файл слишком большой'})
+                return
+            if not md5:
+                self.send_response(client_socket, {'status': 'error', 'message': 'Для параллельной загрузки требуется контрольная сумма'})
+                return
+
+            upload = self.partial_store.get_striped(command.get('transfer_id'))
+            if upload and (upload.filename, upload.size, upload.md5) == (filename, file_size, md5):
+                ranges = upload.received_ranges()
+                self.send_response(client_socket, {'status': 'success', 'transfer_id': upload.transfer_id, 'ranges': ranges})
+                logging.info(f"Возобновлена параллельная загрузка {filename} "
+                             f"({sum(length for _, length in ranges)}/{file_size} байт)")
+                return
+
+            upload = self.partial_store.begin_striped(filename, file_size, md5)
+            upload.chunks = command.get('chunks')
+            self.send_response(client_socket, {'status': 'success', 'transfer_id': upload.transfer_id})
+            logging.info(f"Начата параллельная загрузка {filename} ({file_size} байт)")
+        except Exception as e:
+            self.send_response(client_socket, {'status': 'error', 'message': str(e)})
+
+    def receive_stripe(self, client_socket, command):
+        trace = tracing.NULL_TRACE
+        try:
+            upload = self.partial_store.get_striped(command.get('transfer_id'))
+            if upload is None:
+                self.send_response(client_socket, {'status': 'error', 'message': 'Передача не найдена'})
+                return
+
+            offset = command.get('offset')
+            length = command.get('length')
+            if (not isinstance(offset, int) or not isinstance(length, int)
+                    or offset < 0 or length < 0 or offset + length > upload.size):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректный диапазон'})
+                return
+
+            trace = self.open_trace(client_socket, 'stripe_upload', upload.filename, offset=offset, length=length)
+            codec = compression.negotiate(command.get('compression'))
+            decompressor = compression.ChunkDecompressor(codec['algorithm']) if codec else None
+            self.send_response(client_socket, {'status': 'ready', 'compression': codec})
+
+            received = 0
+            tuner = self.receiving_tuner(client_socket)
+            upload.start_range()
+            try:
+                with self.metrics.disk(open(upload.path, 'r+b'), trace) as f, framing.borrow(framing.HEADER_SIZE + self.chunk_size_max) as buffer, \
+                        self.open_transfer(client_socket, upload.filename, 'upload') as transfer, trace.phase('transfer'):
+                    f.seek(offset)
+                    view = memoryview(buffer)
+                    trace.begin_chunks()
+                    while received < length:
+                        started = time.perf_counter()
+                        chunk = self.receive_chunk(client_socket, view, length - received, decompressor)
+                        trace.chunk(len(chunk), started, 'recv')
+                        f.write(chunk)
+                        received += len(chunk)
+                        tuner.update(len(chunk))
+                        transfer.throttle(len(chunk))
+            finally:
+                upload.end_range()
+                if 0 < received < length:
+                    upload.add_range(offset, received)
+
+            upload.add_range(offset, length)
+            self.send_response(client_socket, {'status': 'success', 'received': received})
+            logging.info(f"Получен фрагмент {upload.filename} ({offset}-{offset + length} из {upload.size} байт)")
+            self.log_tuning(upload.filename, tuner)
+            if decompressor:
+                self.log_compression(upload.filename, decompressor)
+            self.finish_trace(trace, tuner, decompressor)
+
+        except Exception as e:
+            trace.finish('error', error=str(e))
+            logging.error(f"Ошибка приема фрагмента: {e}", exc_info=True)
             try:
                 self.send_response(client_socket, {'status': 'error', 'message': str(e)})
             except:
                 pass
 
+    def commit_striped_upload(self, client_socket, command):
+        upload = self.partial_store.get_striped(command.get('transfer_id'))
+        if upload is None:
+            self.send_response(client_socket, {'status': 'error', 'message': 'Передача не найдена'})
+            return
+
+        try:
+            if not upload.is_complete():
+                self.partial_store.finish_striped(upload)
+                self.send_response(client_socket, {'status': 'error', 'message': 'Получены не все фрагменты файла'})
+                return
+
+            md5_hash = self.metrics.hasher(hashlib.md5())
+            with self.metrics.disk(open(upload.path, 'rb')) as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    md5_hash.update(chunk)
+            md5 = md5_hash.hexdigest()
+
+            if md5 != upload.md5:
+                self.partial_store.finish_striped(upload)
+                self.send_response(client_socket, {
+                    'status': 'error',
+                    'message': 'Контрольная сумма загруженного файла не совпадает',
+                    'md5': md5
+                })
+                return
+
+            filepath = self.upload_dir / upload.filename
+            os.replace(upload.path, filepath)
+            self.partial_store.finish_striped(upload)
+            self.index_chunks(filepath, upload.chunks, upload.size)
+            self.digest_cache.put(filepath, md5)
+            self.file_index.refresh(filepath)
+
+            self.send_response(client_socket, {
+                'status': 'success',
+                'message': 'Файл загружен',
+                'md5': md5
+            })
+            logging.info(f"Файл {upload.filename} успешно загружен на сервер параллельно ({upload.size} байт)")
+        except Exception as e:
+            self.partial_store.finish_striped(upload)
+            logging.error(f"Ошибка завершения параллельной загрузки: {e}", exc_info=True)
+            self.send_response(client_socket, {'status': 'error', 'message': str(e)})
+
+    def abort_striped_upload(self, client_socket, command):
+        upload = self.partial_store.get_striped(command.get('transfer_id'))
+        if upload is None:
+            self.send_response(client_socket, {'status': 'error', 'message': 'Передача не найдена'})
+            return
+
+        self.partial_store.finish_striped(upload)
+        self.send_response(client_socket, {'status': 'success'})
+        logging.info(f"Параллельная загрузка {upload.filename} отменена клиентом")
+
     def delete_file(self, client_socket, command):
         if not self.can_clients_delete_files:
             self.send_response(client_socket, {'status': 'error', 'message': 'Недостаточно прав'})
@@ -486,8 +1912,20 @@ class FileServer:
                 return
             filepath = self.upload_dir / filename
 
-            if filepath.exists():
+            if filepath.is_dir() and filepath.resolve() != self.upload_dir.resolve():
+                try:
+                    filepath.rmdir()
+                except OSError:
+                    self.send_response(client_socket, {'status': 'error', 'message': 'Папка не пуста'})
+                    return
+                self.file_index.refresh(filepath)
+                self.send_response(client_socket, {'status': 'success', 'message': 'Папка удалена'})
+                logging.info(f"Папка {filename} удалена с сервера")
+            elif filepath.exists():
                 filepath.unlink()
+                self.chunk_store.forget(filepath)
+                self.digest_cache.invalidate(filepath)
+                self.file_index.refresh(filepath)
                 self.send_response(client_socket, {'status': 'success', 'message': 'Файл удален'})
                 logging.info(f"Файл {filename} удалён с сервера")
             else:
@@ -497,55 +1935,64 @@ class FileServer:
 
     def send_server_info(self, client_socket):
         try:
-            total_size = 0
-            total_files = 0
-            for f in self.upload_dir.iterdir():
-                if f.is_file():
-                    total_files += 1
-                    total_size += f.stat().st_size
+            total_files, total_size = self.file_index.totals()
+
+            shaping = self.shaper.report()
 
             info = {
                 'status': 'success',
                 'info': {
                     'upload_dir': str(self.upload_dir.absolute()),
                     'total_files': total_files,
-                    'total_size': total_size
+                    'total_size': total_size,
+                    'active_transfers': len(shaping['transfers']),
+                    'total_rate': shaping['total_rate'],
+                    'admission': self.admission.report()
                 }
             }
             self.send_response(client_socket, info)
         except Exception as e:
             self.send_response(client_socket, {'status': 'error', 'message': str(e)})
 
-    def receive_all(self, sock, length):
-        data = b''
-        while len(data) < length:
-            chunk = sock.recv(min(4096, length - len(data)))
-            if not chunk:
-                break
-            data += chunk
-        return data
+    def collect_stats(self):
+        return self.metrics.snapshot(self.shaper.report(), self.admission.report())
 
-    def receive_response(self, sock):
-        try:
-            length_data = self.receive_all(sock, 4)
-            if not length_data or len(length_data) != 4:
-                return None
+    def handle_admin(self, client_socket, address, command):
+        if not self.admin_token:
+            self.send_response(client_socket, {'status': 'error', 'message': 'Администрирование отключено'})
+            return
+        if not self.token_matches(command.get('token'), self.admin_token):
+            logging.warning(f"Неверный токен администратора от {address}")
+            self.send_response(client_socket, {'status': 'error', 'message': 'Неверный токен администратора'})
+            return
 
-            data_length = struct.unpack('>I', length_data)[0]
-            json_data = self.receive_all(sock, data_length)
+        action = command.get('action')
+        if action == 'transfers':
+            self.send_response(client_socket, {'status': 'success', **self.shaper.report(),
+                                               'admission': self.admission.report()})
+        elif action == 'set_limits':
+            limits = command.get('limits')
+            if not valid_limits(limits):
+                self.send_response(client_socket, {'status': 'error', 'message': 'Некорректные ограничения скорости'})
+                return
+            self.shaper.configure(limits)
+            logging.info(f"Ограничения скорости изменены клиентом {address}: {self.shaper.limits}")
+            self.send_response(client_socket, {'status': 'success', 'limits': self.shaper.limits})
+        else:
+            self.send_response(client_socket, {'status': 'error', 'message': 'Неизвестное действие'})
 
-            if not json_data:
-                return None
+    def receive_all(self, sock, length):
+        return framing.recv_exact(sock, length)
 
-            return json.loads(json_data.decode('utf-8'))
+    def receive_response(self, sock):
+        try:
+            return framing.recv_message(sock)
         except:
             return None
 
     def send_response(self, sock, data):
         try:
-            json_data = json.dumps(data).encode('utf-8')
-            sock.sendall(len(json_data).to_bytes(4, 'big'))
-            sock.sendall(json_data)
+            framing.send_message(sock, data)
         except:
             pass
 
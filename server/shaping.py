@@ -0,0 +1,187 @@
+import threading
+import time
+
+LIMIT_KEYS = ('global', 'per_connection', 'per_token')
+BURST_SECONDS = 0.1
+MIN_BURST = 64 * 1024
+RATE_WINDOW = 0.5
+REBALANCE_INTERVAL = 0.5
+
+
+def valid_limits(limits):
+    if not isinstance(limits, dict):
+        return False
+    for key, value in limits.items():
+        if key not in LIMIT_KEYS or isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            return False
+    return True
+
+
+class TokenBucket:
+    def __init__(self, rate=0):
+        self.lock = threading.Lock()
+        self.rate = 0
+        self.capacity = MIN_BURST
+        self.tokens = MIN_BURST
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.refill()
+            self.rate = rate or 0
+            self.capacity = max(self.rate * BURST_SECONDS, MIN_BURST)
+            self.tokens = min(self.tokens, self.capacity)
+
+    def refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, nbytes):
+        with self.lock:
+            if not self.rate:
+                return 0
+            self.refill()
+            self.tokens -= nbytes
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+
+class Transfer:
+    def __init__(self, shaper, transfer_id, address, filename, direction, buckets):
+        self.shaper = shaper
+        self.transfer_id = transfer_id
+        self.address = address
+        self.filename = filename
+        self.direction = direction
+        self.buckets = buckets
+        self.bucket = TokenBucket()
+        self.bytes = 0
+        self.rate = 0.0
+        self.started = self.window_started = time.monotonic()
+        self.window_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shaper.close(self)
+
+    def limited(self):
+        return any(bucket.rate for bucket in self.buckets + [self.bucket])
+
+    def throttle(self, nbytes):
+        self.bytes += nbytes
+        self.window_bytes += nbytes
+        now = time.monotonic()
+        if now - self.window_started >= RATE_WINDOW:
+            self.rate = self.window_bytes / (now - self.window_started)
+            self.window_bytes = 0
+            self.window_started = now
+
+        delay = max(bucket.reserve(nbytes) for bucket in self.buckets + [self.bucket])
+        if delay > 0:
+            time.sleep(delay)
+        self.shaper.maybe_rebalance()
+
+    def report(self):
+        return {
+            'id': self.transfer_id,
+            'address': f"{self.address[0]}:{self.address[1]}" if self.address else None,
+            'filename': self.filename,
+            'direction': self.direction,
+            'bytes': self.bytes,
+            'seconds': round(time.monotonic() - self.started, 2),
+            'rate': round(self.rate),
+            'share': round(self.bucket.rate) or None
+        }
+
+
+class Shaper:
+    def __init__(self, limits=None):
+        self.lock = threading.Lock()
+        self.limits = {key: 0 for key in LIMIT_KEYS}
+        self.global_bucket = TokenBucket()
+        self.connection_buckets = {}
+        self.token_buckets = {}
+        self.transfers = {}
+        self.closed_bytes = {'upload': 0, 'download': 0}
+        self.next_id = 1
+        self.rebalanced = 0
+        if limits:
+            self.configure(limits)
+
+    def configure(self, limits):
+        with self.lock:
+            self.limits.update(limits)
+            self.global_bucket.set_rate(self.limits['global'])
+            for bucket in self.connection_buckets.values():
+                bucket.set_rate(self.limits['per_connection'])
+            for bucket in self.token_buckets.values():
+                bucket.set_rate(self.limits['per_token'])
+        self.rebalance()
+
+    def open(self, connection, token, address, filename, direction):
+        with self.lock:
+            buckets = [self.global_bucket]
+            bucket = self.connection_buckets.get(connection)
+            if bucket is None:
+                bucket = self.connection_buckets[connection] = TokenBucket(self.limits['per_connection'])
+            buckets.append(bucket)
+            if token:
+                bucket = self.token_buckets.get(token)
+                if bucket is None:
+                    bucket = self.token_buckets[token] = TokenBucket(self.limits['per_token'])
+                buckets.append(bucket)
+
+            transfer = Transfer(self, self.next_id, address, filename, direction, buckets)
+            self.transfers[transfer.transfer_id] = transfer
+            self.next_id += 1
+        self.rebalance()
+        return transfer
+
+    def close(self, transfer):
+        with self.lock:
+            if self.transfers.pop(transfer.transfer_id, None) is not None:
+                self.closed_bytes[transfer.direction] += transfer.bytes
+        self.rebalance()
+
+    def forget_connection(self, connection):
+        with self.lock:
+            self.connection_buckets.pop(connection, None)
+
+    def maybe_rebalance(self):
+        if time.monotonic() - self.rebalanced >= REBALANCE_INTERVAL:
+            self.rebalance()
+
+    def rebalance(self):
+        with self.lock:
+            self.rebalanced = time.monotonic()
+            rate = self.limits['global']
+            transfers = sorted(self.transfers.values(), key=lambda transfer: transfer.rate)
+
+        remaining = rate
+        for index, transfer in enumerate(transfers):
+            if not rate:
+                transfer.bucket.set_rate(0)
+                continue
+            share = remaining / (len(transfers) - index)
+            if transfer.rate and transfer.rate < share * 0.8:
+                share = transfer.rate * 1.25
+            transfer.bucket.set_rate(share)
+            remaining -= share
+
+    def report(self):
+        with self.lock:
+            transfers = [transfer.report() for transfer in self.transfers.values()]
+            limits = dict(self.limits)
+            totals = dict(self.closed_bytes)
+        for transfer in transfers:
+            totals[transfer['direction']] += transfer['bytes']
+        return {
+            'limits': limits,
+            'transfers': transfers,
+            'total_rate': sum(transfer['rate'] for transfer in transfers),
+            'bytes': totals
+        }
@@ -0,0 +1,57 @@
+import hashlib
+import random
+import zlib
+
+MIN_SIZE = 16 * 1024
+MAX_SIZE = 256 * 1024
+WINDOW = 32
+CUT_MASK = 0x3FF
+READ_SIZE = 4 * 1024 * 1024
+
+_rng = random.Random(0x51A4F3)
+ANCHORS = set(_rng.sample(range(256), 8)) | {ord('\n')}
+ANCHOR_TABLE = bytes(1 if b in ANCHORS else 0 for b in range(256))
+
+
+def find_boundary(data, anchors, start, end):
+    i = start + MIN_SIZE - 1
+    while True:
+        i = anchors.find(1, i + 1, end)
+        if i < 0:
+            return end
+        if not zlib.crc32(data[i - WINDOW:i + 1]) & CUT_MASK:
+            return i + 1
+
+
+def iter_chunks(f):
+    buffer = b''
+    offset = 0
+    eof = False
+    while True:
+        if not eof:
+            block = f.read(READ_SIZE)
+            if block:
+                buffer += block
+            else:
+                eof = True
+
+        anchors = buffer.translate(ANCHOR_TABLE)
+        pos = 0
+        while len(buffer) - pos >= MAX_SIZE or (eof and pos < len(buffer)):
+            boundary = find_boundary(buffer, anchors, pos, min(pos + MAX_SIZE, len(buffer)))
+            yield offset, memoryview(buffer)[pos:boundary]
+            offset += boundary - pos
+            pos = boundary
+
+        if eof:
+            return
+        buffer = buffer[pos:]
+
+
+def manifest(f, md5_hash=None):
+    chunks = []
+    for _, data in iter_chunks(f):
+        if md5_hash:
+            md5_hash.update(data)
+        chunks.append([hashlib.sha256(data).hexdigest(), len(data)])
+    return chunks
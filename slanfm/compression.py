@@ -0,0 +1,112 @@
+import lzma
+import time
+import zlib
+
+from slanfm import framing
+
+ALGORITHMS = ['zlib', 'lzma']
+COMPRESSED_FLAG = 0x80000000
+LENGTH_MASK = COMPRESSED_FLAG - 1
+
+
+def negotiate(requested, supported=ALGORITHMS):
+    if not isinstance(requested, dict):
+        return None
+    algorithm = requested.get('algorithm')
+    level = requested.get('level', 6)
+    if algorithm not in supported or not isinstance(level, int) or not 0 <= level <= 9:
+        return None
+    return {'algorithm': algorithm, 'level': level}
+
+
+def split_header(value):
+    return value & LENGTH_MASK, bool(value & COMPRESSED_FLAG)
+
+
+class CompressionStats:
+    def __init__(self, algorithm):
+        self.algorithm = algorithm
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.seconds = 0.0
+
+    def ratio(self):
+        return self.raw_bytes / self.wire_bytes if self.wire_bytes else 1.0
+
+    def report(self):
+        return {
+            'algorithm': self.algorithm,
+            'raw_bytes': self.raw_bytes,
+            'wire_bytes': self.wire_bytes,
+            'ratio': round(self.ratio(), 2),
+            'seconds': round(self.seconds, 3)
+        }
+
+    def merge(self, other):
+        self.raw_bytes += other.raw_bytes
+        self.wire_bytes += other.wire_bytes
+        self.seconds += other.seconds
+
+
+class ChunkCompressor(CompressionStats):
+    def __init__(self, algorithm, level, min_saving=0.1, max_backoff=8):
+        super().__init__(algorithm)
+        self.level = level
+        self.min_saving = min_saving
+        self.max_backoff = max_backoff
+        self.backoff = 1
+        self.skip = 0
+        self.bypassed = 0
+
+    def compress(self, data):
+        if self.algorithm == 'lzma':
+            return lzma.compress(data, format=lzma.FORMAT_XZ, check=lzma.CHECK_NONE, preset=self.level)
+        return zlib.compress(data, self.level)
+
+    def send_chunk(self, sock, view, length):
+        self.raw_bytes += length
+        if self.skip:
+            self.skip -= 1
+            self.bypassed += 1
+            self.wire_bytes += length
+            framing.send_chunk(sock, view, length)
+            return
+
+        start = time.perf_counter()
+        packed = self.compress(view[framing.HEADER_SIZE:framing.HEADER_SIZE + length])
+        self.seconds += time.perf_counter() - start
+
+        if len(packed) > length * (1 - self.min_saving):
+            self.skip = self.backoff
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self.wire_bytes += length
+            framing.send_chunk(sock, view, length)
+            return
+
+        self.backoff = 1
+        self.wire_bytes += len(packed)
+        framing.send_buffers(sock, [framing.HEADER.pack(len(packed) | COMPRESSED_FLAG), packed])
+
+
+class ChunkDecompressor(CompressionStats):
+    def decompress(self, data, limit):
+        start = time.perf_counter()
+        if self.algorithm == 'lzma':
+            decompressor = lzma.LZMADecompressor()
+            raw = decompressor.decompress(data, max_length=limit)
+            complete = decompressor.eof
+        else:
+            decompressor = zlib.decompressobj()
+            raw = decompressor.decompress(data, limit)
+            complete = decompressor.eof and not decompressor.unconsumed_tail
+        self.seconds += time.perf_counter() - start
+
+        if not complete:
+            raise ValueError("Некорректный сжатый чанк")
+        self.wire_bytes += len(data)
+        self.raw_bytes += len(raw)
+        return raw
+
+    def account(self, length):
+        self.wire_bytes += length
+        self.raw_bytes += length
@@ -0,0 +1,80 @@
+import hashlib
+
+from slanfm import chunking
+
+
+def signature(f, md5_hash=None):
+    return chunking.manifest(f, md5_hash)
+
+
+def valid_signature(chunks):
+    if not isinstance(chunks, list):
+        return False
+    for chunk in chunks:
+        if (not isinstance(chunk, list) or len(chunk) != 2 or not isinstance(chunk[0], str)
+                or len(chunk[0]) != 64 or not isinstance(chunk[1], int) or chunk[1] <= 0):
+            return False
+    return True
+
+
+def add_literal(ops, length):
+    if ops and ops[-1][0] == 'literal':
+        ops[-1][1] += length
+    else:
+        ops.append(['literal', length])
+
+
+def add_copy(ops, offset, length):
+    if ops and ops[-1][0] == 'copy' and ops[-1][1] + ops[-1][2] == offset:
+        ops[-1][2] += length
+    else:
+        ops.append(['copy', offset, length])
+
+
+def delta(f, base, md5_hash=None):
+    offsets = {}
+    position = 0
+    for digest, length in base:
+        offsets.setdefault(digest, position)
+        position += length
+
+    ops = []
+    for _, data in chunking.iter_chunks(f):
+        if md5_hash:
+            md5_hash.update(data)
+        offset = offsets.get(hashlib.sha256(data).hexdigest())
+        if offset is None:
+            add_literal(ops, len(data))
+        else:
+            add_copy(ops, offset, len(data))
+    return ops
+
+
+def valid_ops(ops, base_size, size):
+    if not isinstance(ops, list):
+        return False
+    total = 0
+    for op in ops:
+        if not isinstance(op, list) or not op or not all(isinstance(v, int) for v in op[1:]):
+            return False
+        if op[0] == 'copy' and len(op) == 3:
+            if op[1] < 0 or op[2] <= 0 or op[1] + op[2] > base_size:
+                return False
+            total += op[2]
+        elif op[0] == 'literal' and len(op) == 2 and op[1] > 0:
+            total += op[1]
+        else:
+            return False
+    return total == size
+
+
+def literal_bytes(ops):
+    return sum(op[1] for op in ops if op[0] == 'literal')
+
+
+def literals(ops):
+    offset = 0
+    for op in ops:
+        if op[0] == 'literal':
+            yield offset, op[1]
+        offset += op[-1]
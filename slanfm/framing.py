@@ -0,0 +1,132 @@
+import json
+import socket
+import ssl
+import struct
+import threading
+from contextlib import contextmanager
+
+HEADER = struct.Struct('>I')
+HEADER_SIZE = HEADER.size
+MAX_MESSAGE = 16 * 1024 * 1024
+RECV_STEP = 64 * 1024
+
+
+class BufferPool:
+    def __init__(self, size, limit=16):
+        self.size = size
+        self.limit = limit
+        self.free = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.free:
+                return self.free.pop()
+        return bytearray(self.size)
+
+    def release(self, buffer):
+        with self.lock:
+            if len(self.free) < self.limit:
+                self.free.append(buffer)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(size):
+    with _pools_lock:
+        pool = _pools.get(size)
+        if pool is None:
+            pool = _pools[size] = BufferPool(size)
+        return pool
+
+
+@contextmanager
+def borrow(size):
+    pool = pool_for(size)
+    buffer = pool.acquire()
+    try:
+        yield buffer
+    finally:
+        pool.release(buffer)
+
+
+def recv_into_exact(sock, view):
+    total = len(view)
+    received = 0
+    while received < total:
+        n = sock.recv_into(view[received:], total - received)
+        if not n:
+            break
+        received += n
+    return received
+
+
+def recv_exact(sock, length):
+    buffer = bytearray(min(length, RECV_STEP))
+    received = 0
+    while received < length:
+        if received == len(buffer):
+            buffer.extend(bytes(min(len(buffer), length - received)))
+        n = recv_into_exact(sock, memoryview(buffer)[received:])
+        received += n
+        if received < len(buffer):
+            break
+    del buffer[received:]
+    return buffer
+
+
+def can_sendmsg(sock):
+    return hasattr(sock, 'sendmsg') and isinstance(sock, socket.socket) and not isinstance(sock, ssl.SSLSocket)
+
+
+def send_buffers(sock, buffers):
+    if not can_sendmsg(sock):
+        for buffer in buffers:
+            sock.sendall(buffer)
+        return
+
+    views = [memoryview(buffer).cast('B') for buffer in buffers]
+    while views:
+        sent = sock.sendmsg(views)
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if views and sent:
+            views[0] = views[0][sent:]
+
+
+def send_frame(sock, payload):
+    send_buffers(sock, [HEADER.pack(len(payload)), payload])
+
+
+def send_chunk(sock, view, length):
+    HEADER.pack_into(view, 0, length)
+    sock.sendall(view[:HEADER_SIZE + length])
+
+
+def recv_frame_header(sock, view):
+    if recv_into_exact(sock, view[:HEADER_SIZE]) != HEADER_SIZE:
+        return None
+    return HEADER.unpack_from(view)[0]
+
+
+def send_message(sock, data):
+    send_frame(sock, json.dumps(data).encode('utf-8'))
+
+
+def recv_message(sock, limit=MAX_MESSAGE):
+    length_data = recv_exact(sock, HEADER_SIZE)
+    if len(length_data) != HEADER_SIZE:
+        return None
+
+    length = HEADER.unpack(length_data)[0]
+    if length > limit:
+        raise ValueError(f"Размер сообщения {length} превышает максимально допустимый {limit}")
+
+    json_data = recv_exact(sock, length)
+    if not json_data:
+        return None
+
+    return json.loads(json_data.decode('utf-8'))
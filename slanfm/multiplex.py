@@ -0,0 +1,286 @@
+import socket
+import struct
+import threading
+from collections import deque
+
+from slanfm import framing
+
+PROTOCOL_VERSION = 2
+
+FRAME = struct.Struct('>IBI')
+FRAME_OPEN = 0
+FRAME_DATA = 1
+FRAME_CLOSE = 2
+FRAME_WINDOW = 3
+
+WINDOW_SIZE = 1024 * 1024
+MAX_FRAME = 256 * 1024
+WINDOW = struct.Struct('>I')
+
+
+class Stream:
+    def __init__(self, mux, stream_id):
+        self.mux = mux
+        self.stream_id = stream_id
+        self.buffer = deque()
+        self.head_offset = 0
+        self.consumed = 0
+        self.recv_window = WINDOW_SIZE
+        self.send_window = WINDOW_SIZE
+        self.closed = False
+        self.remote_closed = False
+        self.timeout = None
+        self.cond = threading.Condition()
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def feed(self, data):
+        with self.cond:
+            self.recv_window -= len(data)
+            if self.recv_window < 0:
+                return False
+            self.buffer.append(data)
+            self.cond.notify_all()
+        return True
+
+    def grant(self, increment):
+        with self.cond:
+            self.send_window += increment
+            self.cond.notify_all()
+
+    def remote_close(self):
+        with self.cond:
+            self.remote_closed = True
+            self.cond.notify_all()
+
+    def recv_into(self, buffer, nbytes=0):
+        view = memoryview(buffer).cast('B')
+        nbytes = nbytes or len(view)
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.buffer or self.remote_closed or self.closed, self.timeout):
+                raise socket.timeout('timed out')
+            if not self.buffer:
+                return 0
+
+            received = 0
+            while self.buffer and received < nbytes:
+                head = self.buffer[0]
+                n = min(len(head) - self.head_offset, nbytes - received)
+                view[received:received + n] = head[self.head_offset:self.head_offset + n]
+                received += n
+                self.head_offset += n
+                if self.head_offset == len(head):
+                    self.buffer.popleft()
+                    self.head_offset = 0
+
+            self.consumed += received
+            increment = 0
+            if self.consumed >= WINDOW_SIZE // 2:
+                increment, self.consumed = self.consumed, 0
+                self.recv_window += increment
+
+        if increment and not self.remote_closed:
+            self.mux.send_frame(self.stream_id, FRAME_WINDOW, WINDOW.pack(increment))
+        return received
+
+    def recv(self, bufsize):
+        buffer = bytearray(bufsize)
+        n = self.recv_into(buffer)
+        return bytes(buffer[:n])
+
+    def sendall(self, data):
+        view = memoryview(data).cast('B')
+        while view:
+            with self.cond:
+                if not self.cond.wait_for(lambda: self.send_window > 0 or self.remote_closed or self.closed, self.timeout):
+                    raise socket.timeout('timed out')
+                if self.remote_closed or self.closed:
+                    raise ConnectionResetError("Поток закрыт")
+                n = min(len(view), self.send_window, MAX_FRAME)
+                self.send_window -= n
+            self.mux.send_frame(self.stream_id, FRAME_DATA, view[:n])
+            view = view[n:]
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def close(self):
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify_all()
+        self.mux.close_stream(self)
+
+
+class Multiplexer:
+    def __init__(self, sock, on_stream=None, max_streams=0):
+        self.sock = sock
+        self.sock.settimeout(None)
+        self.on_stream = on_stream
+        self.max_streams = max_streams
+        self.serving = 0
+        self.streams = {}
+        self.next_id = 1
+        self.last_remote_id = 0
+        self.closed = False
+        self.reader = None
+        self.pending = bytearray()
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+
+    def open_stream(self):
+        with self.lock:
+            if self.closed:
+                raise ConnectionError("Соединение закрыто")
+            stream = Stream(self, self.next_id)
+            self.streams[stream.stream_id] = stream
+            self.next_id += 1
+            self.send_frame(stream.stream_id, FRAME_OPEN, b'')
+        return stream
+
+    def close_stream(self, stream):
+        with self.lock:
+            known = self.streams.pop(stream.stream_id, None) is not None
+        if known and not stream.remote_closed:
+            try:
+                self.send_frame(stream.stream_id, FRAME_CLOSE, b'')
+            except OSError:
+                pass
+
+    def send_frame(self, stream_id, frame_type, payload):
+        with self.send_lock:
+            if self.closed:
+                raise ConnectionError("Соединение закрыто")
+            framing.send_buffers(self.sock, [FRAME.pack(stream_id, frame_type, len(payload)), payload])
+
+    def start(self):
+        self.reader = threading.Thread(target=self.run, name='mux', daemon=True)
+        self.reader.start()
+
+    def run(self):
+        try:
+            while self.read_frame():
+                pass
+        finally:
+            self.close()
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+
+    def read_frame(self):
+        try:
+            header = framing.recv_exact(self.sock, FRAME.size)
+            if len(header) != FRAME.size:
+                return False
+            stream_id, frame_type, length = FRAME.unpack(header)
+            if length > MAX_FRAME or not self.valid_frame(frame_type, length):
+                return False
+            payload = framing.recv_exact(self.sock, length)
+            if len(payload) != length:
+                return False
+        except OSError:
+            return False
+        self.dispatch(stream_id, frame_type, payload)
+        return True
+
+    def receive(self, data):
+        self.pending += data
+        while len(self.pending) >= FRAME.size:
+            stream_id, frame_type, length = FRAME.unpack_from(self.pending)
+            if length > MAX_FRAME or not self.valid_frame(frame_type, length):
+                return False
+            end = FRAME.size + length
+            if len(self.pending) < end:
+                break
+            payload = bytes(self.pending[FRAME.size:end])
+            del self.pending[:end]
+            self.dispatch(stream_id, frame_type, payload)
+        return True
+
+    def valid_frame(self, frame_type, length):
+        if frame_type == FRAME_DATA:
+            return True
+        if frame_type == FRAME_WINDOW:
+            return length == WINDOW.size
+        return frame_type in (FRAME_OPEN, FRAME_CLOSE) and length == 0
+
+    def dispatch(self, stream_id, frame_type, payload):
+        refused = accepted = False
+        with self.lock:
+            stream = self.streams.get(stream_id)
+            if stream is None and frame_type == FRAME_OPEN and self.on_stream and stream_id > self.last_remote_id:
+                self.last_remote_id = stream_id
+                if self.max_streams and self.serving >= self.max_streams:
+                    refused = True
+                else:
+                    stream = Stream(self, stream_id)
+                    self.streams[stream_id] = stream
+                    self.serving += 1
+                    accepted = True
+
+        if refused:
+            self.send_frame(stream_id, FRAME_CLOSE, b'')
+            return
+        if stream is None:
+            return
+        if frame_type == FRAME_DATA:
+            if not stream.feed(payload):
+                self.reset_stream(stream)
+        elif frame_type == FRAME_WINDOW:
+            stream.grant(WINDOW.unpack(payload)[0])
+        elif frame_type == FRAME_CLOSE:
+            with self.lock:
+                self.streams.pop(stream_id, None)
+            stream.remote_close()
+
+        if accepted:
+            self.accept(stream)
+
+    def accept(self, stream):
+        threading.Thread(target=self.serve, args=(stream,), daemon=True).start()
+
+    def serve(self, stream):
+        try:
+            self.on_stream(stream)
+        finally:
+            self.release_stream()
+
+    def release_stream(self):
+        with self.lock:
+            self.serving -= 1
+
+    def reset_stream(self, stream):
+        with self.lock:
+            self.streams.pop(stream.stream_id, None)
+        stream.remote_close()
+        try:
+            self.send_frame(stream.stream_id, FRAME_CLOSE, b'')
+        except OSError:
+            pass
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            streams = list(self.streams.values())
+            self.streams.clear()
+        for stream in streams:
+            stream.remote_close()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        if self.reader is not None and self.reader is not threading.current_thread():
+            return
+        try:
+            self.sock.close()
+        except OSError:
+            pass
@@ -0,0 +1,198 @@
+import contextlib
+import json
+import logging
+import time
+from logging.handlers import RotatingFileHandler
+
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 3
+STALL_THRESHOLD = 0.5
+MAX_STALLS = 100
+
+
+class TimedFile:
+    def __init__(self, f, *sinks):
+        self.f = f
+        self.sinks = sinks
+        self.read_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+    def read(self, *args):
+        started = time.perf_counter()
+        try:
+            return self.f.read(*args)
+        finally:
+            self.read_seconds += time.perf_counter() - started
+
+    def readinto(self, buffer):
+        started = time.perf_counter()
+        try:
+            return self.f.readinto(buffer)
+        finally:
+            self.read_seconds += time.perf_counter() - started
+
+    def write(self, data):
+        started = time.perf_counter()
+        try:
+            return self.f.write(data)
+        finally:
+            self.write_seconds += time.perf_counter() - started
+
+    def close(self):
+        self.f.close()
+        for sink in self.sinks:
+            if self.read_seconds:
+                sink.add('read', self.read_seconds)
+            if self.write_seconds:
+                sink.add('write', self.write_seconds)
+        self.read_seconds = self.write_seconds = 0.0
+
+
+class TimedHash:
+    def __init__(self, hash_object, *sinks):
+        self.hash_object = hash_object
+        self.sinks = sinks
+        self.seconds = 0.0
+
+    def update(self, data):
+        started = time.perf_counter()
+        self.hash_object.update(data)
+        self.seconds += time.perf_counter() - started
+
+    def hexdigest(self):
+        for sink in self.sinks:
+            sink.add('hash', self.seconds)
+        self.seconds = 0.0
+        return self.hash_object.hexdigest()
+
+
+class Phase:
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        spans = self.trace.spans
+        spans[self.name] = spans.get(self.name, 0.0) + time.perf_counter() - self.started
+
+
+class TransferTrace:
+    def __init__(self, tracer, side, kind, filename, **fields):
+        self.tracer = tracer
+        self.record = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'side': side,
+            'kind': kind,
+            'filename': filename,
+            **fields
+        }
+        self.spans = {}
+        self.totals = {}
+        self.chunks = 0
+        self.bytes = 0
+        self.stalls = []
+        self.started = self.last_chunk = time.perf_counter()
+        self.finished = False
+
+    def phase(self, name):
+        return Phase(self, name)
+
+    def note(self, **fields):
+        self.record.update(fields)
+
+    def add(self, name, seconds):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def file(self, f):
+        return TimedFile(f, self)
+
+    def hasher(self, hash_object):
+        return TimedHash(hash_object, self)
+
+    def begin_chunks(self):
+        self.last_chunk = time.perf_counter()
+
+    def chunk(self, nbytes, started, name='send'):
+        now = time.perf_counter()
+        self.totals[name] = self.totals.get(name, 0.0) + now - started
+        gap = now - self.last_chunk
+        if gap >= STALL_THRESHOLD and len(self.stalls) < MAX_STALLS:
+            self.stalls.append([round(self.last_chunk - self.started, 3), round(gap, 3)])
+        self.last_chunk = now
+        self.chunks += 1
+        self.bytes += nbytes
+
+    def finish(self, result='ok', **fields):
+        if self.finished:
+            return
+        self.finished = True
+        self.tracer.write({
+            **self.record,
+            **fields,
+            'result': result,
+            'seconds': round(time.perf_counter() - self.started, 6),
+            'bytes': self.bytes,
+            'chunks': self.chunks,
+            'spans': {name: round(value, 6) for name, value in self.spans.items()},
+            'totals': {name: round(value, 6) for name, value in self.totals.items()},
+            'stalls': self.stalls
+        })
+
+
+class NullTrace:
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+    def note(self, **fields):
+        pass
+
+    def add(self, name, seconds):
+        pass
+
+    def file(self, f):
+        return f
+
+    def hasher(self, hash_object):
+        return hash_object
+
+    def begin_chunks(self):
+        pass
+
+    def chunk(self, nbytes, started, name='send'):
+        pass
+
+    def finish(self, result='ok', **fields):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class Tracer:
+    def __init__(self, path, max_bytes=MAX_BYTES, backups=BACKUPS):
+        self.logger = logging.getLogger(f'slanfm.trace.{path}')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def start(self, side, kind, filename, **fields):
+        return TransferTrace(self, side, kind, filename, **fields)
+
+    def write(self, record):
+        self.logger.info(json.dumps(record, ensure_ascii=False))
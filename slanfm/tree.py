@@ -0,0 +1,110 @@
+import os
+import queue
+import threading
+from pathlib import Path, PurePosixPath
+
+WALK_DEPTH = 4096
+READ_DEPTH = 32
+READ_AHEAD_SIZE = 256 * 1024
+
+
+class Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(iterable, depth):
+    items = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(Failure(e))
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close:
+                close()
+        put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+def walk(root, hidden_prefix=None, totals=None):
+    stack = ['']
+    while stack:
+        prefix = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, prefix) if prefix else root) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if hidden_prefix and entry.name.startswith(hidden_prefix):
+                continue
+            name = f'{prefix}/{entry.name}' if prefix else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(name)
+                    yield name, None
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    if totals is not None:
+                        totals['files'] += 1
+                        totals['bytes'] += st.st_size
+                    yield name, st
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+
+
+def read_ahead(entries, root, limit=READ_AHEAD_SIZE):
+    for name, st in entries:
+        data = None
+        if st is not None and st.st_size <= limit:
+            try:
+                with open(os.path.join(root, name), 'rb') as f:
+                    data = f.read(limit + 1)
+                if len(data) > limit:
+                    data = None
+            except OSError:
+                data = None
+        yield name, st, data
+
+
+def pipeline(root, hidden_prefix=None, totals=None):
+    return prefetch(read_ahead(prefetch(walk(root, hidden_prefix, totals), WALK_DEPTH), root), READ_DEPTH)
+
+
+def local_path(name):
+    if not isinstance(name, str) or not name or '\\' in name or ':' in name:
+        return None
+    path = PurePosixPath(name)
+    if path.is_absolute() or any(part == '..' for part in path.parts):
+        return None
+    return Path(*path.parts)
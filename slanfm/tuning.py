@@ -0,0 +1,97 @@
+import socket
+import struct
+import time
+
+from slanfm import multiplex
+
+SAMPLE_INTERVAL = 0.2
+CHUNK_INTERVAL = 0.01
+MIN_BUFFER = 64 * 1024
+MAX_BUFFER = 16 * 1024 * 1024
+TCP_INFO_SIZE = 104
+TCP_INFO_RTT_OFFSET = 68
+
+
+def raw_socket(sock):
+    if isinstance(sock, multiplex.Stream):
+        return sock.mux.sock
+    return sock
+
+
+def tcp_rtt(sock):
+    if not hasattr(socket, 'TCP_INFO'):
+        return None
+    try:
+        info = raw_socket(sock).getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_SIZE)
+        rtt = struct.unpack_from('I', info, TCP_INFO_RTT_OFFSET)[0]
+    except (OSError, AttributeError, struct.error):
+        return None
+    return rtt / 1000000 if rtt else None
+
+
+def fit(value, minimum, maximum):
+    value = 1 << (max(int(value), 1).bit_length() - 1)
+    return max(minimum, min(maximum, value))
+
+
+class TransferTuner:
+    def __init__(self, sock, chunk_size, minimum=None, maximum=None, sending=True, rtt=None):
+        self.sock = sock
+        self.minimum = min(minimum or chunk_size, chunk_size)
+        self.maximum = max(maximum or chunk_size, chunk_size)
+        self.chunk_size = chunk_size
+        self.sending = sending
+        self.option = socket.SO_SNDBUF if sending else socket.SO_RCVBUF
+        self.rtt = tcp_rtt(sock) or rtt
+        self.throughput = 0.0
+        self.buffer_size = None
+        self.total_bytes = 0
+        self.started = self.sample_started = time.perf_counter()
+        self.sample_bytes = 0
+
+    def update(self, nbytes):
+        self.total_bytes += nbytes
+        self.sample_bytes += nbytes
+        now = time.perf_counter()
+        elapsed = now - self.sample_started
+        if elapsed < SAMPLE_INTERVAL:
+            return False
+
+        rate = self.sample_bytes / elapsed
+        self.throughput = (self.throughput + rate) / 2 if self.throughput else rate
+        self.sample_bytes = 0
+        self.sample_started = now
+        self.rtt = tcp_rtt(self.sock) or self.rtt
+        return self.retune()
+
+    def retune(self):
+        changed = False
+        if self.sending:
+            chunk_size = fit(self.throughput * CHUNK_INTERVAL, self.minimum, self.maximum)
+            if chunk_size != self.chunk_size:
+                self.chunk_size = chunk_size
+                changed = True
+
+        if self.rtt:
+            wanted = fit(2 * max(self.throughput * self.rtt, self.chunk_size), MIN_BUFFER, MAX_BUFFER)
+            try:
+                sock = raw_socket(self.sock)
+                if wanted > max(self.buffer_size or 0, sock.getsockopt(socket.SOL_SOCKET, self.option) // 2):
+                    sock.setsockopt(socket.SOL_SOCKET, self.option, wanted)
+                    self.buffer_size = wanted
+                    changed = True
+            except (OSError, AttributeError):
+                pass
+        return changed
+
+    def average(self):
+        elapsed = time.perf_counter() - self.started
+        return self.total_bytes / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        return {
+            'chunk_size': self.chunk_size,
+            'buffer_size': self.buffer_size,
+            'rtt_ms': round(self.rtt * 1000, 2) if self.rtt else None,
+            'throughput': round(self.throughput or self.average())
+        }